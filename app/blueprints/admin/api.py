@@ -1,6 +1,6 @@
 import logging
 
-from flask import Blueprint, abort
+from flask import Blueprint, abort, request
 from mongoengine import Q
 
 from app.blueprints.conversations.models.conversation import Conversation
@@ -46,3 +46,51 @@ def get_messages(conversation_id):
     if not messages:
         abort(400, description="Not Found")
     return make_json_response(serialize_message_list(messages), 200)
+
+
+@admin_bp.route("/stats", methods=["GET"])
+@authorized(roles=["INTERNAL_ADMIN", "SUPER_ADMIN"])
+def get_stats():
+    from app.flask_app import (
+        answer_cache,
+        artifact_cache,
+        chain_registry,
+        condense_cache,
+        embedding_cache,
+        redis_db,
+        redis_pubsub,
+    )
+    from app.utils.cache_utils.search_index_cache import search_index_cache_stats
+    from app.utils.cache_utils.user_cache_service import UserCacheService
+    from app.utils.http_client import http_client_stats
+    from app.utils.metrics import metrics
+
+    stats = {
+        "chain_registry": chain_registry.stats(),
+        "artifact_cache": artifact_cache.stats(),
+        "search_index_cache": search_index_cache_stats(),
+        "embedding_cache": embedding_cache.stats(),
+        "answer_cache": answer_cache.stats(),
+        "condense_cache": condense_cache.stats(),
+        "redis": redis_db.stats(),
+        "redis_pubsub": redis_pubsub.stats(),
+        "user_cache": UserCacheService.local_cache.stats(),
+        "http_clients": http_client_stats(),
+        "metrics": metrics.snapshot(),
+    }
+    return make_json_response(stats, 200)
+
+
+@admin_bp.route("/answer_cache", methods=["DELETE"])
+@authorized(roles=["INTERNAL_ADMIN", "SUPER_ADMIN"])
+def invalidate_answer_cache():
+    from app.flask_app import answer_cache
+
+    if not request.is_json:
+        abort(400, description="Missing json in the request")
+    payload = request.get_json()
+    if not all(payload.get(field) for field in ["survey", "segmentation", "segment"]):
+        abort(400, description="survey, segmentation and segment are required")
+    segment_key = answer_cache.make_segment_key(payload["survey"], payload["segmentation"], payload["segment"])
+    version = answer_cache.invalidate(segment_key)
+    return make_json_response({"segment": segment_key, "version": version}, 200)
@@ -4,6 +4,7 @@ import math
 from flask import Blueprint, abort, current_app, g, jsonify, request
 from mongoengine.errors import DoesNotExist
 
+from app.utils.cache_utils.message_cache_service import MessageCacheService
 from app.utils.mapping_utils import Mapping
 from app.utils.request_response_utils import make_json_response
 
@@ -90,6 +91,7 @@ def delete_conversation(conversation_id):
     try:
         conversation = Conversation.objects.get(id=conversation_id)
         conversation.delete()
+        MessageCacheService().invalidate_conversation(conversation_id)
         return jsonify({"message": "Conversation deleted"}), 204
     except DoesNotExist:
         return jsonify({"error": "Conversation not found"}), 404
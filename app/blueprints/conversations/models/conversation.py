@@ -14,6 +14,10 @@ class Conversation(Document, CustomDocument):
 
             feedback (EmbeddedDocumentField): The embedded document field for storing feedback.
 
+            history_summary (StringField): The summary of the turns older than the chat history sent to the chatbots.
+
+            history_summarized_at (DateTimeField): The creation time of the last message in the history summary.
+
             created_at (DateTimeField): The date and time when the conversation was created.
 
             modified_at (DateTimeField): The date and time when the conversation was last modified.
@@ -35,6 +39,8 @@ class Conversation(Document, CustomDocument):
     segment_id = StringField()
     segmentation = StringField()
     feedback = EmbeddedDocumentField(Feedback)
+    history_summary = StringField()
+    history_summarized_at = DateTimeField()
     created_at = DateTimeField(required=True, default=datetime.utcnow)
     modified_at = DateTimeField(default=datetime.utcnow)
 
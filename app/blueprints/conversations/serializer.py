@@ -6,14 +6,14 @@ from app.blueprints.messages.serializer import serialize_list as serialize_messa
 from app.blueprints.messages.service import fetch_message_count, fetch_messages
 from app.utils.permission_utils import filter_allowed_data
 
-from ...utils.cache_utils.user_cache_service import get_user
+from ...utils.cache_utils.user_cache_service import get_user, get_users
 from .models.conversation import Conversation
 
 
-def add_user_details(conversation, user_id):
-    # Add user details in conversation
+def add_user_details(conversation, user_id, users=None):
+    # Add user details in conversation, from the users fetched in bulk if given
     try:
-        user_details = get_user(user_id)
+        user_details = get_user(user_id) if users is None else users[user_id]
         conversation["user__name"] = user_details.get("name")
         conversation["user__email"] = user_details.get("email")
     except:
@@ -42,8 +42,12 @@ def serialize(conversation):
 
 def serialize_list(conversations):
     conversation_list = conversations.to_clean_json_dict(follow_reference=False, permissions=g.permissions)
+    try:
+        users = get_users([conversation["user_id"] for conversation in conversation_list])
+    except Exception:
+        users = {}
     for conversation in conversation_list:
-        add_user_details(conversation, conversation["user_id"])
+        add_user_details(conversation, conversation["user_id"], users)
         conversation["message_count"] = fetch_message_count(
             {"conversation_id": str(conversation["_id"]), "is_visible": True}
         )
@@ -4,6 +4,7 @@ from http import HTTPStatus
 from flask import Blueprint, jsonify, make_response
 
 from app.middlewares.auth.authorization import AuthorizationError
+from app.utils.atlas_api_utils import SearchIndexNotReadyError
 
 errors = Blueprint("errors", __name__)
 
@@ -62,3 +63,12 @@ def handle_unexpected_error(e):
     logger.exception(e)
 
     return return_error(HTTPStatus.FORBIDDEN, message=e.message)
+
+
+@errors.app_errorhandler(SearchIndexNotReadyError)
+def handle_search_index_not_ready(e):
+    logger.info(f"Search index of {e.collection_name} is not ready")
+
+    response = return_error(HTTPStatus.SERVICE_UNAVAILABLE, message=e.message)
+    response.headers["Retry-After"] = "30"
+    return response
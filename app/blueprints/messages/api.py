@@ -2,10 +2,10 @@ import logging
 
 from flask import Blueprint, abort, request
 
-from app.utils.request_response_utils import make_json_response
+from app.utils.request_response_utils import make_event_stream_response, make_json_response
 
 from .serializer import serialize, serialize_list
-from .service import fetch_messages, process_add_feedback, process_create_message
+from .service import fetch_messages, process_add_feedback, process_create_message, process_create_message_stream
 
 logger = logging.getLogger("qudo")
 
@@ -21,6 +21,15 @@ def create_message():
     return make_json_response(response, 200)
 
 
+@message_bp.route("/stream", methods=["POST"])
+def create_message_stream():
+    if not request.is_json:
+        abort(400, description="Missing json in the request")
+    payload = request.get_json()
+    events = process_create_message_stream(payload)
+    return make_event_stream_response(events)
+
+
 @message_bp.route("/<conversation_id>", methods=["GET"])
 def get_messages(conversation_id):
     query = fetch_messages({"conversation_id": conversation_id})
@@ -5,10 +5,12 @@ from mongoengine import (
     DateTimeField,
     Document,
     EmbeddedDocumentField,
+    IntField,
     StringField,
 )
 
 from app.utils.base_models import BaseQuerySet, CustomDocument
+from app.utils.chatbot.gpt_utils.token_utils import count_message_tokens
 from app.utils.feedback_model import Feedback
 
 
@@ -23,6 +25,8 @@ class Message(Document, CustomDocument):
 
             content (str): The content of the message.
 
+            token_count (int): The number of prompt tokens of the message, counted once when it is saved.
+
             feedback (Feedback): An embedded document representing feedback related to the message.
 
             created_at (datetime): The timestamp when the message was created (default is the current UTC time).
@@ -42,7 +46,12 @@ class Message(Document, CustomDocument):
     role = StringField(choices=["user", "system", "assistant", "initial"])
     is_visible = BooleanField(default=True)
     is_bot = BooleanField(required=True, default=False)
+    token_count = IntField()
     feedback = EmbeddedDocumentField(Feedback)
     created_at = DateTimeField(required=True, default=datetime.utcnow)
     modified_at = DateTimeField(default=datetime.utcnow)
     meta = {"strict": False, "queryset_class": BaseQuerySet, "indexes": ["user_id", "conversation_id"]}
+
+    def clean(self):
+        if self.token_count is None and self.role and self.content is not None:
+            self.token_count = count_message_tokens({"role": self.role, "content": self.content})
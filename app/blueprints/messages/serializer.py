@@ -72,4 +72,5 @@ def serialize_langchain_prompt_list(messages):
 def serialize_gpt_prompt(message):
     if not message:
         return None
-    return {"role": message.role, "content": message.content}
+    # Messages saved before their tokens were counted are counted by the chatbot
+    return {"role": message.role, "content": message.content, "token_count": getattr(message, "token_count", None)}
@@ -1,32 +1,51 @@
 import logging
 import time
 
+from bson import ObjectId
 from flask import abort, current_app, g
 from mongoengine import Q
 
 from app.utils.cache_utils.message_cache_service import MessageCacheService
-from app.utils.chatbot.chatbot_utils import create_gpt_prompt
+from app.utils.cache_utils.message_job_service import MessageJobService
+from app.utils.chatbot.chatbot_utils import amend_response, create_gpt_prompt, stream_gpt_prompt
+from app.utils.chatbot.gpt_utils.information_retrieval import get_cached_embedding
+from app.utils.chatbot.gpt_utils.token_utils import count_message_tokens
+from app.utils.chatbot.chain_registry import ChainRegistry
 from app.utils.chatbot.gpt_utils.chatgpt_bot import Chatbot
+from app.utils.chatbot.history_policy import HistoryPolicy
 from app.utils.chatbot.langchain_bot import PythiaChatbot
 from app.utils.chatbot.langchain_utils.data_handler import PythiaDataHandler
+from app.utils.chatbot.langchain_utils.streaming import ChainStream
 from app.utils.feedback_model import Feedback
+from app.utils.metrics import metrics
+from app.utils.request_response_utils import format_sse
 
 from ...utils.chatbot.langchain_utils.mongo_utils import MongoDBHandler
 from ...utils.chatbot.langchain_utils.question_generator import PythiaQuestionGenerator
+from ..conversations.models.conversation import Conversation
 from .models.message import Message
 from .serializer import serialize, serialize_gpt_prompt
+from .tasks import generate_answer, summarize_history
 
 logger = logging.getLogger("qudo")
 
+GPT_ANSWER_NAMESPACE = "gpt__gpt-4"
+LANGCHAIN_ANSWER_NAMESPACE = "langchain__gpt-4"
+
+# Sent to the client instead of the exception, like the unexpected error handler of the errors blueprint
+UNEXPECTED_ERROR_MESSAGE = "An unexpected error has occurred."
+
 
 # Specific function just to filter messages based on filters passed
-def fetch_messages(filters, order_by=None):
+def fetch_messages(filters, order_by=None, limit=None):
     query = Q(**filters)
     query = query & Q(user_id=g.user["id"])
     messages = Message.objects(query)
     if messages:
         if order_by:
             messages = messages.order_by(order_by)
+        if limit:
+            messages = messages.limit(limit)
         return messages
     return None
 
@@ -50,37 +69,11 @@ def process_create_message(payload):
 
     data = MessageCacheService().get_data(conversation_id)
 
-    segmentation = data["segmentation"]
     segment = data["segment"]
-    segment_id = data["segment_id"]
-    survey_id = data["survey_id"]
-    seg_description = data["seg_description"]
 
     question = payload["question"]
 
-    chatbot = Chatbot(
-        openai_key=current_app.config["OPENAI_API_KEY"],
-        question=question,
-        survey_id=survey_id,
-        segmentation=segmentation,
-        segment_id=segment_id,
-        segment_description=seg_description,
-        messages=[],
-    )
-    # logger.info(data["messages"])
-    if not data["messages"]:
-        messages = chatbot.generate_base_message([], [])
-        logger.info(f"Messages: {messages}")
-
-        for item in messages:
-            message = Message(**item)
-            message.user_id = g.user["id"]
-            message.conversation_id = conversation_id
-            message.is_visible = False
-            message.is_bot = True
-            message.save()
-
-            data["messages"].append(serialize_gpt_prompt(message))
+    chatbot = _create_gpt_chatbot(conversation_id, data, question)
 
     question_message = Message(
         user_id=g.user["id"], conversation_id=conversation_id, content=question, role="user", is_bot=False
@@ -89,8 +82,14 @@ def process_create_message(payload):
 
     start_time = time.time()
 
-    chatbot.set_messages(data["messages"])
-    gpt_prompt = create_gpt_prompt(question, data["survey"], segment, chatbot)
+    has_history = _has_gpt_history(data)
+    gpt_prompt, embedding = _get_cached_answer(GPT_ANSWER_NAMESPACE, data, question, has_history)
+    cached = gpt_prompt is not None
+    if not cached:
+        # A new list, the chatbot appends the question with its reference answers, the cache keeps the plain one
+        chatbot.set_messages(HistoryPolicy.from_config(current_app.config).prompt_messages(data))
+        gpt_prompt = create_gpt_prompt(question, data["survey"], segment, chatbot)
+        _cache_answer(GPT_ANSWER_NAMESPACE, data, question, gpt_prompt, embedding, has_history)
 
     # Calculate the elapsed time
     elapsed_time = time.time() - start_time
@@ -102,20 +101,143 @@ def process_create_message(payload):
     )
     message.save()
 
-    data["messages"].append(serialize_gpt_prompt(question_message))
-    data["messages"].append(serialize_gpt_prompt(message))
-
-    logger.info(f'redis messages: {data["messages"]}')
-
-    MessageCacheService().set_data(conversation_id, data)
+    _update_chat_history(conversation_id, data, serialize_gpt_prompt(question_message), serialize_gpt_prompt(message))
     response = {
         "question": serialize(question_message),
         "message": serialize(message),
+        "cached": cached,
     }
 
     return response
 
 
+def process_create_message_stream(payload):
+    """
+    Processes the creation of a new message for a conversation, streaming the tokens of the answer.
+
+    Args:
+        payload (dict): The payload containing the conversation ID and question.
+
+    Returns:
+        Iterator[str]: The server-sent events of the answer tokens, then of the created messages.
+    """
+    conversation_id = payload["conversation_id"]
+
+    data = MessageCacheService().get_data(conversation_id)
+
+    question = payload["question"]
+
+    chatbot = _create_gpt_chatbot(conversation_id, data, question)
+
+    question_message = Message(
+        user_id=g.user["id"], conversation_id=conversation_id, content=question, role="user", is_bot=False
+    )
+    question_message.save()
+
+    has_history = _has_gpt_history(data)
+    cached_answer, embedding = _get_cached_answer(GPT_ANSWER_NAMESPACE, data, question, has_history)
+    if cached_answer is not None:
+        tokens = iter([cached_answer])
+    else:
+        # A new list, the chatbot appends the question with its reference answers, the cache keeps the plain one
+        chatbot.set_messages(HistoryPolicy.from_config(current_app.config).prompt_messages(data))
+        tokens = stream_gpt_prompt(question, data["survey"], data["segment"], chatbot)
+
+    def complete(answer):
+        message = Message(
+            user_id=g.user["id"],
+            conversation_id=conversation_id,
+            content=amend_response(answer),
+            role="assistant",
+            is_bot=True,
+        )
+        message.save()
+        if cached_answer is None:
+            _cache_answer(GPT_ANSWER_NAMESPACE, data, question, message.content, embedding, has_history)
+
+        _update_chat_history(
+            conversation_id, data, serialize_gpt_prompt(question_message), serialize_gpt_prompt(message)
+        )
+        return {
+            "question": serialize(question_message),
+            "message": serialize(message),
+            "cached": cached_answer is not None,
+        }
+
+    return _stream_answer(tokens, complete, "messages.v1")
+
+
+def _create_gpt_chatbot(conversation_id, data, question):
+    """
+    Creates the GPT chatbot of the conversation, saving its base messages on the first question.
+    """
+    chatbot = Chatbot(
+        openai_key=current_app.config["OPENAI_API_KEY"],
+        question=question,
+        survey_id=data["survey_id"],
+        segmentation=data["segmentation"],
+        segment_id=data["segment_id"],
+        segment_description=data["seg_description"],
+        messages=[],
+        answer_tokens=current_app.config["GPT_ANSWER_TOKENS"],
+    )
+    if not data["messages"]:
+        messages = chatbot.generate_base_message([], [])
+        logger.info(f"Messages: {messages}")
+
+        base_messages = []
+        for item in messages:
+            message = Message(**item)
+            message.user_id = g.user["id"]
+            message.conversation_id = conversation_id
+            message.is_visible = False
+            message.is_bot = True
+            message.save()
+
+            base_messages.append(serialize_gpt_prompt(message))
+        data["messages"].extend(base_messages)
+        MessageCacheService().append_base_messages(conversation_id, base_messages)
+    return chatbot
+
+
+def _stream_answer(tokens, complete, metric_prefix):
+    """
+    Streams the tokens of an answer as server-sent events, then persists the complete answer.
+
+    A "token" event is sent for every token. Once the answer is complete, complete(answer) saves it and a "done" event
+    is sent with the response complete returns. If the answer fails, an "error" event is sent and nothing is saved.
+    The time to the first token and the duration of the stream are recorded under metric_prefix.
+
+    Args:
+        tokens (Iterable[str]): The tokens of the answer.
+        complete (Callable[[str], dict]): Saves the complete answer and returns the response.
+        metric_prefix (str): The prefix of the latency metrics.
+
+    Yields:
+        str: The server-sent events.
+    """
+    start_time = time.perf_counter()
+    answer_tokens = []
+    try:
+        for token in tokens:
+            if not answer_tokens:
+                time_to_first_token = (time.perf_counter() - start_time) * 1000
+                metrics.observe(f"{metric_prefix}.time_to_first_token_ms", time_to_first_token)
+                logger.info(f"Time to first token: {time_to_first_token:.0f} ms")
+            answer_tokens.append(token)
+            yield format_sse("token", {"token": token})
+
+        response = complete("".join(answer_tokens))
+    except Exception as e:
+        logger.exception(e)
+        metrics.increment(f"{metric_prefix}.stream_errors")
+        yield format_sse("error", {"message": UNEXPECTED_ERROR_MESSAGE})
+        return
+
+    metrics.observe(f"{metric_prefix}.stream_duration_ms", (time.perf_counter() - start_time) * 1000)
+    yield format_sse("done", response)
+
+
 def create_message(conversation_id, content, role, is_bot, is_visible=True):
     message = Message(
         user_id=g.user["id"],
@@ -158,26 +280,174 @@ def process_create_message_langchain(payload):
 
     data = _initialize_cache_data(conversation_id)
 
-    data_handler, mongo_handler = _initialize_data_handlers(current_app.config, data)
     question, question_message = _create_question_message(conversation_id, payload)
-    chat_history = data["history"]
+    chat_history = HistoryPolicy.from_config(current_app.config).chat_history(data)
 
-    question_generator = PythiaQuestionGenerator(data_handler, current_app.config["OPENAI_API_KEY"])
-
-    answer = _generate_chatbot_response(question_generator, mongo_handler, question, chat_history)
+    answer, cached = _answer_question(current_app.config, data, question, chat_history)
     answer_message = _create_answer_message(conversation_id, answer)
 
-    _update_chat_history(conversation_id, data, question, answer)
+    _update_chat_history(
+        conversation_id, data, serialize_gpt_prompt(question_message), serialize_gpt_prompt(answer_message)
+    )
     response = {
         "question": serialize(question_message),
         "message": serialize(answer_message),
+        "cached": cached,
     }
 
     return response
 
 
-def _initialize_cache_data(conversation_id):
-    data = MessageCacheService().get_data(conversation_id)
+def process_create_message_langchain_stream(payload):
+    """
+    Processes the creation of a new message for a conversation, streaming the tokens of the answer.
+
+    Args:
+        payload (dict): The payload containing the conversation ID and question.
+
+    Returns:
+        Iterator[str]: The server-sent events of the answer tokens, then of the created messages.
+    """
+    conversation_id = payload["conversation_id"]
+
+    data = _initialize_cache_data(conversation_id)
+
+    question, question_message = _create_question_message(conversation_id, payload)
+    chat_history = HistoryPolicy.from_config(current_app.config).chat_history(data)
+
+    has_history = bool(chat_history)
+    cached_answer, embedding = _get_cached_answer(LANGCHAIN_ANSWER_NAMESPACE, data, question, has_history)
+    if cached_answer is not None:
+        tokens = iter([cached_answer])
+    else:
+        chatbot = _get_chatbot(current_app.config, data)
+        tokens = ChainStream(chatbot, {"question": question, "chat_history": chat_history})
+
+    def complete(streamed_answer):
+        if cached_answer is not None:
+            answer = cached_answer
+        else:
+            answer = tokens.result["answer"]
+            _cache_answer(LANGCHAIN_ANSWER_NAMESPACE, data, question, answer, embedding, has_history)
+        answer_message = _create_answer_message(conversation_id, answer)
+
+        _update_chat_history(
+            conversation_id, data, serialize_gpt_prompt(question_message), serialize_gpt_prompt(answer_message)
+        )
+        return {
+            "question": serialize(question_message),
+            "message": serialize(answer_message),
+            "cached": cached_answer is not None,
+        }
+
+    return _stream_answer(tokens, complete, "messages.v2")
+
+
+def process_enqueue_message_langchain(payload):
+    """
+    Processes the creation of a new message for a conversation, queuing the generation of the answer.
+
+    Args:
+        payload (dict): The payload containing the conversation ID and question.
+
+    Returns:
+        dict: The created question message, and the id and status of the answer message being generated.
+    """
+    from app.flask_app import message_jobs
+
+    conversation_id = payload["conversation_id"]
+
+    _initialize_cache_data(conversation_id)
+
+    question, question_message = _create_question_message(conversation_id, payload)
+
+    job_id = str(ObjectId())
+    sub = MessageCacheService.get_decoded_values()["sub"]
+    job = message_jobs.create(job_id, g.user["id"], sub, conversation_id, question)
+    try:
+        generate_answer.delay(job_id)
+    except Exception:
+        message_jobs.update(job_id, MessageJobService.FAILED, error=UNEXPECTED_ERROR_MESSAGE)
+        raise
+
+    response = {
+        "question": serialize(question_message),
+        "message_id": job_id,
+        "status": job["status"],
+    }
+    return response
+
+
+def process_message_job(job_id):
+    """
+    Generates the answer of a queued message job, in a celery worker.
+
+    Args:
+        job_id (str): The id of the job, which is also the id of the answer message.
+
+    Returns:
+        None
+    """
+    from app.flask_app import message_jobs
+
+    job = message_jobs.get(job_id)
+    if job is None or job["status"] != MessageJobService.PENDING:
+        logger.warning(f"Skipping message job {job_id}: {job and job['status']}")
+        return
+
+    message_jobs.update(job_id, MessageJobService.RUNNING)
+    g.user = {"id": job["user_id"], "is_user": True}
+    conversation_id = job["conversation_id"]
+    question = job["question"]
+    try:
+        data = _initialize_cache_data(conversation_id, sub=job["sub"])
+        chat_history = HistoryPolicy.from_config(current_app.config).chat_history(data)
+        answer, cached = _answer_question(current_app.config, data, question, chat_history)
+        answer_message = _create_answer_message(conversation_id, answer, message_id=job_id)
+        question_message = {"role": "user", "content": question}
+        question_message["token_count"] = count_message_tokens(question_message)
+        _update_chat_history(
+            conversation_id, data, question_message, serialize_gpt_prompt(answer_message), sub=job["sub"]
+        )
+    except Exception as e:
+        logger.exception(e)
+        message_jobs.update(job_id, MessageJobService.FAILED, error=UNEXPECTED_ERROR_MESSAGE)
+        return
+
+    message_jobs.update(job_id, MessageJobService.DONE, message=serialize(answer_message), cached=cached)
+
+
+def fetch_message_job(message_id, wait=0):
+    """
+    Gets the status of the job generating a message, waiting up to wait seconds for it to finish.
+    Only the user who asked the question can see, and wait for, the job.
+
+    Args:
+        message_id (str): The id of the answer message.
+        wait (float): The number of seconds to wait for the job to finish, capped by MESSAGE_JOB_MAX_WAIT.
+
+    Returns:
+        dict: The status of the job, with the answer message once it is done or the error if it failed.
+    """
+    from app.flask_app import message_jobs
+
+    job = message_jobs.get(message_id)
+    if not job or job["user_id"] != g.user["id"]:
+        abort(404, description="Message job not found")
+    if wait > 0 and job["status"] not in MessageJobService.FINISHED_STATUSES:
+        job = message_jobs.wait(message_id, timeout=min(wait, current_app.config["MESSAGE_JOB_MAX_WAIT"])) or job
+
+    response = {"message_id": job["id"], "conversation_id": job["conversation_id"], "status": job["status"]}
+    if job["status"] == MessageJobService.DONE:
+        response["message"] = job["message"]
+        response["cached"] = job["cached"]
+    elif job["status"] == MessageJobService.FAILED:
+        response["error"] = job["error"]
+    return response
+
+
+def _initialize_cache_data(conversation_id, sub=None):
+    data = MessageCacheService(sub=sub).get_data(conversation_id)
     return data
 
 
@@ -192,6 +462,8 @@ def _initialize_data_handlers(config, data):
     Returns:
         tuple: A tuple containing initialized instances of PythiaDataHandler, MongoDBHandler, and conversation data.
     """
+    from app.flask_app import embedding_cache
+
     # data = MessageCacheService().get_data(conversation_id)
 
     segmentation = data["segmentation"]
@@ -212,6 +484,7 @@ def _initialize_data_handlers(config, data):
         config["MONGO_CLUSTER"],
         config["MONGO_GROUP_ID"],
         data_handler,
+        embedding_cache=embedding_cache,
     )
     return data_handler, mongo_handler
 
@@ -235,60 +508,231 @@ def _create_question_message(conversation_id, payload):
     return question, question_message
 
 
-def _generate_chatbot_response(question_generator, mongo_handler, question, chat_history):
+def _get_chatbot(config, data, gpt_model="gpt-4"):
+    """
+    Returns the warm chatbot chain for the conversation segment, building it on the first request of the worker.
+
+    Args:
+        config (dict): The configuration settings, typically from Flask's current_app.config.
+        data (dict): The conversation data from cache.
+        gpt_model (str): The GPT model answering the questions.
+
+    Returns:
+        ConversationalRetrievalChain: The chatbot chain for the segment.
+    """
+    from app.flask_app import chain_registry, condense_cache
+
+    key = ChainRegistry.make_key(data["survey"], data["segmentation"], data["segment"], gpt_model)
+
+    def build_chain():
+        data_handler, mongo_handler = _initialize_data_handlers(config, data)
+        question_generator = PythiaQuestionGenerator(data_handler, config["OPENAI_API_KEY"])
+        chatbot = PythiaChatbot(
+            gpt_model,
+            openai_key=config["OPENAI_API_KEY"],
+            mongo_handler=mongo_handler,
+            question_generator=question_generator,
+            retriever_backend=config["RETRIEVER_BACKEND"],
+            condense_cache=condense_cache,
+            speculative_retrieval_threshold=(
+                config["SPECULATIVE_RETRIEVAL_THRESHOLD"] if config["SPECULATIVE_RETRIEVAL"] else None
+            ),
+        )
+        return chatbot.generate_chatbot()
+
+    return chain_registry.get_or_build(key, build_chain)
+
+
+def _generate_chatbot_response(config, data, question, chat_history):
     """
     Generates a response to the user's question using the chatbot.
 
     Args:
-        question_generator (PythiaQuestionGenerator): The question generator instance.
-        mongo_handler (MongoDBHandler): The MongoDB handler instance.
+        config (dict): The configuration settings, typically from Flask's current_app.config.
+        data (dict): The conversation data from cache.
         question (str): The user's question.
         chat_history (list): The chat history of the conversation.
 
     Returns:
         str: The chatbot's response to the question.
     """
-    chatbot = PythiaChatbot(
-        "gpt-4",
-        openai_key=current_app.config["OPENAI_API_KEY"],
-        mongo_handler=mongo_handler,
-        question_generator=question_generator,
-    )
-    response = chatbot.generate_chatbot()({"question": question, "chat_history": chat_history})
+    chatbot = _get_chatbot(config, data)
+    response = chatbot({"question": question, "chat_history": chat_history})
     return response["answer"]
 
 
-def _create_answer_message(conversation_id, answer):
+def _answer_question(config, data, question, chat_history):
+    """
+    Answers the user's question from the answer cache, or with the chatbot on a miss.
+
+    Args:
+        config (dict): The configuration settings, typically from Flask's current_app.config.
+        data (dict): The conversation data from cache.
+        question (str): The user's question.
+        chat_history (list): The chat history of the conversation.
+
+    Returns:
+        tuple: The answer to the question, and whether it came from the answer cache.
+    """
+    has_history = bool(chat_history)
+    answer, embedding = _get_cached_answer(LANGCHAIN_ANSWER_NAMESPACE, data, question, has_history)
+    if answer is not None:
+        return answer, True
+
+    answer = _generate_chatbot_response(config, data, question, chat_history)
+    _cache_answer(LANGCHAIN_ANSWER_NAMESPACE, data, question, answer, embedding, has_history)
+    return answer, False
+
+
+def _has_gpt_history(data):
+    return any(message["role"] == "user" for message in data["messages"])
+
+
+def _answer_cache_segment_key(data):
+    from app.flask_app import answer_cache
+
+    segment = data["segment"].replace(data["segmentation"] + "_", "")
+    return answer_cache.make_segment_key(data["survey"], data["segmentation"], segment)
+
+
+def _get_cached_answer(namespace, data, question, has_history):
+    """
+    Looks the question up in the answer cache of the segment, which only holds answers given without history. The
+    summary of the older turns of a conversation is history too.
+
+    Returns:
+        tuple: The cached answer or None, and the embedding of the question to cache its answer with.
+    """
+    if has_history or data.get("summary") or not current_app.config["ANSWER_CACHE_ENABLED"]:
+        return None, None
+    from app.flask_app import answer_cache
+
+    embedding = get_cached_embedding(question)
+    answer, level = answer_cache.get(namespace, _answer_cache_segment_key(data), question, embedding)
+    if answer is not None:
+        logger.info(f"Answer served from the {level} answer cache")
+        metrics.increment(f"answer_cache.{level}_hits")
+    return answer, embedding
+
+
+def _cache_answer(namespace, data, question, answer, embedding, has_history):
+    if has_history or data.get("summary") or not current_app.config["ANSWER_CACHE_ENABLED"]:
+        return
+    from app.flask_app import answer_cache
+
+    answer_cache.set(namespace, _answer_cache_segment_key(data), question, answer, embedding)
+
+
+def _create_answer_message(conversation_id, answer, message_id=None):
     """
     Creates and saves a message object for the chatbot's answer in the conversation.
 
     Args:
         conversation_id (str): The unique identifier of the conversation.
         answer (str): The chatbot's answer to the user's question.
+        message_id (str): The id of the message, generated by MongoDB if None.
 
     Returns:
         Message: The created Message object for the chatbot's answer.
     """
     message = Message(
-        user_id=g.user["id"], conversation_id=conversation_id, content=answer, role="assistant", is_bot=True
+        id=message_id,
+        user_id=g.user["id"],
+        conversation_id=conversation_id,
+        content=answer,
+        role="assistant",
+        is_bot=True,
     )
     message.save()
     return message
 
 
-def _update_chat_history(conversation_id, data, question, answer):
+def _update_chat_history(conversation_id, data, question_message, answer_message, sub=None):
     """
     Updates the chat history in the cache with the new question-answer pair.
 
     Args:
         conversation_id (str): The unique identifier of the conversation.
         data (dict): The current conversation data.
-        question (str): The user's question.
-        answer (str): The chatbot's answer.
+        question_message (dict): The GPT message of the user's question.
+        answer_message (dict): The GPT message of the chatbot's answer.
+        sub (str): The subject of the token the conversation is cached for, read from the request JWT if None.
+
+    Returns:
+        None
+    """
+    data["messages"].extend([question_message, answer_message])
+    data["history"].append((question_message["content"], answer_message["content"]))
+    policy = HistoryPolicy.from_config(current_app.config)
+    cache_service = MessageCacheService(sub=sub)
+    cache_service.append_turn(conversation_id, question_message, answer_message, max_turns=policy.cached_turns)
+    if policy.needs_summary(data):
+        try:
+            summarize_history.delay(conversation_id, cache_service.decoded_values["sub"])
+        except Exception as e:
+            # The turns stay in the history until a later message queues their summary
+            logger.exception(e)
+
+
+def process_history_summary(conversation_id, sub):
+    """
+    Folds the turns of a conversation older than its last HISTORY_MAX_TURNS into its summary, in a celery worker.
+
+    The turns are read from MongoDB. The summary is saved on the conversation with the creation time of the last
+    message it covers, so rebuilding the cache only loads the later turns, and the cached conversation then drops the
+    summarized turns. If the summary cannot be generated, nothing changes and the turns are summarized by a later task.
+
+    Args:
+        conversation_id (str): The unique identifier of the conversation.
+        sub (str): The subject of the token the conversation is cached for.
 
     Returns:
         None
     """
-    new_chat_history = (question, answer)
-    data["history"].append(new_chat_history)
-    MessageCacheService().set_data(conversation_id, data)
+    from app.flask_app import redis_db
+
+    lock_key = f"history_summary__{conversation_id}"
+    if not redis_db.set(lock_key, 1, nx=True, ex=300):
+        logger.info(f"The history of conversation {conversation_id} is already being summarized")
+        return
+    try:
+        conversation = Conversation.objects(id=conversation_id).first()
+        if conversation is None:
+            return
+        previous_summarized_at = conversation.history_summarized_at
+        filters = {"conversation_id": conversation_id, "is_visible": True, "role__not__in": ["initial"]}
+        if previous_summarized_at is not None:
+            filters["created_at__gt"] = previous_summarized_at
+
+        policy = HistoryPolicy.from_config(current_app.config)
+        # The turns beyond the cached ones are not summarized, like they are not loaded in the cache
+        messages = Message.objects(**filters).order_by("-created_at").limit(2 * policy.cached_turns)
+        _, turns = HistoryPolicy.split_messages(list(reversed(list(messages))))
+        old_turns = policy.old_turns(turns)
+        if not old_turns:
+            return
+        answered_turns = [(turn[0].content, turn[1].content) for turn in old_turns if len(turn) > 1]
+        summary = policy.update_summary(conversation.history_summary or "", answered_turns)
+        if summary is None:
+            return
+
+        summarized_at = old_turns[-1][-1].created_at
+        updated = Conversation.objects(id=conversation_id, history_summarized_at=previous_summarized_at).update_one(
+            set__history_summary=summary, set__history_summarized_at=summarized_at
+        )
+        if not updated:
+            return
+        cache_service = MessageCacheService(sub=sub)
+        applied = cache_service.apply_summary(
+            conversation_id,
+            summary,
+            summarized_at.isoformat(),
+            previous_summarized_at.isoformat() if previous_summarized_at else None,
+            len(answered_turns),
+            policy.max_turns,
+        )
+        if not applied:
+            # The cached turns may not be the ones summarized, the conversation is rebuilt from MongoDB
+            cache_service.invalidate_conversation(conversation_id)
+    finally:
+        redis_db.delete(lock_key)
@@ -0,0 +1,15 @@
+from app.factories.extensions import celery
+
+
+@celery.task(name="messages.generate_answer")
+def generate_answer(job_id):
+    from .service import process_message_job
+
+    process_message_job(job_id)
+
+
+@celery.task(name="messages.summarize_history")
+def summarize_history(conversation_id, sub):
+    from .service import process_history_summary
+
+    process_history_summary(conversation_id, sub)
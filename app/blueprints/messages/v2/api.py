@@ -1,11 +1,16 @@
 import logging
 
-from flask import Blueprint, abort, request
+from flask import Blueprint, abort, current_app, request
 
-from app.utils.request_response_utils import make_json_response
+from app.utils.request_response_utils import make_event_stream_response, make_json_response
 
 from ..serializer import serialize
-from ..service import process_create_message_langchain
+from ..service import (
+    fetch_message_job,
+    process_create_message_langchain,
+    process_create_message_langchain_stream,
+    process_enqueue_message_langchain,
+)
 
 logger = logging.getLogger("qudo")
 
@@ -17,5 +22,24 @@ def create_message():
     if not request.is_json:
         abort(400, description="Missing json in the request")
     payload = request.get_json()
+    if current_app.config["MESSAGE_BACKGROUND_JOBS"]:
+        response = process_enqueue_message_langchain(payload)
+        return make_json_response(response, 202)
     response = process_create_message_langchain(payload)
     return make_json_response(response, 200)
+
+
+@message_v2_bp.route("/stream", methods=["POST"])
+def create_message_stream():
+    if not request.is_json:
+        abort(400, description="Missing json in the request")
+    payload = request.get_json()
+    events = process_create_message_langchain_stream(payload)
+    return make_event_stream_response(events)
+
+
+@message_v2_bp.route("/jobs/<message_id>", methods=["GET"])
+def get_message_job(message_id):
+    wait = request.args.get("wait", 0, type=float)
+    response = fetch_message_job(message_id, wait=wait)
+    return make_json_response(response, 200)
@@ -3,15 +3,11 @@ import uuid
 
 from flask import abort, current_app
 
-from app.blueprints.messages.service import (
-    _generate_chatbot_response,
-    _initialize_data_handlers,
-)
+from app.blueprints.messages.service import _generate_chatbot_response
 
 from ...utils.chatbot.chatbot_utils import create_gpt_prompt
 from ...utils.chatbot.gpt_utils.chatgpt_bot import Chatbot
 from ...utils.chatbot.gpt_utils.information_retrieval import get_description
-from ...utils.chatbot.langchain_utils import PythiaQuestionGenerator
 from ..messages.serializer import serialize_gpt_prompt, serialize_langchain_prompt_list
 from .models.message import Message
 from .models.trial import Trial
@@ -91,6 +87,7 @@ def process_add_message(trial_id, payload):
         segment_id=segment_id,
         segment_description=seg_description,
         messages=[],
+        answer_tokens=current_app.config["GPT_ANSWER_TOKENS"],
     )
     if len(messages) == 1:
         messages = chatbot.generate_base_message([], [])
@@ -135,7 +132,7 @@ def process_add_llm_message(trial_id, payload):
     if len(trial.messages) >= current_app.config["TRIAL_THRESHOLD"]:
         abort(400, description="Trial has expired. You have reached the maximum amount of messages allowed.")
 
-    # Initialize data handlers
+    # Conversation data used to look up the segment chatbot
     data = {
         "segmentation": trial.segmentation,
         "segment": trial.segment,
@@ -143,13 +140,11 @@ def process_add_llm_message(trial_id, payload):
         "survey_id": trial.survey_id,
         "survey": trial.survey,
     }
-    data_handler, mongo_handler = _initialize_data_handlers(current_app.config, data)
 
     # Generate answer to the question
     question = payload["question"]
     history = _get_history_except_initial(trial) if len(trial.messages) > 1 else []
-    question_generator = PythiaQuestionGenerator(data_handler, current_app.config["OPENAI_API_KEY"])
-    answer = _generate_chatbot_response(question_generator, mongo_handler, question, history)
+    answer = _generate_chatbot_response(current_app.config, data, question, history)
 
     # Create and append messages
     question_message = create_trial_message(question, role="user", is_bot=False)
@@ -0,0 +1,10 @@
+from app.utils.cache_utils.answer_cache_service import AnswerCacheService
+
+
+def setup_answer_cache(app):
+    return AnswerCacheService(
+        timeout=app.config["ANSWER_CACHE_TIMEOUT"],
+        similarity_threshold=app.config["ANSWER_CACHE_SIMILARITY_THRESHOLD"],
+        max_entries=app.config["ANSWER_CACHE_MAX_ENTRIES"],
+        local_ttl=app.config["ANSWER_CACHE_LOCAL_TTL"],
+    )
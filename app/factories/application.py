@@ -32,7 +32,12 @@ def setup_app():
 
     @app.after_request
     def set_default_content_type(response):
-        if response.headers.get("content-type") not in ["application/pdf", "application/json", "text/html"]:
+        if response.headers.get("content-type") not in [
+            "application/pdf",
+            "application/json",
+            "text/html",
+            "text/event-stream",
+        ]:
             response.headers["content-type"] = "application/json"
         return response
 
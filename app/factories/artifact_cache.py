@@ -0,0 +1,10 @@
+from app.utils.cache_utils.artifact_cache import S3ArtifactCache
+
+
+def setup_artifact_cache(app):
+    return S3ArtifactCache(
+        cache_dir=app.config["ARTIFACT_CACHE_DIR"],
+        revalidate_after=app.config["ARTIFACT_REVALIDATE_SECONDS"],
+        max_size=app.config["ARTIFACT_CACHE_MAX_SIZE"],
+        derived_max_size=app.config["ARTIFACT_DERIVED_MAX_SIZE"],
+    )
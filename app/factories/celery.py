@@ -1,19 +1,21 @@
-# from app.factories.extensions import celery
-#
-#
-# def setup_celery(app):
-#     celery.conf.update(
-#         broker_url=app.config['CELERY_BROKER_URL']
-#     )
-#     celery.conf.update(app.config)
-#     TaskBase = celery.Task
-#
-#     class ContextTask(TaskBase):
-#         abstract = True
-#
-#         def __call__(self, *args, **kwargs):
-#             with app.app_context():
-#                 return TaskBase.__call__(self, *args, **kwargs)
-#
-#     celery.Task = ContextTask
-#     return celery
+from app.factories.extensions import celery
+
+
+def setup_celery(app):
+    celery.conf.update(
+        broker_url=app.config["CELERY_BROKER_URL"],
+        task_always_eager=app.config["CELERY_TASK_ALWAYS_EAGER"],
+        task_ignore_result=True,
+        worker_prefetch_multiplier=1,
+    )
+    TaskBase = celery.Task
+
+    class ContextTask(TaskBase):
+        abstract = True
+
+        def __call__(self, *args, **kwargs):
+            with app.app_context():
+                return TaskBase.__call__(self, *args, **kwargs)
+
+    celery.Task = ContextTask
+    return celery
@@ -0,0 +1,5 @@
+from app.utils.chatbot.chain_registry import ChainRegistry
+
+
+def setup_chain_registry(app):
+    return ChainRegistry(max_size=app.config["CHAIN_REGISTRY_MAX_SIZE"], ttl=app.config["CHAIN_REGISTRY_TTL"])
@@ -0,0 +1,5 @@
+from app.utils.cache_utils.condensed_question_cache_service import CondensedQuestionCacheService
+
+
+def setup_condense_cache(app):
+    return CondensedQuestionCacheService(timeout=app.config["CONDENSE_CACHE_TIMEOUT"])
@@ -0,0 +1,9 @@
+from app.utils.cache_utils.embedding_cache_service import EmbeddingCacheService
+
+
+def setup_embedding_cache(app):
+    return EmbeddingCacheService(
+        max_size=app.config["EMBEDDING_CACHE_MAX_SIZE"],
+        timeout=app.config["EMBEDDING_CACHE_TIMEOUT"],
+        dtype=app.config["EMBEDDING_CACHE_DTYPE"],
+    )
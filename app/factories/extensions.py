@@ -1,4 +1,6 @@
+from celery import Celery
 from flask_pymongo import PyMongo
 
 
 mongo = PyMongo()
+celery = Celery("pythia")
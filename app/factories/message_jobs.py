@@ -0,0 +1,5 @@
+from app.utils.cache_utils.message_job_service import MessageJobService
+
+
+def setup_message_jobs(app):
+    return MessageJobService(timeout=app.config["MESSAGE_JOB_TIMEOUT"])
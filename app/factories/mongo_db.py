@@ -1,6 +1,14 @@
-import certifi
 from mongoengine import connect
 
+from app.utils.mongo_pool import mongo_clients
+
 
 def setup_mongo_db(app):
-    return connect(host=app.config["MONGO_DB_URL"], alias="default", connect=False, tlsCAFile=certifi.where())
+    mongo_clients.configure(
+        maxPoolSize=app.config["MONGO_MAX_POOL_SIZE"],
+        minPoolSize=app.config["MONGO_MIN_POOL_SIZE"],
+        maxIdleTimeMS=app.config["MONGO_MAX_IDLE_TIME_MS"],
+        waitQueueTimeoutMS=app.config["MONGO_WAIT_QUEUE_TIMEOUT_MS"],
+    )
+    # connect=False defers opening connections to the first query, which runs in the forked worker
+    return connect(host=app.config["MONGO_DB_URL"], alias="default", connect=False, **mongo_clients.client_options())
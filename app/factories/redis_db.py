@@ -1,8 +1,33 @@
 import redis
 
+from app.utils.redis_util import PythiaRedis
+
+
+def _setup_connection_pool(app, max_connections):
+    # A blocking pool, so the greenlets of a worker wait for a free connection instead of opening more
+    return redis.BlockingConnectionPool(
+        host=app.config["REDIS_URL"],
+        port=app.config["REDIS_PORT"],
+        db=app.config["REDIS_DB"],
+        max_connections=max_connections,
+        timeout=app.config["REDIS_POOL_TIMEOUT"],
+        socket_timeout=app.config["REDIS_SOCKET_TIMEOUT"],
+        socket_connect_timeout=app.config["REDIS_SOCKET_CONNECT_TIMEOUT"],
+        health_check_interval=app.config["REDIS_HEALTH_CHECK_INTERVAL"],
+    )
+
 
 def setup_redis_db(app):
     # TODO: write some code to disconnect and close the connection on program exit
-    redis_db = redis.Redis(host=app.config['REDIS_URL'], port=app.config['REDIS_PORT'], db=app.config["REDIS_DB"])
+    redis_db = PythiaRedis(
+        connection_pool=_setup_connection_pool(app, app.config["REDIS_MAX_CONNECTIONS"]),
+        client_cache_ttl=app.config["REDIS_CLIENT_CACHE_TTL"],
+        client_cache_max_size=app.config["REDIS_CLIENT_CACHE_MAX_SIZE"],
+    )
     return redis_db
 
+
+def setup_redis_pubsub(app):
+    # The subscriptions of the requests waiting for a message job hold their connection for up to a minute, they get
+    # their own pool so they cannot starve the commands of the other requests
+    return PythiaRedis(connection_pool=_setup_connection_pool(app, app.config["REDIS_PUBSUB_MAX_CONNECTIONS"]))
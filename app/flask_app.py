@@ -1,10 +1,17 @@
 from flask_cors import CORS
 from flask_jwt_extended import JWTManager
 
+from app.factories.answer_cache import setup_answer_cache
+from app.factories.artifact_cache import setup_artifact_cache
 from app.factories.application import setup_app
+from app.factories.celery import setup_celery
+from app.factories.chain_registry import setup_chain_registry
+from app.factories.condense_cache import setup_condense_cache
+from app.factories.embedding_cache import setup_embedding_cache
 from app.factories.logging import setup_logging
+from app.factories.message_jobs import setup_message_jobs
 from app.factories.mongo_db import setup_mongo_db
-from app.factories.redis_db import setup_redis_db
+from app.factories.redis_db import setup_redis_db, setup_redis_pubsub
 from app.factories.sentry import setup_sentry
 
 flask_app = setup_app()
@@ -14,6 +21,14 @@ setup_sentry(flask_app)
 mongo_client = setup_mongo_db(flask_app)
 jwt = JWTManager(flask_app)
 redis_db = setup_redis_db(flask_app)
+redis_pubsub = setup_redis_pubsub(flask_app)
+chain_registry = setup_chain_registry(flask_app)
+artifact_cache = setup_artifact_cache(flask_app)
+embedding_cache = setup_embedding_cache(flask_app)
+answer_cache = setup_answer_cache(flask_app)
+condense_cache = setup_condense_cache(flask_app)
+message_jobs = setup_message_jobs(flask_app)
+celery = setup_celery(flask_app)
 
 CORS(flask_app, expose_headers="*")
 
@@ -1,19 +1,73 @@
 import logging
 
-import requests
 from flask import current_app
 from requests.auth import HTTPDigestAuth
 
+from app.utils.http_client import get_http_client
+
 logger = logging.getLogger("qudo")
 
+# Statuses of Atlas Search indexes that can be queried, from the v1.0 and v2 Admin APIs
+QUERYABLE_INDEX_STATUSES = {"STEADY", "READY", "STALE"}
+
+
+class SearchIndexNotReadyError(Exception):
+    """Exception raised when the Atlas Search index of a collection is still building.
+
+    Attributes:
+        collection_name -- The collection the index is built on
+        message -- explanation of the error
+    """
+
+    def __init__(self, collection_name, message="The search index is still being built, please try again shortly"):
+        self.collection_name = collection_name
+        self.message = message
+        super().__init__(self.message)
+
 
 class AtlasSearchUtils:
-    def __init__(self, username: str, password: str, group_id: str, cluster_name: str):
+    def __init__(
+        self,
+        username: str,
+        password: str,
+        group_id: str,
+        cluster_name: str,
+        timeout: float = 10,
+        connect_timeout: float = 3,
+        retries: int = 2,
+        failure_threshold: int = 5,
+        reset_timeout: float = 30,
+    ):
         self.base_url = "https://cloud.mongodb.com/api/atlas/v1.0"
+        self.v2_base_url = "https://cloud.mongodb.com/api/atlas/v2"
         self.headers = {"Content-Type": "application/json"}
         self.auth = HTTPDigestAuth(username, password)
         self.group_id = group_id
         self.cluster_name = cluster_name
+        self.timeout = timeout
+
+        # Keeps the connections to the Admin API alive between calls, and fails fast while it is degraded
+        self.http_client = get_http_client(
+            "atlas_admin_api",
+            connect_timeout=connect_timeout,
+            read_timeout=timeout,
+            retries=retries,
+            failure_threshold=failure_threshold,
+            reset_timeout=reset_timeout,
+        )
+
+    @staticmethod
+    def settings_from_config(config):
+        """
+        Returns the timeouts, retries and circuit breaker settings of the Admin API client in the app config.
+        """
+        return {
+            "timeout": config["ATLAS_ADMIN_API_READ_TIMEOUT"],
+            "connect_timeout": config["ATLAS_ADMIN_API_CONNECT_TIMEOUT"],
+            "retries": config["ATLAS_ADMIN_API_RETRIES"],
+            "failure_threshold": config["HTTP_CIRCUIT_FAILURE_THRESHOLD"],
+            "reset_timeout": config["HTTP_CIRCUIT_RESET_TIMEOUT"],
+        }
 
     def create_index(self, db_name, collection_name, index_name):
         """
@@ -38,7 +92,9 @@ class AtlasSearchUtils:
             "name": index_name,
         }
 
-        response = requests.post(api_url, json=index_definition, auth=self.auth, headers=self.headers)
+        response = self.http_client.post(
+            api_url, json=index_definition, headers=self.headers, auth=self.auth, timeout=self._timeouts()
+        )
         logger.info(response.json())
         return response.json()
 
@@ -55,7 +111,7 @@ class AtlasSearchUtils:
         bool: True if the index exists, False otherwise.
         """
         url = f"{self.base_url}/groups/{self.group_id}/clusters/{self.cluster_name}/fts/indexes/{db_name}/{collection_name}"
-        response = requests.get(url, auth=self.auth)
+        response = self.http_client.get(url, auth=self.auth, timeout=self._timeouts())
 
         if response.status_code == 200:
             indexes = response.json()
@@ -66,3 +122,30 @@ class AtlasSearchUtils:
         else:
             logger.error(f"Failed to retrieve index information. Status Code: {response.status_code}")
             return False
+
+    def list_search_indexes(self):
+        """
+        List the Atlas Search indexes of every collection in the cluster with a single call.
+
+        Returns:
+        list: The index definitions, with their database, collectionName, name and status.
+
+        Raises:
+        requests.RequestException: If the Atlas API cannot be reached or returns an error.
+        """
+        url = f"{self.v2_base_url}/groups/{self.group_id}/clusters/{self.cluster_name}/search/indexes"
+        response = self.http_client.get(
+            url,
+            headers={"Accept": "application/vnd.atlas.2024-05-30+json"},
+            auth=self.auth,
+            timeout=self._timeouts(),
+        )
+        response.raise_for_status()
+        return response.json()
+
+    def _timeouts(self):
+        return self.http_client.timeout[0], self.timeout
+
+    @staticmethod
+    def is_index_queryable(index):
+        return bool(index.get("queryable")) or index.get("status") in QUERYABLE_INDEX_STATUSES
@@ -0,0 +1,188 @@
+import hashlib
+import logging
+import re
+
+import numpy as np
+from redis import RedisError
+
+from app.utils.redis_util import RedisClientMixin
+
+from .local_cache import LocalCache
+
+logger = logging.getLogger("qudo")
+
+
+class AnswerCacheService(RedisClientMixin):
+    """
+    Caches the answers of the chatbots per segment, so a question already asked of a segment does not call GPT again.
+
+    The exact level is keyed by the normalized question. The semantic level keeps the embeddings of the cached
+    questions of a segment in a Redis hash, and answers a new question with the cached answer of the most similar
+    question when their cosine similarity reaches similarity_threshold. The embeddings are loaded into a matrix kept
+    per worker for local_ttl seconds, so answers cached by other workers are found once it expires.
+
+    Every key includes the version of its segment, so invalidating a segment drops all its answers at once.
+    Answers only depend on the question when the conversation has no history, callers must not use the cache otherwise.
+
+        Attributes:
+            timeout (int): The number of seconds an answer is kept in Redis.
+
+            similarity_threshold (float): The cosine similarity above which a question gets the answer of a cached one.
+
+            max_entries (int): The maximum number of questions of a segment in the semantic level.
+    """
+
+    KEY_PREFIX = "answer_cache"
+    EXACT = "exact"
+    SEMANTIC = "semantic"
+
+    def __init__(
+        self,
+        timeout=86400,
+        similarity_threshold=0.97,
+        max_entries=1000,
+        local_ttl=60,
+        dtype="float32",
+        redis_client=None,
+    ):
+        self.timeout = timeout
+        self.similarity_threshold = similarity_threshold
+        self.max_entries = max_entries
+        self.dtype = np.dtype(dtype)
+        self._matrices = LocalCache(max_size=256, ttl=local_ttl)
+        self._redis_client = redis_client
+        self.exact_hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+        self.redis_errors = 0
+
+    @staticmethod
+    def make_segment_key(survey_name, segmentation, segment):
+        return f"{survey_name}__{segmentation}__{segment}"
+
+    @staticmethod
+    def normalize_question(question):
+        return re.sub(r"[\s?!.]+$", "", " ".join(question.lower().split()))
+
+    def question_hash(self, question):
+        return hashlib.sha1(self.normalize_question(question).encode("utf-8")).hexdigest()
+
+    def _version_key(self, segment_key):
+        return f"{self.KEY_PREFIX}__version__{segment_key}"
+
+    def _namespace_key(self, namespace, segment_key, version):
+        return f"{self.KEY_PREFIX}__{namespace}__{segment_key}__v{version}"
+
+    def _get_version(self, segment_key):
+        return int(self.redis_client.get(self._version_key(segment_key)) or 0)
+
+    def get(self, namespace, segment_key, question, embedding=None):
+        """
+        Gets the cached answer of a question asked of a segment.
+
+        Args:
+            namespace (str): Separates the answers of different chatbots, e.g. the v1 and v2 message paths.
+            segment_key (str): The segment, from make_segment_key.
+            question (str): The question, asked without conversation history.
+            embedding (list, optional): The embedding of the question, to look the semantic level up.
+
+        Returns:
+            tuple: The cached answer and the level it was found in, or (None, None) on a miss.
+        """
+        try:
+            namespace_key = self._namespace_key(namespace, segment_key, self._get_version(segment_key))
+            question_hash = self.question_hash(question)
+            answer = self.redis_client.get(f"{namespace_key}__{question_hash}")
+            if answer is not None:
+                self.exact_hits += 1
+                return answer.decode("utf-8"), self.EXACT
+
+            if embedding is not None:
+                similar_hash = self._find_similar_question(namespace_key, embedding)
+                if similar_hash is not None and similar_hash != question_hash:
+                    answer = self.redis_client.get(f"{namespace_key}__{similar_hash}")
+                    if answer is not None:
+                        self.semantic_hits += 1
+                        return answer.decode("utf-8"), self.SEMANTIC
+        except RedisError as e:
+            self.redis_errors += 1
+            logger.warning(f"Could not read answer from redis: {e}")
+
+        self.misses += 1
+        return None, None
+
+    def set(self, namespace, segment_key, question, answer, embedding=None):
+        """
+        Caches the answer of a question asked of a segment.
+
+        Args:
+            namespace (str): Separates the answers of different chatbots, e.g. the v1 and v2 message paths.
+            segment_key (str): The segment, from make_segment_key.
+            question (str): The question, asked without conversation history.
+            answer (str): The answer.
+            embedding (list, optional): The embedding of the question, to add it to the semantic level.
+        """
+        try:
+            namespace_key = self._namespace_key(namespace, segment_key, self._get_version(segment_key))
+            question_hash = self.question_hash(question)
+            self.redis_client.set(f"{namespace_key}__{question_hash}", answer, self.timeout)
+
+            semantic_key = f"{namespace_key}__{self.SEMANTIC}"
+            if embedding is not None and self.redis_client.hlen(semantic_key) < self.max_entries:
+                self.redis_client.hset(semantic_key, question_hash, np.asarray(embedding, dtype=self.dtype).tobytes())
+                self.redis_client.expire(semantic_key, self.timeout)
+                self._matrices.pop(semantic_key)
+        except RedisError as e:
+            self.redis_errors += 1
+            logger.warning(f"Could not write answer to redis: {e}")
+
+    def invalidate(self, segment_key):
+        """
+        Drops the cached answers of a segment, e.g. after its data is rebuilt.
+
+        Returns:
+            int: The new version of the segment.
+        """
+        version = self.redis_client.incr(self._version_key(segment_key))
+        logger.info(f"Invalidated the cached answers of {segment_key}, now at version {version}")
+        return version
+
+    def stats(self):
+        lookups = self.exact_hits + self.semantic_hits + self.misses
+        return {
+            "exact_hits": self.exact_hits,
+            "semantic_hits": self.semantic_hits,
+            "misses": self.misses,
+            "hit_rate": round((self.exact_hits + self.semantic_hits) / lookups, 4) if lookups else 0.0,
+            "redis_errors": self.redis_errors,
+            "semantic_matrices": self._matrices.stats(),
+        }
+
+    def _find_similar_question(self, namespace_key, embedding):
+        semantic_key = f"{namespace_key}__{self.SEMANTIC}"
+        entries = self._matrices.get(semantic_key)
+        if entries is None:
+            embeddings = self.redis_client.hgetall(semantic_key)
+            hashes = [question_hash.decode("utf-8") for question_hash in embeddings]
+            matrix = (
+                np.vstack([np.frombuffer(data, dtype=self.dtype) for data in embeddings.values()]) if hashes else None
+            )
+            if matrix is not None:
+                norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+                norms[norms == 0] = 1
+                matrix = matrix / norms
+            entries = (hashes, matrix)
+            self._matrices.set(semantic_key, entries)
+
+        hashes, matrix = entries
+        if not hashes:
+            return None
+        query = np.asarray(embedding, dtype=self.dtype)
+        norm = np.linalg.norm(query)
+        if norm == 0:
+            return None
+        scores = matrix @ (query / norm)
+        best = int(np.argmax(scores))
+        if scores[best] < self.similarity_threshold:
+            return None
+        return hashes[best]
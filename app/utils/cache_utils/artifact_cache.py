@@ -0,0 +1,246 @@
+import hashlib
+import io
+import logging
+import os
+import tempfile
+import threading
+import time
+from urllib.parse import urlparse
+
+import boto3
+import pandas as pd
+from botocore.exceptions import BotoCoreError, ClientError
+
+from .local_cache import LocalCache
+
+logger = logging.getLogger("qudo")
+
+NOT_MODIFIED_CODES = {"304", "NotModified"}
+NOT_FOUND_CODES = {"404", "NoSuchKey"}
+
+
+class _Artifact:
+    def __init__(self, etag, frame, checked_at):
+        self.etag = etag
+        self.frame = frame
+        self.checked_at = checked_at
+
+
+class S3ArtifactCache:
+    """
+    A tiered cache for parquet artifacts stored on S3.
+
+    Lookups go to the in-process cache first, then to a local on-disk parquet copy and finally to S3. Entries are
+    keyed by S3 uri and ETag: once an entry is older than revalidate_after seconds, it is revalidated with a
+    conditional GET so an unchanged object is never downloaded twice. Threads of a worker asking for the same cold
+    artifact share a single download, serialized by one of lock_stripes locks picked by the hash of its uri. Values derived from artifacts are kept until one of the artifacts changes.
+
+        Attributes:
+            cache_dir (str): The directory holding the on-disk parquet copies.
+
+            revalidate_after (float): The number of seconds an artifact is served without asking S3 for changes.
+
+            downloads (int): The number of objects downloaded from S3.
+
+            revalidations (int): The number of conditional requests answered with 304 Not Modified.
+    """
+
+    def __init__(self, cache_dir, revalidate_after=300, max_size=256, derived_max_size=64, lock_stripes=64):
+        self.cache_dir = cache_dir
+        self.revalidate_after = revalidate_after
+        self._artifacts = LocalCache(max_size=max_size)
+        self._derived = LocalCache(max_size=derived_max_size)
+        self._locks = [threading.Lock() for _ in range(lock_stripes)]
+        self._s3_client = None
+        self.downloads = 0
+        self.revalidations = 0
+
+    @property
+    def s3_client(self):
+        # Created lazily so each forked worker gets its own client
+        if self._s3_client is None:
+            self._s3_client = boto3.client("s3")
+        return self._s3_client
+
+    def read_parquet(self, uri: str) -> pd.DataFrame:
+        """
+        Loads a parquet artifact from the cache.
+
+        Args:
+            uri (str): The s3:// uri of the parquet file.
+
+        Returns:
+            pd.DataFrame: A copy of the cached data, safe to modify.
+
+        Raises:
+            FileNotFoundError: If the object does not exist on S3.
+        """
+        artifact = self._get_artifact(uri)
+        if artifact.frame is None:
+            raise FileNotFoundError(f"Cannot find {uri}")
+        return artifact.frame.copy()
+
+    def write_parquet(self, uri: str, frame: pd.DataFrame):
+        """
+        Writes a parquet artifact to S3 through boto3 and caches it, so it is not downloaded again.
+
+        Args:
+            uri (str): The s3:// uri of the parquet file.
+            frame (pd.DataFrame): The data to write.
+        """
+        buffer = io.BytesIO()
+        frame.to_parquet(buffer)
+        body = buffer.getvalue()
+
+        bucket, key = self._split_uri(uri)
+        etag = self.s3_client.put_object(Bucket=bucket, Key=key, Body=body)["ETag"]
+        logger.info(f"Uploaded {uri} ({len(body)} bytes)")
+        self._write_disk(uri, etag, body)
+        self._artifacts.set(uri, _Artifact(etag, frame.copy(), time.monotonic()))
+
+    def exists(self, uri: str) -> bool:
+        return self._get_artifact(uri).frame is not None
+
+    def invalidate(self, uri: str):
+        self._artifacts.pop(uri)
+
+    def get_etag(self, uri: str):
+        return self._get_artifact(uri).etag
+
+    def get_derived(self, key, uris, build):
+        """
+        Gets a value derived from artifacts, built once and rebuilt only when one of the artifacts changes on S3.
+
+        Args:
+            key (hashable): Identifies the derived value.
+            uris (list): The s3:// uris of the artifacts the value is built from.
+            build (callable): Builds the value, called without arguments.
+
+        Returns:
+            The value built by build, shared by the threads of the worker and not to be modified.
+        """
+        etags = tuple(self.get_etag(uri) for uri in uris)
+        entry = self._derived.get(key)
+        if entry is not None and entry[0] == etags:
+            return entry[1]
+        value = build()
+        self._derived.set(key, (etags, value))
+        return value
+
+    def stats(self):
+        stats = self._artifacts.stats()
+        stats["downloads"] = self.downloads
+        stats["revalidations"] = self.revalidations
+        stats["derived"] = self._derived.stats()
+        return stats
+
+    def _is_fresh(self, artifact):
+        return artifact is not None and time.monotonic() - artifact.checked_at < self.revalidate_after
+
+    def _get_artifact(self, uri):
+        artifact = self._artifacts.get(uri)
+        if self._is_fresh(artifact):
+            return artifact
+
+        with self._locks[hash(uri) % len(self._locks)]:
+            artifact = self._artifacts.get(uri, count=False)
+            if self._is_fresh(artifact):
+                return artifact
+            artifact = self._fetch(uri, artifact)
+            self._artifacts.set(uri, artifact)
+            return artifact
+
+    def _fetch(self, uri, artifact, conditional=True):
+        """
+        Revalidates an artifact against S3, reading it from disk or downloading it when needed.
+        """
+        bucket, key = self._split_uri(uri)
+        etag = None
+        if conditional:
+            etag = artifact.etag if artifact is not None else self._read_disk_etag(uri)
+
+        request = {"Bucket": bucket, "Key": key}
+        if etag:
+            request["IfNoneMatch"] = etag
+
+        try:
+            response = self.s3_client.get_object(**request)
+        except ClientError as e:
+            code = e.response.get("Error", {}).get("Code")
+            if code in NOT_MODIFIED_CODES:
+                self.revalidations += 1
+                if artifact is not None and artifact.etag == etag:
+                    return _Artifact(etag, artifact.frame, time.monotonic())
+                try:
+                    return self._read_disk(uri, etag)
+                except OSError:
+                    return self._fetch(uri, None, conditional=False)
+            if code in NOT_FOUND_CODES:
+                return _Artifact(None, None, time.monotonic())
+            return self._serve_stale(uri, artifact, etag, e)
+        except BotoCoreError as e:
+            return self._serve_stale(uri, artifact, etag, e)
+
+        body = response["Body"].read()
+        etag = response["ETag"]
+        self.downloads += 1
+        logger.info(f"Downloaded {uri} ({len(body)} bytes)")
+        self._write_disk(uri, etag, body)
+        return _Artifact(etag, pd.read_parquet(io.BytesIO(body)), time.monotonic())
+
+    def _serve_stale(self, uri, artifact, etag, error):
+        if artifact is not None:
+            logger.warning(f"Serving stale {uri}, S3 revalidation failed: {error}")
+            return _Artifact(artifact.etag, artifact.frame, time.monotonic())
+        if etag:
+            logger.warning(f"Serving {uri} from disk, S3 revalidation failed: {error}")
+            return self._read_disk(uri, etag)
+        raise error
+
+    @staticmethod
+    def _split_uri(uri):
+        parsed = urlparse(uri)
+        return parsed.netloc, parsed.path.lstrip("/")
+
+    def _disk_path(self, uri, suffix):
+        return os.path.join(self.cache_dir, hashlib.sha1(uri.encode("utf-8")).hexdigest() + suffix)
+
+    def _data_path(self, uri, etag):
+        return self._disk_path(uri, "-" + hashlib.sha1(etag.encode("utf-8")).hexdigest()[:16] + ".parquet")
+
+    def _read_disk_etag(self, uri):
+        etag_path = self._disk_path(uri, ".etag")
+        try:
+            with open(etag_path, "r") as f:
+                etag = f.read().strip()
+        except OSError:
+            return None
+        return etag if os.path.exists(self._data_path(uri, etag)) else None
+
+    def _read_disk(self, uri, etag):
+        return _Artifact(etag, pd.read_parquet(self._data_path(uri, etag)), time.monotonic())
+
+    def _write_disk(self, uri, etag, body):
+        """
+        Writes the parquet file, then the ETag pointing at it, so readers in other workers never see a partial file.
+        """
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            previous_etag = self._read_disk_etag(uri)
+            self._atomic_write(self._data_path(uri, etag), body)
+            self._atomic_write(self._disk_path(uri, ".etag"), etag.encode("utf-8"))
+            if previous_etag and previous_etag != etag:
+                os.remove(self._data_path(uri, previous_etag))
+        except OSError as e:
+            logger.warning(f"Could not write {uri} to the artifact cache: {e}")
+
+    def _atomic_write(self, path, content):
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir)
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(content)
+            os.replace(tmp_path, path)
+        except OSError:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
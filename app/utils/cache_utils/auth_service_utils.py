@@ -1,17 +1,26 @@
 import json
 
-import requests
 from flask import current_app, g
 
+from app.utils.http_client import get_http_client
+
 
 class AuthService:
     def __init__(self, auth_token=None):
         self.headers = {"Authorization": "Bearer " + auth_token, "Content-Type": "application/json"}
         self.base_url = current_app.config["AUTH_SERVICE_API"]
+        self.http_client = get_http_client(
+            "auth_service",
+            connect_timeout=current_app.config["AUTH_SERVICE_CONNECT_TIMEOUT"],
+            read_timeout=current_app.config["AUTH_SERVICE_READ_TIMEOUT"],
+            retries=current_app.config["AUTH_SERVICE_RETRIES"],
+            failure_threshold=current_app.config["HTTP_CIRCUIT_FAILURE_THRESHOLD"],
+            reset_timeout=current_app.config["HTTP_CIRCUIT_RESET_TIMEOUT"],
+        )
 
     def get_policy_data_from_role(self, role_id):
         url_to_hit = self.base_url + "/v1/roles/" + str(role_id)
-        response = requests.get(url_to_hit, headers=self.headers, allow_redirects=False)
+        response = self.http_client.get(url_to_hit, headers=self.headers, allow_redirects=False)
         json_response = response.json()
         if json_response.get("success"):
             return json_response["data"]["policies"]
@@ -19,7 +28,7 @@ class AuthService:
 
     def get_user_data_by_id(self, user_id):
         url_to_hit = self.base_url + "/v1/users/" + user_id
-        response = requests.get(url_to_hit, headers=self.headers, allow_redirects=False)
+        response = self.http_client.get(url_to_hit, headers=self.headers, allow_redirects=False)
         json_response = response.json()
         if json_response.get("success"):
             return json_response["data"]
@@ -0,0 +1,96 @@
+import hashlib
+import json
+import logging
+
+from redis import RedisError
+
+from app.utils.metrics import metrics
+from app.utils.redis_util import RedisClientMixin
+
+logger = logging.getLogger("qudo")
+
+
+class CondensedQuestionCacheService(RedisClientMixin):
+    """
+    Caches the standalone questions condensed from a chat history and a follow up question.
+
+    A standalone question is keyed by the segment chatbot, the hash of the chat history and the question, so a message
+    resent or regenerated in the same conversation state skips the condense question LLM round trip. The latency of
+    the LLM call is stored with the question, so every hit records the latency it saved.
+
+        Attributes:
+            timeout (int): The number of seconds a standalone question is kept in Redis.
+
+            hits (int): The number of condense steps served from Redis.
+
+            misses (int): The number of condense steps that called the LLM.
+
+            latency_saved_ms (float): The LLM latency saved by the hits, in milliseconds.
+    """
+
+    KEY_PREFIX = "condensed_question"
+
+    def __init__(self, timeout=86400, redis_client=None):
+        self.timeout = timeout
+        self._redis_client = redis_client
+        self.hits = 0
+        self.misses = 0
+        self.redis_errors = 0
+        self.latency_saved_ms = 0.0
+
+    def make_key(self, namespace, chat_history, question):
+        history_hash = hashlib.sha1(chat_history.encode("utf-8")).hexdigest()
+        question_hash = hashlib.sha1(" ".join(question.split()).encode("utf-8")).hexdigest()
+        return f"{self.KEY_PREFIX}__{namespace}__{history_hash}__{question_hash}"
+
+    def get(self, namespace, chat_history, question):
+        """
+        Gets the cached standalone question.
+
+        Args:
+            namespace (str): The segment chatbot, including everything else the standalone question depends on.
+            chat_history (str): The chat history given to the condense question LLM.
+            question (str): The follow up question.
+
+        Returns:
+            str: The standalone question, or None if it is not cached.
+        """
+        try:
+            data = self.redis_client.get(self.make_key(namespace, chat_history, question))
+        except RedisError as e:
+            self.redis_errors += 1
+            logger.warning(f"Could not read condensed question from redis: {e}")
+            data = None
+        if data is None:
+            self.misses += 1
+            metrics.increment("condense_cache.misses")
+            return None
+
+        cached = json.loads(data)
+        self.hits += 1
+        self.latency_saved_ms += cached["latency_ms"]
+        metrics.increment("condense_cache.hits")
+        metrics.observe("condense_cache.latency_saved_ms", cached["latency_ms"])
+        return cached["question"]
+
+    def set(self, namespace, chat_history, question, standalone_question, latency_ms):
+        """
+        Caches a standalone question with the latency of the LLM call that condensed it.
+        """
+        metrics.observe("condense_cache.llm_ms", latency_ms)
+        data = json.dumps({"question": standalone_question, "latency_ms": round(latency_ms, 1)})
+        try:
+            self.redis_client.set(self.make_key(namespace, chat_history, question), data, self.timeout)
+        except RedisError as e:
+            self.redis_errors += 1
+            logger.warning(f"Could not write condensed question to redis: {e}")
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "redis_errors": self.redis_errors,
+            "latency_saved_ms": round(self.latency_saved_ms, 1),
+        }
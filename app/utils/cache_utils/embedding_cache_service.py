@@ -0,0 +1,112 @@
+import hashlib
+import logging
+
+import numpy as np
+from redis import RedisError
+
+from app.utils.redis_util import RedisClientMixin
+
+from .local_cache import LocalCache
+
+logger = logging.getLogger("qudo")
+
+
+class EmbeddingCacheService(RedisClientMixin):
+    """
+    Caches the embeddings of questions, so a question asked again does not call the OpenAI embeddings API.
+
+    Embeddings are keyed by model and normalized text. They are kept in an in-process LRU cache backed by Redis,
+    where they are stored as raw float bytes shared by every worker, which is several times smaller than JSON.
+
+        Attributes:
+            timeout (int): The number of seconds an embedding is kept in Redis.
+
+            dtype (str): The float type the embeddings are stored as in Redis, float32 or float16.
+
+            redis_hits (int): The number of lookups missing the local cache and served from Redis.
+
+            redis_errors (int): The number of Redis calls that failed, which are treated as misses.
+    """
+
+    KEY_PREFIX = "embedding"
+
+    def __init__(self, max_size=2048, timeout=2592000, dtype="float32", redis_client=None):
+        self.timeout = timeout
+        self.dtype = np.dtype(dtype)
+        self._embeddings = LocalCache(max_size=max_size)
+        self._redis_client = redis_client
+        self.redis_hits = 0
+        self.redis_errors = 0
+
+    @staticmethod
+    def normalize_text(text):
+        return " ".join(text.split())
+
+    def make_key(self, model, text):
+        text_hash = hashlib.sha1(self.normalize_text(text).encode("utf-8")).hexdigest()
+        return f"{self.KEY_PREFIX}__{model}__{self.dtype.name}__{text_hash}"
+
+    def get(self, model, text):
+        """
+        Gets the cached embedding of a text.
+
+        Args:
+            model (str): The embedding model.
+            text (str): The embedded text.
+
+        Returns:
+            list: The embedding, or None if it is not cached.
+        """
+        key = self.make_key(model, text)
+        embedding = self._embeddings.get(key)
+        if embedding is not None:
+            return embedding
+
+        try:
+            data = self.redis_client.get(key)
+        except RedisError as e:
+            self.redis_errors += 1
+            logger.warning(f"Could not read embedding from redis: {e}")
+            return None
+        if data is None:
+            return None
+
+        self.redis_hits += 1
+        embedding = np.frombuffer(data, dtype=self.dtype).astype(float).tolist()
+        self._embeddings.set(key, embedding)
+        return embedding
+
+    def set(self, model, text, embedding):
+        key = self.make_key(model, text)
+        self._embeddings.set(key, embedding)
+        try:
+            self.redis_client.set(key, np.asarray(embedding, dtype=self.dtype).tobytes(), self.timeout)
+        except RedisError as e:
+            self.redis_errors += 1
+            logger.warning(f"Could not write embedding to redis: {e}")
+
+    def get_or_create(self, model, text, create_embedding):
+        """
+        Gets the cached embedding of a text, creating and caching it on a miss.
+
+        Args:
+            model (str): The embedding model.
+            text (str): The embedded text.
+            create_embedding (Callable[[], list]): Calls the embeddings API for the text.
+
+        Returns:
+            list: The embedding of the text.
+        """
+        embedding = self.get(model, text)
+        if embedding is None:
+            embedding = create_embedding()
+            self.set(model, text, embedding)
+        return embedding
+
+    def stats(self):
+        stats = self._embeddings.stats()
+        lookups = stats["hits"] + stats["misses"]
+        stats["redis_hits"] = self.redis_hits
+        stats["redis_errors"] = self.redis_errors
+        stats["total_hit_rate"] = round((stats["hits"] + self.redis_hits) / lookups, 4) if lookups else 0.0
+        return stats
@@ -0,0 +1,116 @@
+import threading
+import time
+from collections import OrderedDict
+
+_MISSING = object()
+
+
+class LocalCache:
+    """
+    A thread-safe, in-process LRU cache with an optional per-entry time to live.
+
+        Attributes:
+            max_size (int): The maximum number of entries kept before the least recently used one is evicted.
+
+            ttl (float): The number of seconds an entry stays valid, or None to keep entries until evicted.
+
+            hits (int): The number of lookups served from the cache.
+
+            misses (int): The number of lookups that found no valid entry.
+
+            evictions (int): The number of entries dropped to respect max_size.
+
+            expirations (int): The number of entries dropped because their ttl elapsed.
+    """
+
+    def __init__(self, max_size=128, ttl=None, clock=time.monotonic):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._clock = clock
+        self._entries = OrderedDict()
+        self._lock = threading.RLock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return self.get(key, _MISSING, count=False) is not _MISSING
+
+    def get(self, key, default=None, count=True):
+        """
+        Returns the value stored for the key and marks it as most recently used.
+
+        Args:
+            key (hashable): The cache key.
+            default (Any): The value returned when the key is missing or expired.
+            count (bool): Whether the lookup is recorded in the hit/miss counters.
+
+        Returns:
+            Any: The cached value or the default.
+        """
+        with self._lock:
+            entry = self._entries.get(key, _MISSING)
+            if entry is not _MISSING:
+                value, expires_at = entry
+                if expires_at is not None and expires_at <= self._clock():
+                    del self._entries[key]
+                    self.expirations += 1
+                else:
+                    self._entries.move_to_end(key)
+                    if count:
+                        self.hits += 1
+                    return value
+            if count:
+                self.misses += 1
+            return default
+
+    def set(self, key, value, ttl=None):
+        """
+        Stores the value for the key, evicting the least recently used entries if the cache is full.
+
+        Args:
+            key (hashable): The cache key.
+            value (Any): The value to store.
+            ttl (float, optional): Overrides the cache ttl for this entry.
+        """
+        ttl = self.ttl if ttl is None else ttl
+        expires_at = self._clock() + ttl if ttl is not None else None
+        with self._lock:
+            self._entries[key] = (value, expires_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def pop(self, key, default=None):
+        with self._lock:
+            entry = self._entries.pop(key, _MISSING)
+            return default if entry is _MISSING else entry[0]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        """
+        Returns the cache counters, used to size the cache for the expected number of keys.
+
+        Returns:
+            dict: The size, capacity and hit/miss/eviction counters of the cache.
+        """
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+            }
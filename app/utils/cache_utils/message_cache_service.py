@@ -1,82 +1,292 @@
 import json
 import logging
 
-from flask import abort
+from flask import abort, current_app
 from flask_jwt_extended import get_jwt, get_jwt_identity
 
 from app.blueprints.conversations.service import fetch_conversations
-from app.blueprints.messages.serializer import (
-    serialize_gpt_prompt_list,
-    serialize_langchain_prompt_list,
-)
+from app.blueprints.messages.serializer import serialize_gpt_prompt_list
 from app.utils.chatbot.gpt_utils.information_retrieval import get_description
+from app.utils.chatbot.history_policy import HistoryPolicy
+from app.utils.redis_util import RedisClientMixin
 
 logger = logging.getLogger("qudo")
 
+# Replaces the summary of a cached conversation and drops the turns it covers, unless the cached conversation expired
+# or its summary changed since the summarized turns were read
+APPLY_SUMMARY_SCRIPT = """
+if redis.call("EXISTS", KEYS[1]) == 0 or (redis.call("HGET", KEYS[1], "summarized_at") or "") ~= ARGV[1] then
+    return 0
+end
+redis.call("HSET", KEYS[1], "summary", ARGV[3], "summarized_at", ARGV[2])
+-- The oldest turns may already be trimmed, the last kept turns are never dropped
+local dropped = math.min(tonumber(ARGV[4]), math.max(redis.call("LLEN", KEYS[2]) - tonumber(ARGV[5]), 0))
+redis.call("LTRIM", KEYS[2], dropped, -1)
+return 1
+"""
 
-class MessageCacheService:
-    def __init__(self):
+
+class MessageCacheService(RedisClientMixin):
+    """
+    Caches the state of the conversations in Redis, per subject of the request token.
+
+    A conversation is stored as a hash of its metadata (survey, segment, description and history summary) and two
+    lists: its hidden base messages and the messages of its recent turns. Each message is stored once, as a compact
+    json [role, content, token_count] entry, and the GPT messages and langchain history of the conversation are both
+    built from it. A new turn is appended with RPUSH, so saving a message does not rewrite the conversation and
+    concurrent messages do not overwrite each other. Older turns are dropped, with LTRIM, once a summary covering them is
+    saved, or right away when HISTORY_SUMMARY is disabled, and the turns beyond HistoryPolicy.cached_turns are always
+    dropped.
+
+    The keys of the conversations of a subject are tracked in an index set, refreshed and expired with them, so all of
+    them are invalidated at once without scanning the keyspace.
+    """
+
+    META_FIELDS = (
+        "segmentation",
+        "segment",
+        "segment_id",
+        "survey_id",
+        "survey",
+        "seg_description",
+        "summary",
+        "summarized_at",
+    )
+
+    def __init__(self, sub=None, redis_client=None):
+        """
+        Args:
+            sub (str): The subject of the token the conversations are cached for, read from the request JWT if None.
+                Background jobs, which run outside of the request, pass the subject of the request that queued them.
+            redis_client (Redis): The Redis client, the app's if None.
+        """
         self.timeout = 1800
-        self.decoded_values = self.get_decoded_values()
+        self.decoded_values = self.get_decoded_values() if sub is None else {"payload": None, "sub": sub}
+        self._redis_client = redis_client
 
     @staticmethod
     def get_decoded_values():
         decoded_values = {"payload": get_jwt(), "sub": get_jwt_identity()}
         return decoded_values
 
+    def make_key(self, conversation_id, part):
+        return f"token_sub__{self.decoded_values['sub']}__{conversation_id}__{part}"
+
+    def make_keys(self, conversation_id):
+        return [self.make_key(conversation_id, part) for part in ("meta", "base", "turns")]
+
+    @property
+    def index_key(self):
+        return f"token_sub__{self.decoded_values['sub']}__index"
+
+    def _expire(self, pipeline, keys):
+        pipeline.sadd(self.index_key, *keys)
+        for key in [*keys, self.index_key]:
+            pipeline.expire(key, self.timeout)
+
+    @staticmethod
+    def encode_message(message):
+        return json.dumps([message["role"], message["content"], message.get("token_count")], separators=(",", ":"))
+
+    @staticmethod
+    def decode_message(entry):
+        role, content, token_count = json.loads(entry)
+        return {"role": role, "content": content, "token_count": token_count}
+
+    @staticmethod
+    def pair_turns(messages):
+        """
+        Pairs the questions of the turn messages with their answers, into the chat history of the langchain chatbot.
+        """
+        history = []
+        question = None
+        for message in messages:
+            if message["role"] == "user":
+                question = message["content"]
+            elif question is not None:
+                history.append((question, message["content"]))
+                question = None
+        return history
+
     def get_data(self, conversation_id):
-        from app.utils.redis_util import RedisUtil
+        pipeline = self.redis_client.pipeline(transaction=False)
+        pipeline.hgetall(self.make_key(conversation_id, "meta"))
+        pipeline.lrange(self.make_key(conversation_id, "base"), 0, -1)
+        pipeline.lrange(self.make_key(conversation_id, "turns"), 0, -1)
+        meta, base_entries, turn_entries = pipeline.execute()
 
-        data = RedisUtil.get_cached_data(f"token_sub__{self.decoded_values['sub']}__{conversation_id}")
-        if not data:
+        # A meta hash without its segment was not written by set_data, the conversation is no longer cached
+        if not meta or b"segment" not in meta:
             logger.info("data from db")
-            conversation = fetch_conversations({"id": conversation_id})
-            if not conversation:
-                abort(400, description="Conversation doesn't exists")
-            conversation = conversation.get()
-            logger.info(conversation.to_json())
-            data = {
-                "segmentation": conversation.segmentation,
-                "segment": conversation.segment,
-                "segment_id": conversation.segment_id,
-                "survey_id": conversation.survey_id,
-                "survey": conversation.survey,
-            }
-
-            from app.blueprints.messages.service import fetch_messages
-
-            messages = fetch_messages({"conversation_id": conversation_id, "role__not__in": ["initial"]})
-
-            data["messages"] = serialize_gpt_prompt_list(messages)
-            data["history"] = serialize_langchain_prompt_list(messages)
-
-            try:
-                data["seg_description"] = get_description(
-                    conversation.survey_id, conversation.segmentation, conversation.segment_id, environ="staging"
-                )
-            except FileNotFoundError as e:
-                logger.error(e)
-            except ValueError as e:
-                logger.error(e)
-            except Exception as e:
-                logger.error(e)
-
-            self.set_data(conversation_id, data)
-
-        else:
-            logger.info("data from redis cache")
-            data = str(data, "utf-8")
-            data = json.loads(data)
-            data["history"] = [tuple(item) for item in data["history"]]
+            return self._load_data(conversation_id)
+
+        logger.info("data from redis cache")
+        data = {field.decode("utf-8"): value.decode("utf-8") for field, value in meta.items()}
+        turn_messages = [self.decode_message(entry) for entry in turn_entries]
+        data["messages"] = [self.decode_message(entry) for entry in base_entries] + turn_messages
+        data["history"] = self.pair_turns(turn_messages)
+        data.setdefault("summary", "")
         return data
 
-    def set_data(self, conversation_id, data):
-        from app.utils.redis_util import RedisUtil
+    def _load_data(self, conversation_id):
+        conversation = fetch_conversations({"id": conversation_id})
+        if not conversation:
+            abort(400, description="Conversation doesn't exists")
+        conversation = conversation.get()
+        logger.info(conversation.to_json())
+        data = {
+            "segmentation": conversation.segmentation,
+            "segment": conversation.segment,
+            "segment_id": conversation.segment_id,
+            "survey_id": conversation.survey_id,
+            "survey": conversation.survey,
+        }
+
+        messages = self.fetch_recent_messages(conversation_id, conversation.history_summarized_at)
+        base_messages = serialize_gpt_prompt_list([message for message in messages if not message.is_visible])
+        turn_messages = HistoryPolicy.complete_turn_messages(
+            serialize_gpt_prompt_list([message for message in messages if message.is_visible])
+        )
+
+        data["messages"] = base_messages + turn_messages
+        data["history"] = self.pair_turns(turn_messages)
+        data["summary"] = conversation.history_summary or ""
+        if conversation.history_summarized_at:
+            data["summarized_at"] = conversation.history_summarized_at.isoformat()
+
+        try:
+            data["seg_description"] = get_description(
+                conversation.survey_id, conversation.segmentation, conversation.segment_id, environ="staging"
+            )
+        except FileNotFoundError as e:
+            logger.error(e)
+        except ValueError as e:
+            logger.error(e)
+        except Exception as e:
+            logger.error(e)
+
+        self.set_data(conversation_id, data, base_messages, turn_messages)
+        return data
+
+    @staticmethod
+    def fetch_recent_messages(conversation_id, summarized_at=None):
+        """
+        Fetches the hidden base messages of a conversation and the messages of its last HistoryPolicy.cached_turns
+        turns. When HISTORY_SUMMARY is enabled, only the turns that are not in its summary are fetched, the ones created
+        after summarized_at.
+        """
+        from app.blueprints.messages.service import fetch_messages
+
+        policy = HistoryPolicy.from_config(current_app.config)
+        filters = {"conversation_id": conversation_id, "role__not__in": ["initial"]}
+        base_messages = fetch_messages({**filters, "is_visible": False}, order_by="created_at") or []
+        turn_filters = {**filters, "is_visible": True}
+        if policy.summarize and summarized_at is not None:
+            turn_filters["created_at__gt"] = summarized_at
+        recent_messages = fetch_messages(turn_filters, order_by="-created_at", limit=2 * policy.cached_turns)
+        recent_messages = list(reversed(recent_messages)) if recent_messages else []
+        # A turn starts with its question
+        while recent_messages and recent_messages[0].is_bot:
+            recent_messages.pop(0)
+        return list(base_messages) + recent_messages
+
+    def set_data(self, conversation_id, data, base_messages, turn_messages):
+        """
+        Replaces the cached state of a conversation.
+
+        Args:
+            conversation_id (str): The unique identifier of the conversation.
+            data (dict): The conversation data, its metadata is cached.
+            base_messages (list): The hidden base messages of the GPT chatbot.
+            turn_messages (list): The messages of the recent turns.
+        """
+        keys = self.make_keys(conversation_id)
+        meta = {field: data[field] for field in self.META_FIELDS if data.get(field) is not None}
+        pipeline = self.redis_client.pipeline()
+        pipeline.delete(*keys)
+        pipeline.hset(keys[0], mapping=meta)
+        if base_messages:
+            pipeline.rpush(keys[1], *[self.encode_message(message) for message in base_messages])
+        if turn_messages:
+            pipeline.rpush(keys[2], *[self.encode_message(message) for message in turn_messages])
+        self._expire(pipeline, keys)
+        pipeline.execute()
+
+    def append_base_messages(self, conversation_id, messages):
+        """
+        Appends the hidden base messages created by the GPT chatbot for the first question of a conversation.
+        """
+        key = self.make_key(conversation_id, "base")
+        pipeline = self.redis_client.pipeline()
+        pipeline.rpush(key, *[self.encode_message(message) for message in messages])
+        self._expire(pipeline, [key])
+        pipeline.execute()
+
+    def append_turn(self, conversation_id, question, answer, max_turns):
+        """
+        Appends a turn to a conversation.
+
+        Args:
+            conversation_id (str): The unique identifier of the conversation.
+            question (dict): The GPT message of the question.
+            answer (dict): The GPT message of the answer.
+            max_turns (int): The number of turns kept, HistoryPolicy.cached_turns.
+        """
+        keys = self.make_keys(conversation_id)
+        pipeline = self.redis_client.pipeline()
+        pipeline.rpush(keys[2], self.encode_message(question), self.encode_message(answer))
+        pipeline.ltrim(keys[2], -2 * max_turns, -1)
+        self._expire(pipeline, keys)
+        pipeline.execute()
+
+    def apply_summary(self, conversation_id, summary, summarized_at, previous_summarized_at, turns, kept_turns):
+        """
+        Replaces the summary of a conversation and drops the oldest turns it now covers.
+
+        Nothing changes if the conversation is no longer cached, it is rebuilt from MongoDB with the new summary, or if
+        its summary changed since the summarized turns were read, the turns cached then may not be the ones summarized.
+        As the oldest of the summarized turns may already have been dropped by append_turn, the last kept_turns turns
+        are never dropped.
+
+        Args:
+            conversation_id (str): The unique identifier of the conversation.
+            summary (str): The new summary.
+            summarized_at (str): The iso creation time of the last message in the summary.
+            previous_summarized_at (str): The summarized_at of the previous summary, None if there was none.
+            turns (int): The number of turns the new summary covers.
+            kept_turns (int): The number of turns after them when they were read, HistoryPolicy.max_turns.
+
+        Returns:
+            bool: Whether the cached conversation was updated.
+        """
+        keys = self.make_keys(conversation_id)
+        apply = self.redis_client.register_script(APPLY_SUMMARY_SCRIPT)
+        args = [previous_summarized_at or "", summarized_at, summary, 2 * turns, 2 * kept_turns]
+        return bool(apply(keys=[keys[0], keys[2]], args=args))
 
-        data = json.dumps(data)
-        RedisUtil.set_cache_data(f"token_sub__{self.decoded_values['sub']}__{conversation_id}", data, self.timeout)
+    def invalidate_conversation(self, conversation_id):
+        """
+        Drops the cached state of a conversation.
+        """
+        keys = self.make_keys(conversation_id)
+        pipeline = self.redis_client.pipeline()
+        pipeline.delete(*keys)
+        pipeline.srem(self.index_key, *keys)
+        pipeline.execute()
 
     def invalidate_cache(self):
-        from app.utils.redis_util import RedisUtil
+        """
+        Drops the cached state of all the conversations of the subject.
 
-        RedisUtil.invalidate_cache_data("token_sub__%s" % self.decoded_values["sub"])
+        Returns:
+            int: The number of keys deleted.
+        """
+        keys = self.redis_client.smembers(self.index_key)
+        if not keys:
+            return 0
+        # Only the members read are removed, the keys of a conversation cached meanwhile stay indexed
+        pipeline = self.redis_client.pipeline()
+        pipeline.delete(*keys)
+        pipeline.srem(self.index_key, *keys)
+        deleted, _ = pipeline.execute()
+        return deleted
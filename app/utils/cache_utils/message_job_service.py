@@ -0,0 +1,135 @@
+import json
+import logging
+import time
+
+import redis
+
+from app.utils.redis_util import RedisClientMixin
+
+logger = logging.getLogger("qudo")
+
+
+class MessageJobService(RedisClientMixin):
+    """
+    Tracks the answers generated by background jobs, so the HTTP request that queued a question can return at once.
+
+    A job is keyed by the id of the answer message it creates and stored in Redis as json, with the status "pending",
+    "running", "done" (with the serialized answer message) or "failed" (with the error). Every change of status is
+    also published on the channel of the job, so clients can wait for the answer instead of polling. The waits
+    subscribe over their own redis client, whose pool bounds the connections they hold.
+
+        Attributes:
+            timeout (int): The number of seconds a job is kept in Redis.
+    """
+
+    KEY_PREFIX = "message_job"
+    PENDING = "pending"
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+    FINISHED_STATUSES = {DONE, FAILED}
+
+    def __init__(self, timeout=86400, redis_client=None, pubsub_client=None):
+        self.timeout = timeout
+        self._redis_client = redis_client
+        self._pubsub_client = pubsub_client
+
+    @property
+    def pubsub_client(self):
+        if self._pubsub_client is None:
+            from app.flask_app import redis_pubsub
+
+            self._pubsub_client = redis_pubsub
+        return self._pubsub_client
+
+    def make_key(self, job_id):
+        return f"{self.KEY_PREFIX}__{job_id}"
+
+    def create(self, job_id, user_id, sub, conversation_id, question):
+        """
+        Creates a pending job answering the question of a conversation.
+
+        Args:
+            job_id (str): The id of the answer message the job creates.
+            user_id (str): The user asking the question.
+            sub (str): The subject of the token of the request, which keys the conversation cache.
+            conversation_id (str): The unique identifier of the conversation.
+            question (str): The user's question.
+
+        Returns:
+            dict: The job.
+        """
+        job = {
+            "id": job_id,
+            "status": self.PENDING,
+            "user_id": user_id,
+            "sub": sub,
+            "conversation_id": conversation_id,
+            "question": question,
+            "created_at": time.time(),
+        }
+        self._save(job)
+        return job
+
+    def get(self, job_id):
+        data = self.redis_client.get(self.make_key(job_id))
+        if data is None:
+            return None
+        return json.loads(data)
+
+    def update(self, job_id, status, **fields):
+        """
+        Changes the status of a job and publishes it.
+
+        Args:
+            job_id (str): The id of the job.
+            status (str): The new status.
+            **fields: The fields to add to the job, e.g. the answer message or the error.
+
+        Returns:
+            dict: The job, or None if it expired.
+        """
+        job = self.get(job_id)
+        if job is None:
+            logger.warning(f"Message job {job_id} expired before being {status}")
+            return None
+        job.update(fields, status=status, updated_at=time.time())
+        self._save(job)
+        self.redis_client.publish(self.make_key(job_id), job["status"])
+        return job
+
+    def wait(self, job_id, timeout=60):
+        """
+        Waits for a job to finish.
+
+        Args:
+            job_id (str): The id of the job.
+            timeout (float): The number of seconds to wait.
+
+        Returns:
+            dict: The job, finished unless the timeout expired or too many requests are waiting, or None if it does not
+                exist.
+        """
+        pubsub = self.pubsub_client.pubsub(ignore_subscribe_messages=True)
+        try:
+            # Subscribed before reading the job, so a status published in between is not missed
+            pubsub.subscribe(self.make_key(job_id))
+        except redis.exceptions.ConnectionError as e:
+            logger.warning(f"Not waiting for message job {job_id}: {e}")
+            pubsub.close()
+            return self.get(job_id)
+        try:
+            deadline = time.monotonic() + timeout
+            job = self.get(job_id)
+            while job is not None and job["status"] not in self.FINISHED_STATUSES:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                if pubsub.get_message(timeout=min(remaining, 1.0)) is not None:
+                    job = self.get(job_id)
+            return job
+        finally:
+            pubsub.close()
+
+    def _save(self, job):
+        self.redis_client.set(self.make_key(job["id"]), json.dumps(job), self.timeout)
@@ -0,0 +1,193 @@
+import logging
+import threading
+import time
+
+import requests
+
+from app.utils.atlas_api_utils import AtlasSearchUtils, SearchIndexNotReadyError
+
+logger = logging.getLogger("qudo")
+
+
+class SearchIndexStatusCache:
+    """
+    Keeps the status of every Atlas Search index of a cluster, so chat requests do not call the Atlas Admin API.
+
+    The statuses of all the indexes of the cluster are listed with one call and kept for ttl seconds. Once they are
+    older than that, lookups keep serving them while a background thread lists them again. While an index is
+    building, the statuses are refreshed every poll_interval seconds instead so a ready index is picked up quickly.
+
+        Attributes:
+            READY (str): The index can be queried.
+
+            BUILDING (str): The index exists but cannot be queried yet.
+
+            MISSING (str): The index does not exist.
+
+            UNKNOWN (str): The statuses have never been listed because the Atlas API could not be reached.
+
+            atlas_client (AtlasSearchUtils): The Atlas Admin API client, reusing its connections.
+
+            ttl (float): The number of seconds the statuses are served before being listed again.
+
+            poll_interval (float): The number of seconds between two listings while an index is building.
+
+            poll_timeout (float): The number of seconds wait_until_queryable waits for an index.
+    """
+
+    READY = "READY"
+    BUILDING = "BUILDING"
+    MISSING = "MISSING"
+    UNKNOWN = "UNKNOWN"
+
+    def __init__(self, atlas_client, ttl=300, poll_interval=5, poll_timeout=600, clock=time.monotonic):
+        self.atlas_client = atlas_client
+        self.ttl = ttl
+        self.poll_interval = poll_interval
+        self.poll_timeout = poll_timeout
+        self._clock = clock
+        self._statuses = None
+        self._listed_at = None
+        self._created = set()
+        self._lock = threading.Lock()
+        self._refreshing = False
+        self.refreshes = 0
+        self.refresh_failures = 0
+
+    @staticmethod
+    def make_key(db_name, collection_name, index_name):
+        return db_name, collection_name, index_name
+
+    def get_status(self, db_name, collection_name, index_name):
+        """
+        Gets the status of an index. Only the first lookup of the worker waits for the indexes to be listed.
+
+        Args:
+            db_name (str): The name of the database.
+            collection_name (str): The name of the collection.
+            index_name (str): The name of the Atlas Search index.
+
+        Returns:
+            str: One of READY, BUILDING, MISSING or UNKNOWN.
+        """
+        if self._listed_at is None:
+            self.refresh(raise_errors=False)
+        elif self._is_stale():
+            self._refresh_in_background()
+
+        if self._statuses is None:
+            return self.UNKNOWN
+        return self._statuses.get(self.make_key(db_name, collection_name, index_name), self.MISSING)
+
+    def set_status(self, db_name, collection_name, index_name, status):
+        with self._lock:
+            statuses = dict(self._statuses or {})
+            key = self.make_key(db_name, collection_name, index_name)
+            statuses[key] = status
+            self._statuses = statuses
+            if status == self.BUILDING:
+                self._created.add(key)
+
+    def refresh(self, raise_errors=True):
+        """
+        Lists the statuses of all the indexes of the cluster.
+
+        Args:
+            raise_errors (bool): Whether a failing Atlas API call raises, otherwise the current statuses are kept.
+        """
+        try:
+            indexes = self.atlas_client.list_search_indexes()
+        except requests.RequestException as e:
+            self.refresh_failures += 1
+            logger.warning(f"Failed to list the Atlas Search indexes: {e}")
+            with self._lock:
+                # Wait before trying again rather than calling the failing API on every request
+                self._listed_at = self._clock()
+            if raise_errors:
+                raise
+            return
+
+        statuses = {
+            self.make_key(index.get("database"), index.get("collectionName"), index.get("name")): (
+                self.READY if self.atlas_client.is_index_queryable(index) else self.BUILDING
+            )
+            for index in indexes
+        }
+        with self._lock:
+            # An index created by this worker can take a moment to be listed
+            self._created.difference_update(statuses)
+            statuses.update({key: self.BUILDING for key in self._created})
+            self._statuses = statuses
+            self._listed_at = self._clock()
+            self.refreshes += 1
+
+    def wait_until_queryable(self, db_name, collection_name, index_name):
+        """
+        Polls the Atlas API until the index can be queried.
+
+        Raises:
+            SearchIndexNotReadyError: If the index is still not queryable after poll_timeout seconds.
+        """
+        deadline = self._clock() + self.poll_timeout
+        key = self.make_key(db_name, collection_name, index_name)
+        while True:
+            self.refresh(raise_errors=False)
+            if (self._statuses or {}).get(key) == self.READY:
+                return
+            if self._clock() >= deadline:
+                raise SearchIndexNotReadyError(collection_name)
+            logger.info(f"Waiting for Atlas Search index {index_name} on {collection_name}")
+            time.sleep(self.poll_interval)
+
+    def stats(self):
+        statuses = list((self._statuses or {}).values())
+        return {
+            "indexes": len(statuses),
+            "building": statuses.count(self.BUILDING),
+            "age": round(self._clock() - self._listed_at, 3) if self._listed_at is not None else None,
+            "refreshes": self.refreshes,
+            "refresh_failures": self.refresh_failures,
+        }
+
+    def _is_stale(self):
+        max_age = self.poll_interval if self.BUILDING in (self._statuses or {}).values() else self.ttl
+        return self._clock() - self._listed_at >= max_age
+
+    def _refresh_in_background(self):
+        with self._lock:
+            if self._refreshing:
+                return
+            self._refreshing = True
+
+        def refresh():
+            try:
+                self.refresh(raise_errors=False)
+            finally:
+                self._refreshing = False
+
+        threading.Thread(target=refresh, daemon=True).start()
+
+
+_caches = {}
+_caches_lock = threading.Lock()
+
+
+def get_search_index_cache(public_key, private_key, group_id, cluster, **atlas_settings):
+    """
+    Returns the index status cache of a cluster, shared by every MongoDBHandler of the process. The Atlas client of a
+    new cache is created with atlas_settings, see AtlasSearchUtils.settings_from_config.
+    """
+    key = (public_key, group_id, cluster)
+    with _caches_lock:
+        cache = _caches.get(key)
+        if cache is None:
+            cache = SearchIndexStatusCache(
+                AtlasSearchUtils(public_key, private_key, group_id, cluster, **atlas_settings)
+            )
+            _caches[key] = cache
+        return cache
+
+
+def search_index_cache_stats():
+    with _caches_lock:
+        return {f"{group_id}/{cluster}": cache.stats() for (_, group_id, cluster), cache in _caches.items()}
@@ -1,44 +1,166 @@
+import copy
 import json
 import logging
+from concurrent.futures import ThreadPoolExecutor
 
 from flask import current_app
 
+from app.utils.metrics import metrics
+
 from .auth_service_utils import AuthService
+from .local_cache import LocalCache
 
 logger = logging.getLogger("qudo")
 
 
 class UserCacheService:
+    """
+    Caches the user profiles of the auth service, in process for USER_CACHE_LOCAL_TTL seconds in front of Redis.
+
+    Users the auth service does not know are cached as missing for USER_CACHE_NEGATIVE_TIMEOUT seconds, and failed
+    lookups for USER_CACHE_LOCAL_TTL seconds in process, so pages listing their conversations do not call the auth
+    service again on every load. A stale copy of every profile is kept for USER_CACHE_STALE_TIMEOUT seconds and served
+    while the auth service fails.
+    """
+
+    MISSING = "null"
+    TIMEOUT = 3600
+    local_cache = LocalCache(max_size=1024)
+
     def __init__(self, user_id):
-        self.timeout = 3600
+        self.timeout = self.TIMEOUT
         self.user_id = user_id
         self.auth_token = current_app.config["AUTH_ADMIN_TOKEN"]
 
+    @staticmethod
+    def make_key(user_id):
+        return "user__%s" % user_id
+
+    @staticmethod
+    def make_stale_key(user_id):
+        return "user__stale__%s" % user_id
+
+    @property
+    def key(self):
+        return self.make_key(self.user_id)
+
     def get_data(self):
+        data = self.get_many_data([self.user_id])[self.user_id]
+        if data is None:
+            raise Exception("Could not find user for id: %s" % self.user_id)
+        return data
+
+    @classmethod
+    def get_many_data(cls, user_ids):
+        """
+        Gets the profiles of users with a constant number of round trips: the profiles missing in process are read
+        with a single MGET, and the ones missing in Redis are fetched from the auth service concurrently.
+
+        Args:
+            user_ids (list): The ids of the users, possibly repeated.
+
+        Returns:
+            dict: The profile of each distinct user id, or None if the user could not be found.
+        """
+        user_ids = list(dict.fromkeys(user_ids))
+        profiles = {}
+        for user_id in user_ids:
+            data = cls.local_cache.get(cls.make_key(user_id))
+            if data is not None:
+                profiles[user_id] = data
+
+        missing_ids = [user_id for user_id in user_ids if user_id not in profiles]
+        if missing_ids:
+            profiles.update(cls._get_shared_data(missing_ids))
+            for user_id in missing_ids:
+                cls.local_cache.set(
+                    cls.make_key(user_id), profiles[user_id], ttl=current_app.config["USER_CACHE_LOCAL_TTL"]
+                )
+
+        negative_hits = sum(profiles[user_id] == cls.MISSING for user_id in user_ids)
+        if negative_hits:
+            metrics.increment("user_cache.negative_hits", negative_hits)
+        return {
+            user_id: None if profiles[user_id] == cls.MISSING else copy.deepcopy(profiles[user_id])
+            for user_id in user_ids
+        }
+
+    @classmethod
+    def _get_shared_data(cls, user_ids):
         from app.utils.redis_util import RedisUtil
 
-        data = RedisUtil.get_cached_data("user__%s" % self.user_id)
-        if not data:
-            auth_service = AuthService(self.auth_token)
-            data = auth_service.get_user_data_by_id(self.user_id)
-            if not data:
-                raise Exception("Could not find user for id: %s" % self.user_id)
-            self.set_data(data)
-        else:
-            data = str(data, "utf-8")
-            data = json.loads(data)
-        return data
+        profiles = {}
+        values = RedisUtil.get_many([cls.make_key(user_id) for user_id in user_ids])
+        for user_id, data in zip(user_ids, values):
+            if data:
+                data = json.loads(str(data, "utf-8"))
+                profiles[user_id] = cls.MISSING if data is None else data
+
+        missing_ids = [user_id for user_id in user_ids if user_id not in profiles]
+        if not missing_ids:
+            return profiles
+
+        metrics.increment("user_cache.auth_service_calls", len(missing_ids))
+        auth_service = AuthService(current_app.config["AUTH_ADMIN_TOKEN"])
+
+        def fetch(user_id):
+            try:
+                return auth_service.get_user_data_by_id(user_id), False
+            except Exception as e:
+                logger.warning(f"Could not fetch user {user_id} from the auth service: {e}")
+                return None, True
+
+        max_workers = min(len(missing_ids), current_app.config["USER_CACHE_AUTH_CONCURRENCY"])
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            results = list(executor.map(fetch, missing_ids))
+
+        found = {}
+        stale = {}
+        unknown = {}
+        failed_ids = []
+        for user_id, (data, failed) in zip(missing_ids, results):
+            profiles[user_id] = data or cls.MISSING
+            if data:
+                found[cls.make_key(user_id)] = stale[cls.make_stale_key(user_id)] = json.dumps(data)
+            elif failed:
+                # Failed lookups are only cached in process, the user may exist
+                failed_ids.append(user_id)
+            else:
+                unknown[cls.make_key(user_id)] = json.dumps(None)
+        if found:
+            RedisUtil.set_many(found, cls.TIMEOUT)
+            RedisUtil.set_many(stale, current_app.config["USER_CACHE_STALE_TIMEOUT"])
+        if unknown:
+            RedisUtil.set_many(unknown, current_app.config["USER_CACHE_NEGATIVE_TIMEOUT"])
+        if failed_ids:
+            profiles.update(cls._get_stale_data(failed_ids))
+        return profiles
+
+    @classmethod
+    def _get_stale_data(cls, user_ids):
+        from app.utils.redis_util import RedisUtil
+
+        profiles = {}
+        values = RedisUtil.get_many([cls.make_stale_key(user_id) for user_id in user_ids])
+        for user_id, data in zip(user_ids, values):
+            if data:
+                profiles[user_id] = json.loads(str(data, "utf-8"))
+        if profiles:
+            metrics.increment("user_cache.stale_served", len(profiles))
+        return profiles
 
     def set_data(self, data):
         from app.utils.redis_util import RedisUtil
 
+        self.local_cache.pop(self.key)
         data = json.dumps(data)
-        RedisUtil.set_cache_data("user__%s" % self.user_id, data, self.timeout)
+        RedisUtil.set_cache_data(self.key, data, self.timeout)
 
     def invalidate_cache(self):
         from app.utils.redis_util import RedisUtil
 
-        RedisUtil.invalidate_cache_data("user__%s" % self.user_id)
+        self.local_cache.pop(self.key)
+        RedisUtil.invalidate_cache_data(self.key, self.make_stale_key(self.user_id))
 
 
 def get_users_name(user_id):
@@ -57,6 +179,21 @@ def get_user(user_id):
     return user_info
 
 
+def get_users(user_ids):
+    """
+    Gets the profiles of users in bulk, like get_user.
+
+    Returns:
+        dict: The profile of each user that could be found, by user id.
+    """
+    users = {}
+    for user_id, user_info in UserCacheService.get_many_data(user_ids).items():
+        if user_info is not None:
+            user_info["name"] = f'{user_info["first_name"]} {user_info["last_name"]}'
+            users[user_id] = user_info
+    return users
+
+
 def get_auth_user(user_id):
     cache_service = UserCacheService(user_id)
     user_info = cache_service.get_data()
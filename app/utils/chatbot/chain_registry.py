@@ -0,0 +1,101 @@
+import logging
+import threading
+import time
+
+from app.utils.cache_utils.local_cache import LocalCache
+
+logger = logging.getLogger("qudo")
+
+
+class ChainRegistry:
+    """
+    A process-wide registry keeping built ConversationalRetrievalChain instances warm per segment.
+
+    Building a chain creates the ChatOpenAI clients, prompt templates, LLM chains and the vector store, so each
+    uwsgi worker keeps the chains it built in an LRU cache keyed by (survey, segmentation, segment, model). Entries
+    expire after ttl seconds and the least recently used chain is evicted once max_size chains are held, which
+    bounds the memory used by the registry.
+
+        Attributes:
+            max_size (int): The maximum number of chains kept in the worker.
+
+            ttl (float): The number of seconds a chain is reused before it is rebuilt.
+
+            build_failures (int): The number of chain builds that raised.
+    """
+
+    def __init__(self, max_size=64, ttl=3600):
+        self._chains = LocalCache(max_size=max_size, ttl=ttl)
+        self._build_locks = {}
+        self._lock = threading.Lock()
+        self.build_failures = 0
+        self.build_seconds = 0.0
+
+    @property
+    def max_size(self):
+        return self._chains.max_size
+
+    @property
+    def ttl(self):
+        return self._chains.ttl
+
+    @staticmethod
+    def make_key(survey_name, segmentation, segment, gpt_model):
+        return survey_name, segmentation, segment, gpt_model
+
+    def get_or_build(self, key, build_chain):
+        """
+        Returns the chain registered for the key, building it with build_chain on a miss.
+
+        Concurrent requests for a key that is not warm yet wait for a single build instead of building the
+        chain once per thread.
+
+        Args:
+            key (tuple): The registry key, see make_key.
+            build_chain (Callable[[], ConversationalRetrievalChain]): Builds the chain for the key.
+
+        Returns:
+            ConversationalRetrievalChain: The warm chain for the key.
+        """
+        chain = self._chains.get(key)
+        if chain is not None:
+            return chain
+
+        with self._lock:
+            build_lock = self._build_locks.setdefault(key, threading.Lock())
+
+        with build_lock:
+            chain = self._chains.get(key, count=False)
+            if chain is not None:
+                return chain
+
+            start_time = time.time()
+            try:
+                chain = build_chain()
+                self._chains.set(key, chain)
+            except Exception:
+                self.build_failures += 1
+                raise
+            finally:
+                with self._lock:
+                    self._build_locks.pop(key, None)
+
+            elapsed_time = time.time() - start_time
+            self.build_seconds += elapsed_time
+            logger.info(f"Built chain for {key} in {elapsed_time} seconds")
+            return chain
+
+    def invalidate(self, key=None):
+        """
+        Drops the chain for the key, or every chain when no key is given.
+        """
+        if key is None:
+            self._chains.clear()
+        else:
+            self._chains.pop(key)
+
+    def stats(self):
+        stats = self._chains.stats()
+        stats["build_failures"] = self.build_failures
+        stats["build_seconds"] = round(self.build_seconds, 3)
+        return stats
@@ -1,24 +1,37 @@
 import logging
 
-from flask import abort
+from flask import abort, current_app
 from openai.error import InvalidRequestError, RateLimitError
 
 from app.utils.chatbot.gpt_utils.chatgpt_bot import Chatbot
 from app.utils.chatbot.gpt_utils.information_retrieval import (
     compute_cosine_generate_mode_response,
-    load_segment_q_embeddings_pop_modes,
+    load_segment_reference,
 )
+from app.utils.chatbot.gpt_utils.token_utils import PromptTooLongError
 
 logger = logging.getLogger("qudo")
 
 
-def create_gpt_prompt(question: str, survey_name: str, segment: str, chatbot: Chatbot):
+def _match_survey_answer(question: str, survey_name: str, segment: str, chatbot: Chatbot):
+    """
+    Looks the question up in the survey questions of the segment.
 
-    ref_table, segment_pop_modes = load_segment_q_embeddings_pop_modes(
+    Returns:
+        tuple: The answer of the segment to the survey question if the question is one of them (None otherwise),
+        and the relevant survey questions and answers to give GPT as reference.
+    """
+    ref_table, segment_pop_modes, embedding_matrix = load_segment_reference(
         survey_name, chatbot.get_segmentation(), segment, environ="staging"
     )
     relevant_questions, relevant_answers, cosine_results_df = compute_cosine_generate_mode_response(
-        question, ref_table, segment_pop_modes, embedding_model="text-embedding-ada-002", cosine_threshold=0.85
+        question,
+        ref_table,
+        segment_pop_modes,
+        embedding_model="text-embedding-ada-002",
+        cosine_threshold=0.85,
+        embedding_matrix=embedding_matrix,
+        max_results=current_app.config["REFERENCE_QUESTIONS_MAX_RESULTS"],
     )
 
     if (
@@ -26,8 +39,15 @@ def create_gpt_prompt(question: str, survey_name: str, segment: str, chatbot: Ch
         and cosine_results_df.iloc[0]["max_cosine_score"] > 0.95
         and cosine_results_df.iloc[0]["weighted_mode"] != "not selected"
     ):
-        persona_answer = cosine_results_df.iloc[0]["weighted_mode"]
-        survey_question = cosine_results_df.iloc[0]["title"]
+        return cosine_results_df.iloc[0]["weighted_mode"], relevant_questions, relevant_answers
+    return None, relevant_questions, relevant_answers
+
+
+def create_gpt_prompt(question: str, survey_name: str, segment: str, chatbot: Chatbot):
+
+    persona_answer, relevant_questions, relevant_answers = _match_survey_answer(question, survey_name, segment, chatbot)
+
+    if persona_answer is not None:
         return persona_answer
     else:
         try:
@@ -47,11 +67,30 @@ def create_gpt_prompt(question: str, survey_name: str, segment: str, chatbot: Ch
         except InvalidRequestError as e:
             logger.error(f"Error: {e}")
             abort(400, description=e.error)
+        except PromptTooLongError as e:
+            logger.warning(e)
+            abort(400, description="The question is too long to be answered, please ask a shorter question.")
         except Exception as e:
             logger.error(e)
             abort(400, description=repr(e))
 
 
+def stream_gpt_prompt(question: str, survey_name: str, segment: str, chatbot: Chatbot):
+    """
+    Answers the question like create_gpt_prompt, yielding the tokens of the answer while GPT generates them.
+    The tokens are not amended, amend_response is applied to the complete answer.
+
+    Yields:
+        str: The tokens of the answer, or the whole answer when it comes from the survey.
+    """
+    persona_answer, relevant_questions, relevant_answers = _match_survey_answer(question, survey_name, segment, chatbot)
+
+    if persona_answer is not None:
+        yield persona_answer
+    else:
+        yield from chatbot.stream_chatgpt_bot(relevant_questions, relevant_answers)
+
+
 replace_phrasing = {"As an AI language model, ": "I am a synthetic AI persona, as such "}
 
 
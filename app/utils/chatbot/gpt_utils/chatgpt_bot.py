@@ -1,9 +1,15 @@
 import logging
 
 import openai
-import tiktoken
 from tenacity import retry, stop_after_attempt, wait_random_exponential
 
+from app.utils.chatbot.gpt_utils.token_utils import (
+    TOKENS_PER_REPLY,
+    PromptTooLongError,
+    count_message_tokens,
+    plan_max_tokens,
+)
+
 logger = logging.getLogger("qudo")
 
 
@@ -19,9 +25,20 @@ class Chatbot:
             segment_id (int): The ID of the segment.
             segment_description (str): The description of the segment.
             messages (list): The list of messages exchanged in the conversation.
+            answer_tokens (int): The target length of the answers, in tokens.
     """
 
-    def __init__(self, openai_key, question, survey_id, segmentation, segment_id, segment_description, messages):
+    def __init__(
+        self,
+        openai_key,
+        question,
+        survey_id,
+        segmentation,
+        segment_id,
+        segment_description,
+        messages,
+        answer_tokens=300,
+    ):
         """
         Initializes a Chatbot instance.
 
@@ -32,7 +49,9 @@ class Chatbot:
             segmentation (str): The name of the segmentation.
             segment_id (int): The ID of the segment.
             segment_description (str): The description of the segment.
-            messages (list): The list of messages exchanged in the conversation.
+            messages (list): The list of messages exchanged in the conversation. Their token_count is computed
+                the first time they are counted, and kept in the message dicts.
+            answer_tokens (int): The target length of the answers, in tokens.
         """
         openai.api_key = openai_key
         self.question = question
@@ -42,6 +61,7 @@ class Chatbot:
         self.segment_description = segment_description
         self.messages = messages
         self.openai_key = openai_key
+        self.answer_tokens = answer_tokens
 
     def set_question(self, question):
         self.question = question
@@ -92,7 +112,6 @@ class Chatbot:
             list: The generated base message.
         """
         if response_questions and response_answers:
-
             relevant_question_answers_list = list(map(self._get_extra_questions, response_questions, response_answers))
             relevant_question_answer = " ".join(relevant_question_answers_list)
         else:
@@ -118,26 +137,30 @@ class Chatbot:
         ]
         return messages
 
-    @retry(wait=wait_random_exponential(min=1, max=30), stop=stop_after_attempt(3))
     def query_chatgpt_bot(self, response_questions, response_answers, gpt_model="gpt-4"):
-        mod_check = openai.Moderation.create(input=self.question)
-        if not self.messages:
-            self.messages = self.generate_base_message(response_questions, response_answers)
+        """
+        Queries the chatbot with the question, only the OpenAI calls are retried.
 
-        if response_questions and response_answers:
-            relevant_question_answers_list = list(map(self._get_extra_questions, response_questions, response_answers))
-            relevant_question_answer = " ".join(relevant_question_answers_list)
-            self.question = self.question + relevant_question_answer
+        Args:
+            response_questions (list): The list of response questions.
+            response_answers (list): The list of response answers.
+            gpt_model (str): The GPT model answering the question.
 
-        new_question_message = {"role": "user", "content": self.question}
+        Returns:
+            dict: The question, the answer, the messages and the segment description.
 
-        self.messages.append(new_question_message)
+        Raises:
+            PromptTooLongError: If the question does not fit the context window of the model, even without history.
+        """
+        mod_check = self._create_moderation(self.question)
+        self._add_question_message(response_questions, response_answers)
 
         if not mod_check["results"][0]["flagged"]:
-            answer = openai.ChatCompletion.create(
+            max_tokens = self.fit_prompt(model=gpt_model)
+            answer = self._create_completion(
                 model=gpt_model,
-                messages=self.messages,
-                max_tokens=self.count_tokens(model=gpt_model),
+                messages=self.get_prompt_messages(),
+                max_tokens=max_tokens,
                 temperature=0.3,
             )
             logger.info(answer)
@@ -145,7 +168,7 @@ class Chatbot:
         else:
             answer = "I cannot give inappropriate responses"
 
-        self.messages.append({"role": "assistant", "content": answer})
+        self._append_message({"role": "assistant", "content": answer})
         response = {
             "question": self.question,
             "moderated": True,
@@ -156,29 +179,138 @@ class Chatbot:
 
         return response
 
+    def stream_chatgpt_bot(self, response_questions, response_answers, gpt_model="gpt-4"):
+        """
+        Queries the chatbot like query_chatgpt_bot, yielding the tokens of the answer while GPT generates them.
+        The answer is appended to the messages once it is complete.
+
+        Args:
+            response_questions (list): The list of response questions.
+            response_answers (list): The list of response answers.
+            gpt_model (str): The GPT model answering the question.
+
+        Yields:
+            str: The tokens of the answer.
+        """
+        mod_check = self._create_moderation(self.question)
+        self._add_question_message(response_questions, response_answers)
+
+        if not mod_check["results"][0]["flagged"]:
+            tokens = []
+            max_tokens = self.fit_prompt(model=gpt_model)
+            completion = self._create_completion(
+                model=gpt_model,
+                messages=self.get_prompt_messages(),
+                max_tokens=max_tokens,
+                temperature=0.3,
+                stream=True,
+            )
+            for chunk in completion:
+                token = chunk["choices"][0]["delta"].get("content") if chunk["choices"] else None
+                if token:
+                    tokens.append(token)
+                    yield token
+            answer = "".join(tokens)
+        else:
+            answer = "I cannot give inappropriate responses"
+            yield answer
+
+        self._append_message({"role": "assistant", "content": answer})
+
+    @staticmethod
+    @retry(wait=wait_random_exponential(min=1, max=30), stop=stop_after_attempt(3))
+    def _create_moderation(text):
+        return openai.Moderation.create(input=text)
+
+    @staticmethod
+    @retry(wait=wait_random_exponential(min=1, max=30), stop=stop_after_attempt(3))
+    def _create_completion(**kwargs):
+        return openai.ChatCompletion.create(**kwargs)
+
+    def _add_question_message(self, response_questions, response_answers):
+        if not self.messages:
+            self.messages = self.generate_base_message(response_questions, response_answers)
+
+        if response_questions and response_answers:
+            relevant_question_answers_list = list(map(self._get_extra_questions, response_questions, response_answers))
+            relevant_question_answer = " ".join(relevant_question_answers_list)
+            self.question = self.question + relevant_question_answer
+
+        new_question_message = {"role": "user", "content": self.question}
+
+        self._append_message(new_question_message)
+
     def _get_extra_questions(self, response_question, response_answer):
         return (
             f'For reference, this segment responded to this question "{response_question}" with '
             f'this answer "{response_answer}".'
         )
 
+    def _append_message(self, message):
+        message["token_count"] = count_message_tokens(message)
+        self.messages.append(message)
+
+    def get_prompt_messages(self):
+        """
+        Gets the messages to send to the chat completion, without their token counts.
+        """
+        return [{key: value for key, value in message.items() if key != "token_count"} for message in self.messages]
+
     def count_tokens(self, model):
-        try:
-            encoding = tiktoken.encoding_for_model(model)
-        except KeyError:
-            print("Warning: model not found. Using cl100k_base encoding.")
-            encoding = tiktoken.get_encoding("cl100k_base")
+        """
+        Counts the prompt tokens of the messages, only encoding the messages without a token_count.
 
-        tokens_per_message = 3
-        tokens_per_name = 1
+        Args:
+            model (str): The GPT model the messages are sent to.
 
-        num_tokens = 0
+        Returns:
+            int: The number of prompt tokens.
+        """
+        num_tokens = TOKENS_PER_REPLY
         for message in self.messages:
-            num_tokens += tokens_per_message
-            for key, value in message.items():
-                num_tokens += len(encoding.encode(value))
-                if key == "name":
-                    num_tokens += tokens_per_name
-        num_tokens += 3  # every reply is primed with <|start|>assistant<|message|>
+            if message.get("token_count") is None:
+                message["token_count"] = count_message_tokens(message, model)
+            num_tokens += message["token_count"]
         logger.info(f"Total tokens: {num_tokens}")
         return num_tokens
+
+    def plan_max_tokens(self, model):
+        """
+        Plans the max_tokens of the answer from the context window of the model and the prompt tokens.
+        """
+        return plan_max_tokens(self.count_tokens(model), model, self.answer_tokens)
+
+    def fit_prompt(self, model):
+        """
+        Plans the max_tokens of the answer like plan_max_tokens, first dropping the oldest turns of the history while
+        the prompt leaves no room for the answer.
+
+        Args:
+            model (str): The GPT model the messages are sent to.
+
+        Returns:
+            int: The max_tokens of the completion.
+
+        Raises:
+            PromptTooLongError: If the base messages and the question alone do not fit the context window.
+        """
+        while True:
+            try:
+                return self.plan_max_tokens(model)
+            except PromptTooLongError:
+                if not self._drop_oldest_turn():
+                    raise
+
+    def _drop_oldest_turn(self):
+        """
+        Drops the oldest turn of the history, the messages from its question to the next one.
+
+        Returns:
+            bool: Whether a turn was dropped, False when only the question being asked is left.
+        """
+        questions = [i for i, message in enumerate(self.messages) if message["role"] == "user"]
+        if len(questions) < 2:
+            return False
+        logger.info("Dropping the oldest turn of the history to fit the context window")
+        del self.messages[questions[0] : questions[1]]
+        return True
@@ -1,6 +1,11 @@
 import ast
+import hashlib
 import json
+import os
 import re
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
 import boto3
 import openai
@@ -13,7 +18,7 @@ from tenacity import (
 )
 
 from .dataset_helper_functions import (
-    get_embedding,
+    get_embeddings,
     remove_contraction_apostraphes,
     ambiguous_title_fixer,
     extra_title_fixer,
@@ -35,13 +40,120 @@ embedding_model = "text-embedding-ada-002"
 cosine_threshold = 0.85
 input_question = "What is your credit score?"
 
+REWRITE_QUESTIONS_PROMPT = "I will supply you a python list of tuples in the following format [(<id>, <original question>)]. Transform each <original question> to be open-ended, concise, clear and coherent, <transformed question>. Do not include multiple specific pre-set answer options in the questions. Please return the results in a python list of tuples: [(<id>, <original question>, <transformed question>)]."
+
+
+@retry(wait=wait_random_exponential(min=1, max=30), stop=stop_after_attempt(3), reraise=True)
+def rewrite_questions_chunk(sublist, gpt_model="gpt-3.5-turbo"):
+    """Function to transform a chunk of (shortname, title) questions into "better" english.
+    The completion is requested again if it cannot be parsed.
+    Returns the chunk questions with their better_question, and the token usage of the completion."""
+    better_completion = openai.ChatCompletion.create(
+        model=gpt_model,
+        messages=[
+            {"role": "system", "content": REWRITE_QUESTIONS_PROMPT},
+            {"role": "user", "content": str(sublist)},
+        ],
+    )
+
+    better_questions = better_completion["choices"][0]["message"]["content"]
+    try:
+        temp_df = pd.DataFrame(ast.literal_eval(better_questions))
+    except (SyntaxError, ValueError):
+        temp_df = pd.DataFrame(ast.literal_eval(remove_contraction_apostraphes(better_questions)))
+    if len(temp_df) != len(sublist):
+        raise ValueError(f"Expected {len(sublist)} transformed questions, got {len(temp_df)}")
+
+    relevant_questions_df = pd.DataFrame(sublist, columns=["shortname", "title"])
+    relevant_questions_df["better_question"] = temp_df.iloc[:, -1:].copy()
+    return relevant_questions_df, dict(better_completion.get("usage", {}))
+
+
+def _chunk_checkpoint_path(checkpoint_dir, sublist, gpt_model):
+    chunk_hash = hashlib.sha1(f"{gpt_model}{REWRITE_QUESTIONS_PROMPT}{sublist}".encode("utf-8")).hexdigest()
+    return os.path.join(checkpoint_dir, f"{chunk_hash}.parquet")
+
+
+def _rewrite_questions_chunk_with_checkpoint(chunk_id, sublist, gpt_model, checkpoint_dir):
+    """Function to rewrite a chunk, or to load it from its checkpoint if a previous run completed it.
+    Chunks are not checkpointed when checkpoint_dir is None."""
+    start_time = time.time()
+    checkpoint_path = _chunk_checkpoint_path(checkpoint_dir, sublist, gpt_model) if checkpoint_dir else None
+    if checkpoint_path and os.path.exists(checkpoint_path):
+        relevant_questions_df = pd.read_parquet(checkpoint_path)
+        usage = {}
+        resumed = True
+    else:
+        relevant_questions_df, usage = rewrite_questions_chunk(sublist, gpt_model=gpt_model)
+        if checkpoint_path:
+            relevant_questions_df.to_parquet(checkpoint_path + ".tmp")
+            os.replace(checkpoint_path + ".tmp", checkpoint_path)
+        resumed = False
+
+    report = {
+        "chunk": chunk_id,
+        "questions": len(sublist),
+        "seconds": round(time.time() - start_time, 2),
+        "prompt_tokens": usage.get("prompt_tokens", 0),
+        "completion_tokens": usage.get("completion_tokens", 0),
+        "resumed": resumed,
+    }
+    return relevant_questions_df, report
+
+
+def rewrite_questions(raw_questions_split, gpt_model="gpt-3.5-turbo", checkpoint_dir=None, max_workers=4):
+    """Function to transform every chunk of questions into "better" english, max_workers chunks at a time.
+    Completed chunks are saved in checkpoint_dir if it is set, so a rerun only requests the chunks that did not
+    complete. Prints the time and token usage of every chunk.
+
+    Raises RuntimeError if any chunk still fails after its retries, once every other chunk is completed."""
+    if checkpoint_dir:
+        os.makedirs(checkpoint_dir, exist_ok=True)
+
+    relevant_questions_dfs = {}
+    reports = []
+    failed_chunks = {}
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {
+            executor.submit(_rewrite_questions_chunk_with_checkpoint, chunk_id, sublist, gpt_model, checkpoint_dir): (
+                chunk_id
+            )
+            for chunk_id, sublist in enumerate(raw_questions_split)
+        }
+        for future in as_completed(futures):
+            chunk_id = futures[future]
+            try:
+                relevant_questions_dfs[chunk_id], report = future.result()
+                reports.append(report)
+            except Exception as e:
+                failed_chunks[chunk_id] = e
+
+    if reports:
+        report_df = pd.DataFrame(reports).sort_values("chunk")
+        print(report_df.to_string(index=False))
+        print(
+            f"{len(reports)} chunks ({int(report_df['resumed'].sum())} resumed), "
+            f"{report_df['prompt_tokens'].sum()} prompt tokens, {report_df['completion_tokens'].sum()} completion tokens"
+        )
+    if failed_chunks:
+        resume = f"rerun to resume from {checkpoint_dir}" if checkpoint_dir else "set checkpoint_dir to resume"
+        raise RuntimeError(f"Chunks {sorted(failed_chunks)} failed, {resume}: {failed_chunks}")
+
+    return [relevant_questions_dfs[chunk_id] for chunk_id in sorted(relevant_questions_dfs)]
+
 
 @retry(wait=wait_random_exponential(min=1, max=30), stop=stop_after_attempt(3))
 def generate_pythia_relevant_q_embeddings_survey(
-    survey_name, environ="staging", gpt_model="gpt-3.5-turbo", embedding_model="text-embedding-ada-002"
+    survey_name,
+    environ="staging",
+    gpt_model="gpt-3.5-turbo",
+    embedding_model="text-embedding-ada-002",
+    checkpoint_dir=None,
+    max_workers=4,
 ):
     """Function to create test dataset for a segmentation. For a given segment:
-    - We take the chi2 questions, transform them into "better" english.
+    - We take the chi2 questions, transform them into "better" english, resuming from the chunks checkpointed
+      in checkpoint_dir by a previous run.
     - For each of those questions, we generate three wording variations.
     - Generate n irrelevant questions to an example persona description of a segmentation.
     - Upload this dataset to S3.
@@ -108,36 +220,21 @@ def generate_pythia_relevant_q_embeddings_survey(
     raw_questions = [tuple(x) for x in shortname_title_mapping[["shortname", "title"]].to_numpy()]
     raw_questions_split = split_list(raw_questions, 20)
 
-    relevant_questions_dfs = []
-    for sublist in raw_questions_split:
-        better_completion = openai.ChatCompletion.create(
-            model=gpt_model,
-            messages=[
-                {
-                    "role": "system",
-                    "content": "I will supply you a python list of tuples in the following format [(<id>, <original question>)]. Transform each <original question> to be open-ended, concise, clear and coherent, <transformed question>. Do not include multiple specific pre-set answer options in the questions. Please return the results in a python list of tuples: [(<id>, <original question>, <transformed question>)].",
-                },
-                {"role": "user", "content": str(sublist)},
-            ],
-        )
-
-        better_questions = better_completion["choices"][0]["message"]["content"]
-        try:
-            temp_df = pd.DataFrame(ast.literal_eval(better_questions))
-        except:
-            temp_df = pd.DataFrame(ast.literal_eval(remove_contraction_apostraphes(better_questions)))
-
-        relevant_questions_df = pd.DataFrame(sublist, columns=["shortname", "title"])
-        relevant_questions_df["better_question"] = temp_df.iloc[:, -1:].copy()
-        relevant_questions_df["better_question_embedding"] = relevant_questions_df["better_question"].apply(
-            lambda x: get_embedding(x, model=embedding_model)
-        )
-        relevant_questions_dfs.append(relevant_questions_df)
+    relevant_questions_dfs = rewrite_questions(
+        raw_questions_split,
+        gpt_model=gpt_model,
+        checkpoint_dir=checkpoint_dir
+        or os.path.join(tempfile.gettempdir(), "pythia-reference-checkpoints", survey_name),
+        max_workers=max_workers,
+    )
 
     question_embeddings = pd.concat(relevant_questions_dfs)
+    question_embeddings["better_question_embedding"] = get_embeddings(
+        question_embeddings["better_question"].tolist(), model=embedding_model
+    )
     question_embeddings_full = shortname_title_mapping.merge(question_embeddings, on=["shortname", "title"])
-    question_embeddings_full["title_embedding"] = question_embeddings_full["title"].apply(
-        lambda x: get_embedding(x, model=embedding_model)
+    question_embeddings_full["title_embedding"] = get_embeddings(
+        question_embeddings_full["title"].tolist(), model=embedding_model
     )
     question_embeddings_full.to_parquet(
         f"s3://qudo-datascience/data-store/pythia_exploration/{environ}/{survey_name}/relevant_questions_embedding.parquet"
@@ -1,6 +1,10 @@
 import re
+from concurrent.futures import ThreadPoolExecutor
+
 import pandas as pd
 import openai
+import tiktoken
+from tenacity import retry, stop_after_attempt, wait_random_exponential
 
 
 def strip_html(x):
@@ -122,6 +126,48 @@ def get_embedding(text, model="text-embedding-ada-002"):
     return openai.Embedding.create(input=[text], model=model)["data"][0]["embedding"]
 
 
+def chunk_by_tokens(texts, model="text-embedding-ada-002", max_tokens=8000, max_inputs=2048):
+    """Function to split texts into chunks of at most max_tokens tokens and max_inputs texts, keeping their order."""
+    encoding = tiktoken.encoding_for_model(model)
+    chunks = []
+    chunk = []
+    chunk_tokens = 0
+    for text in texts:
+        tokens = len(encoding.encode(text, disallowed_special=()))
+        if chunk and (chunk_tokens + tokens > max_tokens or len(chunk) == max_inputs):
+            chunks.append(chunk)
+            chunk = []
+            chunk_tokens = 0
+        chunk.append(text)
+        chunk_tokens += tokens
+    if chunk:
+        chunks.append(chunk)
+    return chunks
+
+
+@retry(wait=wait_random_exponential(min=1, max=30), stop=stop_after_attempt(5), reraise=True)
+def _embed_chunk(chunk, model):
+    response = openai.Embedding.create(input=chunk, model=model)
+    return [item["embedding"] for item in sorted(response["data"], key=lambda item: item["index"])]
+
+
+def get_embeddings(texts, model="text-embedding-ada-002", max_tokens=8000, max_workers=4):
+    """Function to embed many texts via GPT embedding model.
+    Identical texts are embedded once, the texts are sent in multi-input requests of at most max_tokens tokens,
+    max_workers requests at a time, and every request is retried on its own if it fails."""
+    texts = [text.replace("\n", " ") for text in texts]
+    unique_texts = list(dict.fromkeys(texts))
+    chunks = chunk_by_tokens(unique_texts, model=model, max_tokens=max_tokens)
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        chunk_embeddings = list(executor.map(lambda chunk: _embed_chunk(chunk, model), chunks))
+
+    embeddings = {}
+    for chunk, chunk_embedding in zip(chunks, chunk_embeddings):
+        embeddings.update(zip(chunk, chunk_embedding))
+    return [embeddings[text] for text in texts]
+
+
 def extract_segment_df(value):
     """Function to extract the chi2 question (define) answer couplets for a segment
     and filter out non-informative answers."""
@@ -1,8 +1,7 @@
 import time
 from datetime import timedelta
 
-import pandas as pd
-from openai.embeddings_utils import cosine_similarity
+import numpy as np
 
 from app.utils.s3_utils import S3Utils
 
@@ -10,14 +9,20 @@ from ...mapping_utils import Mapping
 from .dataset_helper_functions import get_embedding
 
 
+def _q_embeddings_uri(survey_name, environ):
+    return f"s3://qudo-datascience/data-store/pythia_exploration/{environ}/{survey_name}/relevant_questions_embedding.parquet"
+
+
+def _pop_modes_uri(survey_name, segmentation, environ):
+    return f"s3://qudo-datascience/data-store/pythia_exploration/{environ}/{survey_name}/population_modes/{segmentation}/population_modes.parquet"
+
+
 def load_segment_q_embeddings_pop_modes(survey_name, segmentation, segment, environ="staging"):
+    from app.flask_app import artifact_cache
+
     cluster_name = segment.split("_")[-1]
-    survey_q_embeddings = pd.read_parquet(
-        f"s3://qudo-datascience/data-store/pythia_exploration/{environ}/{survey_name}/relevant_questions_embedding.parquet"
-    )
-    segmentation_pop_modes = pd.read_parquet(
-        f"s3://qudo-datascience/data-store/pythia_exploration/{environ}/{survey_name}/population_modes/{segmentation}/population_modes.parquet"
-    )
+    survey_q_embeddings = artifact_cache.read_parquet(_q_embeddings_uri(survey_name, environ))
+    segmentation_pop_modes = artifact_cache.read_parquet(_pop_modes_uri(survey_name, segmentation, environ))
 
     cluster_pop_modes = segmentation_pop_modes[segmentation_pop_modes["cluster"] == cluster_name].copy()
 
@@ -28,27 +33,118 @@ def load_segment_q_embeddings_pop_modes(survey_name, segmentation, segment, envi
     return cluster_q_embeddings, cluster_pop_modes
 
 
+def load_segment_reference(survey_name, segmentation, segment, environ="staging"):
+    """
+    Loads the reference questions of a segment with their embedding matrix, built once per version of the parquet
+    files they come from and shared by the requests of the worker.
+
+    Returns:
+    tuple: The reference table, the population modes and the embedding matrix of the table (None if it is empty).
+    """
+    from app.flask_app import artifact_cache
+
+    def build():
+        ref_table, pop_modes = load_segment_q_embeddings_pop_modes(survey_name, segmentation, segment, environ)
+        embedding_matrix = None if ref_table.empty else build_embedding_matrix(ref_table)
+        return ref_table, pop_modes, embedding_matrix
+
+    return artifact_cache.get_derived(
+        ("segment_reference", environ, survey_name, segmentation, segment),
+        [_q_embeddings_uri(survey_name, environ), _pop_modes_uri(survey_name, segmentation, environ)],
+        build,
+    )
+
+
+SCORE_COLUMNS = ["better_cosine_score", "title_cosine_score"]
+
+
+def get_cached_embedding(text, model="text-embedding-ada-002"):
+    """Function to embed a question through the embedding cache of the worker."""
+    from app.flask_app import embedding_cache
+
+    return embedding_cache.get_or_create(model, text, lambda: get_embedding(text, model=model))
+
+
+def build_embedding_matrix(ref_table):
+    """
+    Stacks the question and title embeddings of the reference table into one matrix of unit vectors.
+
+    The first half of the rows holds the better_question_embedding of every reference question and the second half
+    their title_embedding, so both cosine scores come from a single matrix-vector product.
+
+    Parameters:
+    ref_table (pd.DataFrame): The reference questions with their better_question_embedding and title_embedding.
+    Returns:
+    np.ndarray: The normalized, contiguous (2 * len(ref_table), embedding size) matrix.
+    """
+    matrix = np.vstack(
+        [np.vstack(ref_table[column].to_numpy()) for column in ["better_question_embedding", "title_embedding"]]
+    ).astype(np.float64)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    return np.ascontiguousarray(matrix / norms)
+
+
+def rank_reference_questions(
+    input_question_embed, ref_table, pop_modes, cosine_threshold=0.85, embedding_matrix=None, max_results=None
+):
+    """
+    Scores the reference questions against the embedding of a question and keeps the ones above the threshold.
+
+    Parameters:
+    input_question_embed (list): The embedding of the input question.
+    ref_table (pd.DataFrame): The reference questions with their embeddings.
+    pop_modes (pd.DataFrame): The population modes of the segment, by shortname.
+    cosine_threshold (float): The minimum cosine similarity of the kept questions.
+    embedding_matrix (np.ndarray, optional): The matrix built by build_embedding_matrix for ref_table.
+    max_results (int, optional): Keeps only the best max_results questions.
+    Returns:
+    pd.DataFrame: The reference questions above the threshold with their cosine scores and modes, best first.
+    """
+    if ref_table.empty:
+        scores = np.empty((0, 2))
+    else:
+        if embedding_matrix is None:
+            embedding_matrix = build_embedding_matrix(ref_table)
+        question_vector = np.asarray(input_question_embed, dtype=np.float64)
+        question_vector = question_vector / np.linalg.norm(question_vector)
+        scores = (embedding_matrix @ question_vector).reshape(2, len(ref_table)).T
+    max_scores = scores.max(axis=1)
+
+    candidates = np.flatnonzero(max_scores >= cosine_threshold)
+    if max_results is not None and len(candidates) > max_results:
+        candidates = candidates[np.argpartition(-max_scores[candidates], max_results - 1)[:max_results]]
+    candidates = candidates[np.argsort(-max_scores[candidates], kind="stable")]
+
+    similar_ref = ref_table.iloc[candidates].copy()
+    similar_ref[SCORE_COLUMNS[0]] = scores[candidates, 0]
+    similar_ref[SCORE_COLUMNS[1]] = scores[candidates, 1]
+    similar_ref["max_cosine_col"] = np.array(SCORE_COLUMNS, dtype=object)[scores[candidates].argmax(axis=1)]
+    similar_ref["max_cosine_score"] = max_scores[candidates]
+    similar_ref = similar_ref.merge(pop_modes[["shortname", "weighted_mode", "unweighted_mode"]], on="shortname")
+    return similar_ref.reset_index(drop=True)
+
+
 def compute_cosine_generate_mode_response(
-    input_question, ref_table, pop_modes, embedding_model="text-embedding-ada-002", cosine_threshold=0.85
+    input_question,
+    ref_table,
+    pop_modes,
+    embedding_model="text-embedding-ada-002",
+    cosine_threshold=0.85,
+    embedding_matrix=None,
+    max_results=None,
 ):
     start_time = time.time()
-    input_question_embed = get_embedding(input_question, model=embedding_model)
-    temp_ref = ref_table.copy()
-    temp_ref["better_cosine_score"] = temp_ref["better_question_embedding"].apply(
-        lambda x: cosine_similarity(x, input_question_embed)
+    input_question_embed = get_cached_embedding(input_question, model=embedding_model)
+    similar_temp_ref = rank_reference_questions(
+        input_question_embed,
+        ref_table,
+        pop_modes,
+        cosine_threshold,
+        embedding_matrix=embedding_matrix,
+        max_results=max_results,
     )
-    temp_ref["title_cosine_score"] = temp_ref["title_embedding"].apply(
-        lambda x: cosine_similarity(x, input_question_embed)
-    )
-    temp_ref["max_cosine_col"] = temp_ref[["better_cosine_score", "title_cosine_score"]].idxmax(axis=1)
-    temp_ref["max_cosine_score"] = temp_ref[["better_cosine_score", "title_cosine_score"]].max(axis=1)
-    temp_ref.sort_values(by=["max_cosine_score"], ascending=False, inplace=True)
-    temp_ref = temp_ref.merge(pop_modes[["shortname", "weighted_mode", "unweighted_mode"]], on="shortname")
-
-    similar_temp_ref = temp_ref[temp_ref["max_cosine_score"] >= cosine_threshold].reset_index(drop=True)
 
     if not similar_temp_ref.empty:
-
         result_answers = similar_temp_ref["weighted_mode"].to_list()
         result_questions = similar_temp_ref["title"].to_list()
 
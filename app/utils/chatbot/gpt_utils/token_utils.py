@@ -0,0 +1,80 @@
+import logging
+from functools import lru_cache
+
+import tiktoken
+
+logger = logging.getLogger("qudo")
+
+DEFAULT_MODEL = "gpt-4"
+
+# Tokens of the model context windows, shared by the prompt and the answer
+MODEL_CONTEXT_WINDOWS = {
+    "gpt-4": 8192,
+    "gpt-4-32k": 32768,
+    "gpt-3.5-turbo": 4096,
+    "gpt-3.5-turbo-16k": 16384,
+}
+
+# Every message is wrapped in <|start|>{role}<|message|>{content}<|end|>
+TOKENS_PER_MESSAGE = 3
+TOKENS_PER_NAME = 1
+# Every reply is primed with <|start|>assistant<|message|>
+TOKENS_PER_REPLY = 3
+
+
+@lru_cache(maxsize=None)
+def get_encoding(model=DEFAULT_MODEL):
+    """
+    Gets the tiktoken encoding of a model, loaded once per worker.
+    """
+    try:
+        return tiktoken.encoding_for_model(model)
+    except KeyError:
+        logger.warning(f"No encoding found for {model}, using cl100k_base")
+        return tiktoken.get_encoding("cl100k_base")
+
+
+def count_message_tokens(message, model=DEFAULT_MODEL):
+    """
+    Counts the prompt tokens of a chat message, including the tokens wrapping it.
+
+    Args:
+        message (dict): The message, with its role, content and optional name.
+        model (str): The model the message is sent to.
+
+    Returns:
+        int: The number of tokens.
+    """
+    encoding = get_encoding(model)
+    num_tokens = TOKENS_PER_MESSAGE + len(encoding.encode(message["role"])) + len(encoding.encode(message["content"]))
+    if message.get("name"):
+        num_tokens += TOKENS_PER_NAME + len(encoding.encode(message["name"]))
+    return num_tokens
+
+
+class PromptTooLongError(ValueError):
+    """Exception raised when a prompt leaves no room for the answer in the context window of the model."""
+
+
+def plan_max_tokens(prompt_tokens, model=DEFAULT_MODEL, answer_tokens=300):
+    """
+    Plans the max_tokens of a completion, so the answer fits the context window left by the prompt.
+
+    Args:
+        prompt_tokens (int): The number of tokens of the prompt, including the reply priming.
+        model (str): The model answering the prompt.
+        answer_tokens (int): The target length of the answer, in tokens.
+
+    Returns:
+        int: The max_tokens of the completion, at most answer_tokens.
+
+    Raises:
+        PromptTooLongError: If the prompt leaves no room for the answer in the context window.
+    """
+    context_window = MODEL_CONTEXT_WINDOWS.get(model, MODEL_CONTEXT_WINDOWS[DEFAULT_MODEL])
+    available_tokens = context_window - prompt_tokens
+    if available_tokens <= 0:
+        raise PromptTooLongError(
+            f"The prompt of {prompt_tokens} tokens exceeds the {context_window} tokens window of {model}"
+        )
+    return min(answer_tokens, available_tokens)
@@ -1,5 +1,9 @@
 import re
+
+import numpy as np
 import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
 
 
 def strip_html(x) -> str:
@@ -62,6 +66,69 @@ def convert_to_shortname(full_name: str) -> str:
         return str(e)
 
 
+def convert_to_shortnames(full_names: pd.Series) -> pd.Series:
+    """
+    Vectorized version of convert_to_shortname for a whole column.
+
+    Parameters:
+    full_names (pd.Series): The full names as underscore delimited strings.
+    Returns:
+    pd.Series: The shorter names, or the original names if their last part is 'ord' or 'iso'.
+    Raises:
+    ValueError: If any of the names does not contain an underscore or is not a string.
+    """
+    parts = full_names.str.extract(r"^(.*)_([^_]*)$", expand=True)
+    if parts[0].isna().any():
+        raise ValueError("Input string should be underscore delimited")
+    return parts[0].where(~parts[1].isin(["ord", "iso"]), full_names)
+
+
+def to_list_array(column: pd.Series) -> pa.ListArray:
+    """
+    Converts a column of list cells (python lists or numpy arrays) to an Arrow list array.
+    """
+    lists = pa.array(column, from_pandas=True)
+    # An empty or all missing column is not inferred as a list type, which the list kernels require
+    if not pa.types.is_list(lists.type) and lists.null_count == len(lists):
+        lists = pa.nulls(len(lists), pa.list_(pa.null()))
+    return lists
+
+
+def list_lengths(lists: pa.ListArray) -> np.ndarray:
+    return pc.fill_null(pc.list_value_length(lists), 0).to_numpy(zero_copy_only=False)
+
+
+def concat_lists_by_group(data: pd.DataFrame, keys: list, column: str) -> pd.DataFrame:
+    """
+    Concatenates the list cells of a column for every group of keys, keeping the row order within each group.
+
+    Equivalent to data.groupby(keys)[column].apply(list) followed by flattening each list of lists, without running
+    python code per group.
+
+    Parameters:
+    data (pd.DataFrame): The data holding the keys and the list column.
+    keys (list): The columns to group by. Rows with missing keys are dropped like in DataFrame.groupby.
+    column (str): The list column to concatenate.
+    Returns:
+    pd.DataFrame: One row per group, sorted by keys, with the concatenated python lists in column.
+    """
+    grouped = data.groupby(keys, sort=True)
+    result = grouped.size().reset_index()[keys]
+
+    codes = grouped.ngroup().to_numpy()
+    rows = np.flatnonzero(~np.isnan(codes))
+    rows = rows[np.argsort(codes[rows], kind="stable")]
+    codes = codes[rows].astype(np.int64)
+
+    lists = to_list_array(data[column].iloc[rows])
+    values = pc.list_flatten(lists)
+    group_lengths = np.bincount(codes, weights=list_lengths(lists), minlength=len(result)).astype(np.int32)
+    offsets = np.concatenate([[0], np.cumsum(group_lengths)]).astype(np.int32)
+
+    result[column] = pa.ListArray.from_arrays(pa.array(offsets), values).to_pylist()
+    return result
+
+
 def prep_data(self, data, qtype, q_code, title) -> pd.DataFrame:
     data_grouped = data.groupby([self.Q_CODE, self.TITLE])[self.category_percentages_col].apply(list).reset_index()
     data_grouped[self.category_percentages_col] = data_grouped[self.category_percentages_col].apply(
@@ -0,0 +1,191 @@
+import logging
+
+import openai
+from langchain.schema import SystemMessage
+from tenacity import retry, stop_after_attempt, wait_random_exponential
+
+from app.utils.chatbot.gpt_utils.token_utils import count_message_tokens
+from app.utils.metrics import metrics
+
+logger = logging.getLogger("qudo")
+
+SUMMARY_PROMPT = """Progressively summarize the conversation between a user and a synthetic survey persona, adding \
+the new turns to the current summary. Keep the facts the user asked about and the persona's answers, in at most \
+150 words.
+
+Current summary:
+{summary}
+
+New turns:
+{turns}
+
+New summary:"""
+
+
+class HistoryPolicy:
+    """
+    Bounds the conversation history sent to the chatbots.
+
+    The turns of a conversation that are not in its summary are kept verbatim in its cached data, in data["messages"]
+    for the GPT chatbot and in data["history"] for the langchain chatbot. Once batch_turns turns are older than the
+    last max_turns, they are folded into data["summary"] off the request path, by summary_model, and only then dropped
+    from the cached data. At most cached_turns turns are cached, so the history stays bounded while the summaries lag
+    or fail. The summary is sent to the chatbots ahead of the turns, and the oldest turns are left out of the prompt
+    when they exceed max_tokens.
+
+        Attributes:
+            max_turns (int): The number of turns kept verbatim.
+
+            max_tokens (int): The maximum number of tokens of the summary and the turns.
+
+            summarize (bool): Whether older turns are summarized, or dropped.
+
+            summary_model (str): The GPT model updating the summary.
+
+            batch_turns (int): The number of older turns that triggers an update of the summary.
+    """
+
+    SUMMARY_PREFIX = "Summary of the earlier conversation: "
+
+    def __init__(self, max_turns=10, max_tokens=3000, summarize=True, summary_model="gpt-3.5-turbo", batch_turns=4):
+        self.max_turns = max_turns
+        self.max_tokens = max_tokens
+        self.summarize = summarize
+        self.summary_model = summary_model
+        self.batch_turns = batch_turns
+
+    @classmethod
+    def from_config(cls, config):
+        return cls(
+            max_turns=config["HISTORY_MAX_TURNS"],
+            max_tokens=config["HISTORY_MAX_TOKENS"],
+            summarize=config["HISTORY_SUMMARY"],
+            summary_model=config["HISTORY_SUMMARY_MODEL"],
+            batch_turns=config["HISTORY_SUMMARY_BATCH_TURNS"],
+        )
+
+    @property
+    def cached_turns(self):
+        """
+        The maximum number of turns of a conversation kept in its cached data, and loaded from MongoDB.
+        """
+        return self.max_turns + self.batch_turns if self.summarize else self.max_turns
+
+    @staticmethod
+    def split_messages(messages):
+        """
+        Splits the GPT messages of a conversation into its base messages and its turns.
+
+        Returns:
+            tuple: The messages before the first question, and the list of turns, each a list of messages.
+        """
+        base_messages = []
+        turns = []
+        for message in messages:
+            if message["role"] == "user":
+                turns.append([message])
+            elif turns:
+                turns[-1].append(message)
+            else:
+                base_messages.append(message)
+        return base_messages, turns
+
+    @classmethod
+    def complete_turn_messages(cls, messages):
+        """
+        Keeps the messages of the answered turns, as a question followed by its answer.
+        """
+        _, turns = cls.split_messages(messages)
+        return [message for turn in turns if len(turn) > 1 for message in turn[:2]]
+
+    def old_turns(self, turns):
+        """
+        Gets the turns older than the last max_turns, to fold into the summary.
+        """
+        return turns[: -self.max_turns] if len(turns) > self.max_turns else []
+
+    def needs_summary(self, data):
+        """
+        Whether batch_turns turns of the cached conversation data are older than the last max_turns.
+        """
+        return self.summarize and len(data["history"]) - self.max_turns >= self.batch_turns
+
+    def update_summary(self, summary, turns):
+        """
+        Adds turns to a conversation summary.
+
+        Returns:
+            str: The new summary, or None if it could not be generated.
+        """
+        transcript = "\n".join(f"User: {question}\nPersona: {answer}" for question, answer in turns)
+        prompt = SUMMARY_PROMPT.format(summary=summary or "(empty)", turns=transcript)
+        try:
+            with metrics.timer("history.summary_ms"):
+                completion = self._create_completion(
+                    model=self.summary_model,
+                    messages=[{"role": "user", "content": prompt}],
+                    max_tokens=300,
+                    temperature=0,
+                )
+        except Exception as e:
+            logger.warning(f"Could not summarize the conversation history: {e}")
+            metrics.increment("history.summary_errors")
+            return None
+        metrics.increment("history.summaries")
+        return completion["choices"][0]["message"]["content"].strip()
+
+    def prompt_messages(self, data):
+        """
+        Gets the GPT messages of a conversation to send to the chatbot: its base messages, the summary of the older
+        turns and the recent turns that fit max_tokens.
+        """
+        base_messages, turns = self.split_messages(data["messages"])
+        summary_messages = []
+        if data.get("summary"):
+            summary_messages.append({"role": "system", "content": self.SUMMARY_PREFIX + data["summary"]})
+
+        budget = self.max_tokens - sum(count_message_tokens(message) for message in summary_messages)
+        recent_turns = []
+        for turn in reversed(turns):
+            turn_tokens = sum(self._message_tokens(message) for message in turn)
+            if turn_tokens > budget:
+                metrics.increment("history.truncated")
+                break
+            budget -= turn_tokens
+            recent_turns.insert(0, turn)
+        return base_messages + summary_messages + [message for turn in recent_turns for message in turn]
+
+    def chat_history(self, data):
+        """
+        Gets the chat history of a conversation to give the langchain chatbot: the summary of the older turns and the
+        recent turns that fit max_tokens.
+        """
+        summary_messages = []
+        if data.get("summary") and data["history"]:
+            summary_messages.append(SystemMessage(content=self.SUMMARY_PREFIX + data["summary"]))
+
+        budget = self.max_tokens - sum(
+            count_message_tokens({"role": "system", "content": message.content}) for message in summary_messages
+        )
+        recent_turns = []
+        for question, answer in reversed(data["history"]):
+            turn_tokens = count_message_tokens({"role": "user", "content": question}) + count_message_tokens(
+                {"role": "assistant", "content": answer}
+            )
+            if turn_tokens > budget:
+                metrics.increment("history.truncated")
+                break
+            budget -= turn_tokens
+            recent_turns.insert(0, (question, answer))
+        return summary_messages + recent_turns
+
+    @staticmethod
+    def _message_tokens(message):
+        if message.get("token_count") is None:
+            message["token_count"] = count_message_tokens(message)
+        return message["token_count"]
+
+    @staticmethod
+    @retry(wait=wait_random_exponential(min=1, max=30), stop=stop_after_attempt(3))
+    def _create_completion(**kwargs):
+        return openai.ChatCompletion.create(**kwargs)
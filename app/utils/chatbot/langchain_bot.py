@@ -1,21 +1,33 @@
 import openai
-from langchain.chains import ConversationalRetrievalChain, LLMChain
+from langchain.chains import ConversationalRetrievalChain
 from langchain.chains.question_answering import load_qa_chain
 from langchain.chat_models import ChatOpenAI
 from langchain.prompts import PromptTemplate
 
+from app.utils.chatbot.langchain_utils.condense_question_chain import CachedCondenseQuestionChain
 from app.utils.chatbot.langchain_utils.mongo_utils import MongoDBHandler
+from app.utils.chatbot.langchain_utils.speculative_chain import SpeculativeConversationalRetrievalChain
 from app.utils.chatbot.langchain_utils.question_generator import PythiaQuestionGenerator
 
 
 class PythiaChatbot:
     def __init__(
-        self, gpt_model: str, openai_key: str, mongo_handler: MongoDBHandler, question_generator: PythiaQuestionGenerator
+        self,
+        gpt_model: str,
+        openai_key: str,
+        mongo_handler: MongoDBHandler,
+        question_generator: PythiaQuestionGenerator,
+        retriever_backend: str = MongoDBHandler.ATLAS_RETRIEVER_BACKEND,
+        condense_cache=None,
+        speculative_retrieval_threshold: float = None,
     ):
         self.gpt_model = gpt_model
         self.openai_key = openai_key
         self.mongo_handler = mongo_handler
         self.question_generator = question_generator
+        self.retriever_backend = retriever_backend
+        self.condense_cache = condense_cache
+        self.speculative_retrieval_threshold = speculative_retrieval_threshold
         openai.api_key = openai_key
 
     def _build_non_streaming_chatbot(self, temperature: float):
@@ -29,13 +41,14 @@ class PythiaChatbot:
 
     def _build_chatbot(self, temperature: float, max_tokens: float):
         """
-        Initiates chatbot.
+        Initiates chatbot. It streams its tokens to the callbacks of the chain run, and returns the same answer
+        when the run has no streaming callback.
 
         Returns:
             Chatbot based on the provided specifications.
         """
         return ChatOpenAI(
-            streaming=False,
+            streaming=True,
             verbose=True,
             temperature=temperature,
             max_tokens=max_tokens,
@@ -45,8 +58,10 @@ class PythiaChatbot:
 
     def generate_chatbot(self) -> ConversationalRetrievalChain:
         """
-        This function generates a chatbot using GPT, MongoDBAtlasVectorSearch and several templates.
+        This function generates a chatbot using GPT, a retriever over the segment vectors and several templates.
         The temperature, max_tokens and model_name used by the conversational bot are defined within the function.
+        The retriever queries the Atlas Search index, or ranks the vectors in process with the "numpy" backend.
+        With a speculative_retrieval_threshold, follow up documents are retrieved while the question is condensed.
 
         Only the MongoDB Atlas cluster URI, database and collection names need to be provided externally.
         Returns:
@@ -55,17 +70,18 @@ class PythiaChatbot:
         temperature = 0
         max_tokens = 150
 
-        self.mongo_handler.generate_and_save_vectors()
+        self.mongo_handler.ensure_vectors()
 
-        create_index_response = self.mongo_handler.create_search_index()
+        if self.retriever_backend == MongoDBHandler.ATLAS_RETRIEVER_BACKEND:
+            create_index_response = self.mongo_handler.create_search_index()
 
-        if isinstance(create_index_response, dict) and create_index_response.get("error", None) == 400:
-            raise RuntimeError(
-                "Error in creating MongoDB collection and search index: ", create_index_response["message"]
-            )
+            if isinstance(create_index_response, dict) and create_index_response.get("error", None) == 400:
+                raise RuntimeError(
+                    "Error in creating MongoDB collection and search index: ", create_index_response["message"]
+                )
 
-        # Storage for vector content retrieved from MongoDB
-        vectorstore = self.mongo_handler.get_vector_store()
+        # Retriever of the vector content stored in MongoDB
+        retriever = self.mongo_handler.get_retriever(self.retriever_backend)
 
         # Templates for prompts
         condense_question_template, qa_template = self.question_generator.setup_templates()
@@ -78,12 +94,25 @@ class PythiaChatbot:
         llm_1 = self._build_non_streaming_chatbot(temperature)
         llm_2 = self._build_chatbot(temperature, max_tokens)
 
-        # Create chain for generating questions and documents
-        question_generator = LLMChain(llm=llm_1, prompt=condense_question_prompt)
+        # Create chain for generating questions and documents, the standalone questions are cached per segment
+        question_generator = CachedCondenseQuestionChain(
+            llm=llm_1,
+            prompt=condense_question_prompt,
+            cache=self.condense_cache,
+            cache_namespace=f"{self.mongo_handler.collection_name}__{self.gpt_model}",
+        )
         doc_chain = load_qa_chain(llm=llm_2, chain_type="stuff", prompt=qa_prompt)
 
-        # Configure and return chatbot
+        # Configure and return chatbot, retrieving follow up documents while condensing if speculation is enabled
+        if self.speculative_retrieval_threshold is not None:
+            return SpeculativeConversationalRetrievalChain(
+                retriever=retriever,
+                combine_docs_chain=doc_chain,
+                question_generator=question_generator,
+                embeddings=self.mongo_handler.get_embeddings(),
+                similarity_threshold=self.speculative_retrieval_threshold,
+            )
         chatbot = ConversationalRetrievalChain(
-            retriever=vectorstore.as_retriever(), combine_docs_chain=doc_chain, question_generator=question_generator
+            retriever=retriever, combine_docs_chain=doc_chain, question_generator=question_generator
         )
         return chatbot
@@ -0,0 +1,59 @@
+import hashlib
+import time
+from typing import Any, Dict, Optional
+
+from langchain.callbacks.manager import AsyncCallbackManagerForChainRun, CallbackManagerForChainRun
+from langchain.chains import LLMChain
+
+
+class CachedCondenseQuestionChain(LLMChain):
+    """
+    The condense question LLMChain of a ConversationalRetrievalChain, serving repeated condense steps from a cache.
+
+    The cache namespace is the segment chatbot, extended with the hash of the prompt template so a changed prompt does
+    not serve standalone questions condensed by the previous one.
+
+        Attributes:
+            cache (CondensedQuestionCacheService): Caches the standalone questions, or None to always call the LLM.
+
+            cache_namespace (str): The segment chatbot the standalone questions are cached for.
+    """
+
+    cache: Any = None
+    cache_namespace: str = ""
+
+    def _namespace(self):
+        template_hash = hashlib.sha1(self.prompt.template.encode("utf-8")).hexdigest()[:12]
+        return f"{self.cache_namespace}__{template_hash}"
+
+    def _call(self, inputs: Dict[str, Any], run_manager: Optional[CallbackManagerForChainRun] = None) -> Dict[str, str]:
+        if self.cache is None:
+            return super()._call(inputs, run_manager=run_manager)
+
+        namespace = self._namespace()
+        standalone_question = self.cache.get(namespace, inputs["chat_history"], inputs["question"])
+        if standalone_question is not None:
+            return {self.output_key: standalone_question}
+
+        start_time = time.perf_counter()
+        outputs = super()._call(inputs, run_manager=run_manager)
+        latency_ms = (time.perf_counter() - start_time) * 1000
+        self.cache.set(namespace, inputs["chat_history"], inputs["question"], outputs[self.output_key], latency_ms)
+        return outputs
+
+    async def _acall(
+        self, inputs: Dict[str, Any], run_manager: Optional[AsyncCallbackManagerForChainRun] = None
+    ) -> Dict[str, str]:
+        if self.cache is None:
+            return await super()._acall(inputs, run_manager=run_manager)
+
+        namespace = self._namespace()
+        standalone_question = self.cache.get(namespace, inputs["chat_history"], inputs["question"])
+        if standalone_question is not None:
+            return {self.output_key: standalone_question}
+
+        start_time = time.perf_counter()
+        outputs = await super()._acall(inputs, run_manager=run_manager)
+        latency_ms = (time.perf_counter() - start_time) * 1000
+        self.cache.set(namespace, inputs["chat_history"], inputs["question"], outputs[self.output_key], latency_ms)
+        return outputs
@@ -1,8 +1,16 @@
+import hashlib
+
+import numpy as np
 import pandas as pd
-from langchain.document_loaders import DataFrameLoader
+import pyarrow as pa
+import pyarrow.compute as pc
 
-from app.utils.chatbot.helper_utils.data_utils import convert_to_shortname, load_parquet
-from app.utils.s3_utils import S3Utils
+from app.utils.chatbot.helper_utils.data_utils import (
+    concat_lists_by_group,
+    convert_to_shortnames,
+    list_lengths,
+    to_list_array,
+)
 
 
 class PythiaDataHandler:
@@ -18,7 +26,7 @@ class PythiaDataHandler:
         self.segmentation_name = segmentation_name
         self.segment_name = segment_name
         self.environ = environ
-        self.s3utils = S3Utils(bucket="qudo-datascience", environ=environ)
+        self.source_files = []
 
         # Load data
         self.seg_modes_data = self._load_seg_modes_data()
@@ -42,7 +50,8 @@ class PythiaDataHandler:
             and rounding to 2 decimal places, and then apply the _update_smc_percentage function to the column.
         """
 
-        data = load_parquet(filepath)
+        data = self._read_parquet(filepath)
+        self.source_files.append(filepath)
         data[self.Q_CODE] = data[self.Q_CODE].str.replace(self.REPLACE_PATTERN, "", regex=True)
 
         if segment_filter:
@@ -52,20 +61,29 @@ class PythiaDataHandler:
                 if self.WEIGHTED_CATEGORY_PERCENTAGES in data.columns
                 else self.CATEGORY_PERCENTAGES
             )
-            data[self.category_percentages_col] = data[self.category_percentages_col].apply(
-                lambda x: [round(i / 100, 2) for i in x]
-            )
-            data[self.category_percentages_col] = data.apply(
-                self._update_smc_percentage, args=(self.category_percentages_col,), axis=1
-            )
+            data[self.category_percentages_col] = self._update_smc_percentage(data, self.category_percentages_col)
 
         return data
 
+    def _read_parquet(self, filepath: str) -> pd.DataFrame:
+        from app.flask_app import artifact_cache
+
+        return artifact_cache.read_parquet(filepath)
+
+    def source_version(self) -> str:
+        """
+        Identifies the version of the source data from the ETags of the parquet files it was loaded from.
+
+        Returns:
+            str: A hash changing whenever any of the source files changes on S3.
+        """
+        from app.flask_app import artifact_cache
+
+        etags = [f"{filepath}={artifact_cache.get_etag(filepath)}" for filepath in self.source_files]
+        return hashlib.sha1("\n".join(etags).encode("utf-8")).hexdigest()
+
     def _prep_data(self, data, qtype) -> pd.DataFrame:
-        data_grouped = data.groupby([self.Q_CODE, self.TITLE])[self.category_percentages_col].apply(list).reset_index()
-        data_grouped[self.category_percentages_col] = data_grouped[self.category_percentages_col].apply(
-            lambda x: [item for sublist in x for item in sublist]
-        )
+        data_grouped = concat_lists_by_group(data, [self.Q_CODE, self.TITLE], self.category_percentages_col)
         seg_modes_chi_squared = self.seg_modes_data[self.seg_modes_data["qtype"] == qtype][
             [self.Q_CODE, self.TITLE, self.MODE]
         ].merge(
@@ -84,11 +102,12 @@ class PythiaDataHandler:
         return seg_modes_data
 
     def _load_chisquared_data(self):
-        rule_based_filepath = f"data-store/sophos_outputs/{self.environ}/chisquared_preprocessed/{self.survey_name}/{self.segmentation_name}/rules_based.parquet"
+        from app.flask_app import artifact_cache
+
+        rule_based_filepath = f"s3://qudo-datascience/data-store/sophos_outputs/{self.environ}/chisquared_preprocessed/{self.survey_name}/{self.segmentation_name}/rules_based.parquet"
         file_path = f"s3://qudo-datascience/data-store/sophos_outputs/{self.environ}/chisquared_preprocessed/{self.survey_name}/{self.segmentation_name}.parquet"
 
-        if self.s3utils.is_valid_uri(rule_based_filepath):
-            rule_based_filepath = f"s3://qudo-datascience/{rule_based_filepath}"
+        if artifact_cache.exists(rule_based_filepath):
             return self._load_data(rule_based_filepath, segment_filter=True)
         return self._load_data(file_path, segment_filter=True)
 
@@ -96,30 +115,17 @@ class PythiaDataHandler:
         return self._prep_data(self.chisquared_data, "varname")
 
     def _prep_shortnames_seg_modes_chi_squared(self, varnames_to_shortname: set) -> pd.DataFrame:
-        # chisquared_data_shortnames = self.chisquared_data.loc[
-        #     self.chisquared_data[self.Q_CODE].isin(varnames_to_shortname)
-        # ].copy()
-        # chisquared_data_shortnames["shortname"] = chisquared_data_shortnames[self.Q_CODE].apply(convert_to_shortname)
-        # replacement_dict = {"sbeh_us_insuranceownership_cb": "sbeh_us_insuranceintenders_cb"}
-        # chisquared_data_shortnames["shortname"].replace(replacement_dict, inplace=True)
-        # chisquared_data_shortnames.rename(columns={"shortname": self.Q_CODE}, inplace=True)
-        # return self._prep_data(chisquared_data_shortnames, "shortname")
         chisquared_data_shortnames = self.chisquared_data.loc[
             self.chisquared_data["q_code"].isin(varnames_to_shortname)
         ].copy()
-        chisquared_data_shortnames["shortname"] = chisquared_data_shortnames["q_code"].apply(convert_to_shortname)
+        chisquared_data_shortnames["shortname"] = convert_to_shortnames(chisquared_data_shortnames["q_code"])
 
         replacement_dict = {"sbeh_us_insuranceownership_cb": "sbeh_us_insuranceintenders_cb"}
-        chisquared_data_shortnames["shortname"].replace(replacement_dict, inplace=True)
+        chisquared_data_shortnames["shortname"] = chisquared_data_shortnames["shortname"].replace(replacement_dict)
 
-        chisquared_data_shortnames = (
-            chisquared_data_shortnames.groupby(["shortname", "title"])[self.category_percentages_col]
-            .apply(list)
-            .reset_index()
+        chisquared_data_shortnames = concat_lists_by_group(
+            chisquared_data_shortnames, ["shortname", "title"], self.category_percentages_col
         )
-        chisquared_data_shortnames[self.category_percentages_col] = chisquared_data_shortnames[
-            self.category_percentages_col
-        ].apply(lambda x: [item for sublist in x for item in sublist])
 
         chisquared_data_shortnames.rename(columns={"shortname": "q_code"}, inplace=True)
 
@@ -132,17 +138,33 @@ class PythiaDataHandler:
         )
         return shortnames_seg_modes_chi_squared
 
-    def _update_smc_percentage(self, row, cat_per_col: str) -> list:
+    def _update_smc_percentage(self, data: pd.DataFrame, cat_per_col: str) -> list:
         """
         Updates 'sig_more_category_percentage' with respondent proportion information.
-        :param row: DataFrame row
+        The category percentages are divided by 100 and rounded to 2 decimal places.
+        :param data: DataFrame with the 'sig_more_category' and category percentages list columns
         :param cat_per_col: category percentages column name
-        :return: list with updated 'sig_more_category_percentage' data
+        :return: list with updated 'sig_more_category_percentage' data for every row
         """
-        return [
-            f'{row["sig_more_category"][i]} (proportion of respondents: {row[cat_per_col][i]})'
-            for i in range(len(row["sig_more_category"]))
-        ]
+        categories = to_list_array(data["sig_more_category"])
+        percentages = to_list_array(data[cat_per_col])
+        category_lengths = list_lengths(categories)
+        percentage_lengths = list_lengths(percentages)
+        if (percentage_lengths < category_lengths).any():
+            raise IndexError("list index out of range")
+
+        # Keep the first len(sig_more_category) percentages of every row
+        percentage_starts = np.repeat(np.cumsum(percentage_lengths) - percentage_lengths, percentage_lengths)
+        positions = np.arange(percentage_lengths.sum()) - percentage_starts
+        kept = positions < np.repeat(category_lengths, percentage_lengths)
+        values = pc.list_flatten(percentages).to_numpy(zero_copy_only=False)[kept]
+
+        proportions = np.round(values / 100, 2).astype(str)
+        labels = pc.list_flatten(categories).to_pandas().astype(str).to_numpy(dtype=str)
+        texts = np.char.add(np.char.add(labels, " (proportion of respondents: "), np.char.add(proportions, ")"))
+
+        offsets = np.concatenate([[0], np.cumsum(category_lengths)]).astype(np.int32)
+        return pa.ListArray.from_arrays(pa.array(offsets), pa.array(texts, type=pa.string())).to_pylist()
 
     def generate_questions_answers_data(self) -> pd.DataFrame:
         """
@@ -162,58 +184,59 @@ class PythiaDataHandler:
         varnames_seg_modes_chi_squared.dropna(subset=["mode"], inplace=True)
 
         final_seg_modes_chi_squared = pd.concat([shortnames_seg_modes_chi_squared, varnames_seg_modes_chi_squared])
-        final_seg_modes_chi_squared["title"] = final_seg_modes_chi_squared["title"].apply(
-            lambda x: str(x).replace("\xa0", "")
+        final_seg_modes_chi_squared["title"] = (
+            final_seg_modes_chi_squared["title"].astype(str).str.replace("\xa0", "", regex=False)
         )
 
         return final_seg_modes_chi_squared
 
-    def convert_to_questions_jsons(self, x: dict) -> dict:
+    def convert_to_questions_jsons(self, data: pd.DataFrame) -> pd.DataFrame:
         """
-        Converts a dictionary into a specific format related to questions.
+        Converts the questions and answers data into a specific format related to questions.
         Args:
-            x (dict): The input dictionary that needs to be converted.
+            data (pd.DataFrame): The questions and answers data that needs to be converted.
         Returns:
-            dict: A dictionary with keys as 'question_text', 'modal_answer',
+            pd.DataFrame: A DataFrame with the columns 'question_text', 'modal_answer',
                 and 'significant_answers' from the input data.
         """
+        significant_answers = pc.fill_null(
+            pc.binary_join(to_list_array(data[self.category_percentages_col]).cast(pa.list_(pa.string())), "; "), ""
+        )
 
-        significant_answers = ""
-
-        if isinstance(x.get(self.category_percentages_col), list):
-            significant_answers = "; ".join(x[self.category_percentages_col])
-
-        return {
-            "question_text": x.get("title", ""),
-            "modal_answer": x.get("mode", ""),
-            "significant_answers": significant_answers,
-        }
+        return pd.DataFrame(
+            {
+                "question_text": data["title"].to_numpy() if "title" in data.columns else "",
+                "modal_answer": data["mode"].to_numpy() if "mode" in data.columns else "",
+                "significant_answers": significant_answers.to_numpy(zero_copy_only=False),
+            }
+        )
 
-    def generate_questions_answers_df(self):
+    def build_questions_answers_df(self) -> pd.DataFrame:
         """
-        This method is used to generate and save vectors.
-        It generates questions and answers data, converts these data to a specific JSON formatted data.
-        Then it transforms these JSON data into pandas DataFrame and loads into MongoDB.
-        Finally, it saves the data into an S3 bucket in parquet format.
+        Generates the questions and answers data with the text that is embedded for every question.
 
         Returns:
-        DataFrame: The final DataFrame object that consists of the questions and answers data.
+        DataFrame: The questions and answers data.
         """
-        final_pop_modes_chi_squared = self.generate_questions_answers_data()
-        question_jsons = final_pop_modes_chi_squared.apply(self.convert_to_questions_jsons, axis=1)
-
-        segment_json = {"segment_name": self.segment_name, "questions": question_jsons.to_list()}
-
-        questions_answers_df = pd.DataFrame(segment_json["questions"])
-        questions_answers_df["text"] = questions_answers_df.apply(
-            lambda x: f"Survey Question: {x['question_text']}\nModal Answers: {x['modal_answer']}\nSignificant "
-            f"Answers: {x['significant_answers']}",
-            axis=1,
+        questions_answers_df = self.convert_to_questions_jsons(self.generate_questions_answers_data())
+        questions_answers_df["text"] = (
+            "Survey Question: "
+            + questions_answers_df["question_text"].astype(str)
+            + "\nModal Answers: "
+            + questions_answers_df["modal_answer"].astype(str)
+            + "\nSignificant Answers: "
+            + questions_answers_df["significant_answers"].astype(str)
         )
+        return questions_answers_df
 
-        data = DataFrameLoader(questions_answers_df).load()
-        questions_answers_df.to_parquet(
+    def save_questions_answers_df(self, questions_answers_df: pd.DataFrame):
+        """
+        Saves the questions and answers data into an S3 bucket in parquet format.
+        """
+        from app.flask_app import artifact_cache
+
+        artifact_cache.write_parquet(
             f"s3://qudo-datascience/data-store/pythia_outputs/{self.environ}/questions_answers/{self.survey_name}"
-            f"/{self.segmentation_name}/{self.segment_name}.parquet"
+            f"/{self.segmentation_name}/{self.segment_name}.parquet",
+            questions_answers_df,
         )
-        return data
@@ -0,0 +1,34 @@
+from typing import List
+
+from langchain.schema.embeddings import Embeddings
+
+from app.utils.cache_utils.embedding_cache_service import EmbeddingCacheService
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    Embeds questions through the embedding cache, falling back to the wrapped embeddings on a miss.
+
+    Documents are embedded by the wrapped embeddings directly, as they are only embedded once when syncing a segment.
+    """
+
+    def __init__(self, embeddings: Embeddings, embedding_cache: EmbeddingCacheService, model: str):
+        self.embeddings = embeddings
+        self.embedding_cache = embedding_cache
+        self.model = model
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.embeddings.embed_documents(texts)
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embedding_cache.get_or_create(self.model, text, lambda: self.embeddings.embed_query(text))
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        return await self.embeddings.aembed_documents(texts)
+
+    async def aembed_query(self, text: str) -> List[float]:
+        embedding = self.embedding_cache.get(self.model, text)
+        if embedding is None:
+            embedding = await self.embeddings.aembed_query(text)
+            self.embedding_cache.set(self.model, text, embedding)
+        return embedding
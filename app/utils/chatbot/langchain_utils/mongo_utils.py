@@ -1,28 +1,39 @@
+import hashlib
 import logging
+from datetime import datetime
 
-import certifi
+from flask import current_app, has_app_context
+from langchain.document_loaders import DataFrameLoader
 from langchain.embeddings import OpenAIEmbeddings
 from langchain.vectorstores.mongodb_atlas import MongoDBAtlasVectorSearch
-from pymongo import errors
-from pymongo.mongo_client import MongoClient
 
-from app.utils.atlas_api_utils import AtlasSearchUtils
+from app.utils.atlas_api_utils import AtlasSearchUtils, SearchIndexNotReadyError
+from app.utils.cache_utils.search_index_cache import SearchIndexStatusCache, get_search_index_cache
+from app.utils.mongo_pool import mongo_clients
 
 from .data_handler import PythiaDataHandler
+from .embeddings import CachedEmbeddings
+from .retrievers import NumpyVectorRetriever, TimedRetriever
 
 logger = logging.getLogger("qudo")
 
 
 class MongoDBHandler:
     """
-    A class used to handle MongoDB operations such as creating a client, creating a search index,
-    validating and saving vectors, and generating and saving vectors.
+    A class used to handle MongoDB operations such as creating a client, creating a search index and keeping the
+    vectors of a segment in sync with its survey data.
+
+    Every vector collection has a manifest recording the version of the source data it was synced from and each
+    vector document stores the hash of its text, so unchanged segments are skipped without reading the collection
+    and only added or changed documents are embedded again.
 
         Attributes:
             ATLAS_VECTOR_SEARCH_INDEX_NAME (str): The name of the Atlas vector search index.
 
             DB_NAME (str): The name of the database.
 
+            MANIFEST_COLLECTION_NAME (str): The name of the collection holding the manifest of every vector collection.
+
             collection_name (str): The name of the collection.
 
             openai_key (str): The OpenAI API key.
@@ -41,26 +52,35 @@ class MongoDBHandler:
 
             data_handler (PythiaDataHandler): The data handler object.
 
-            client (MongoClient): The MongoDB client.
+            embedding_cache (EmbeddingCacheService): Caches the embeddings of the questions, None to disable.
+
+            client (MongoClient): The pooled MongoDB client of the process.
 
         Methods:
-            _create_client(): Creates a MongoDB client.
+            _create_client(): Gets the pooled MongoDB client of the process.
 
             _get_atlas_client(): Gets an Atlas client.
 
-            create_search_index(): Creates an Atlas search index.
+            create_search_index(wait): Creates an Atlas search index and checks it can be queried.
 
-            validate_and_save_vectors(data): Validates the collection and saves the vectors.
-
-            save_vectors(data): Saves the vectors to the MongoDB collection.
+            get_manifest(): Gets the manifest of the vector collection.
 
             get_vector_store(): Gets the vector store.
 
-            generate_and_save_vectors(): Generates and saves vectors to the MongoDB collection.
+            get_retriever(backend): Gets the retriever of the collection for a retriever backend.
+
+            sync_vectors(force): Embeds the added or changed documents and removes the stale ones.
+
+            ensure_vectors(): Syncs the vectors if the collection has never been synced.
     """
 
     ATLAS_VECTOR_SEARCH_INDEX_NAME = "default_search_index"
+    ATLAS_RETRIEVER_BACKEND = "atlas"
+    NUMPY_RETRIEVER_BACKEND = "numpy"
     DB_NAME = "pythia-api-service"
+    MANIFEST_COLLECTION_NAME = "pythia-embedding-manifests"
+    TEXT_KEY = "text"
+    CONTENT_HASH_KEY = "content_hash"
 
     def __init__(
         self,
@@ -75,6 +95,7 @@ class MongoDBHandler:
         cluster,
         group_id,
         data_handler: PythiaDataHandler,
+        embedding_cache=None,
     ):
         """
         The constructor for MongoDBHandler class.
@@ -91,6 +112,7 @@ class MongoDBHandler:
             cluster (str): The cluster name.
             group_id (str): The group ID.
             data_handler (PythiaDataHandler): The data handler object.
+            embedding_cache (EmbeddingCacheService, optional): Caches the embeddings of the questions.
         """
         self.collection_name = f"{survey_name}-{segmentation_name}-{segment_name}-pythia-embeddings"
         self.openai_key = openai_key
@@ -101,17 +123,31 @@ class MongoDBHandler:
         self.mongo_private_key = mongo_private_key
         self.group_id = group_id
         self.data_handler = data_handler
+        self.embedding_cache = embedding_cache
 
         self.client = self._create_client()
 
     def _create_client(self):
         """
-        Creates a MongoDB client.
+        Gets the pooled MongoDB client of the process, shared by every handler and vector store.
 
         Returns:
-            MongoClient: The created MongoDB client.
+            MongoClient: The MongoDB client.
         """
-        return MongoClient(self.db_url, tlsCAFile=certifi.where())
+        return mongo_clients.get_client(self.db_url)
+
+    def _get_search_index_cache(self):
+        """
+        Gets the index status cache of the cluster, shared by the handlers of the process. Its Atlas client uses the
+        timeouts and circuit breaker of the app config, or the defaults of AtlasSearchUtils outside of the app.
+
+        Returns:
+            SearchIndexStatusCache: The index status cache.
+        """
+        atlas_settings = AtlasSearchUtils.settings_from_config(current_app.config) if has_app_context() else {}
+        return get_search_index_cache(
+            self.mongo_public_key, self.mongo_private_key, self.group_id, self.cluster, **atlas_settings
+        )
 
     def _get_atlas_client(self):
         """
@@ -120,53 +156,70 @@ class MongoDBHandler:
         Returns:
             AtlasSearchUtils: The Atlas client.
         """
-        return AtlasSearchUtils(self.mongo_public_key, self.mongo_private_key, self.group_id, self.cluster)
+        return self._get_search_index_cache().atlas_client
 
-    def create_search_index(self):
-        """
-        Creates an Atlas search index if it does not exist.
+    def create_search_index(self, wait=False):
         """
-        if self._get_atlas_client().is_atlas_search_index_created(
-            self.DB_NAME, self.collection_name, self.ATLAS_VECTOR_SEARCH_INDEX_NAME
-        ):
-            return
+        Creates an Atlas search index if it does not exist, and checks it can be queried.
 
-        logger.info(f"Creating Atlas Search index {self.ATLAS_VECTOR_SEARCH_INDEX_NAME}")
+        Args:
+            wait (bool): Waits for a building index to become queryable instead of raising.
 
-        return self._get_atlas_client().create_index(
-            self.DB_NAME,
-            self.collection_name,
-            self.ATLAS_VECTOR_SEARCH_INDEX_NAME,
-        )
+        Returns:
+            dict: The Atlas API response if the index was created and the creation failed, None otherwise.
 
-    def validate_and_save_vectors(self, data):
+        Raises:
+            SearchIndexNotReadyError: If the index is still building and wait is False.
         """
-        Validates the collection and saves the vectors if the collection is empty or does not exist.
-
-        Args:
-            data (DataFrame): The data to save.
+        index_cache = self._get_search_index_cache()
+        status = index_cache.get_status(self.DB_NAME, self.collection_name, self.ATLAS_VECTOR_SEARCH_INDEX_NAME)
+
+        if status == SearchIndexStatusCache.MISSING:
+            logger.info(f"Creating Atlas Search index {self.ATLAS_VECTOR_SEARCH_INDEX_NAME}")
+            response = self._get_atlas_client().create_index(
+                self.DB_NAME,
+                self.collection_name,
+                self.ATLAS_VECTOR_SEARCH_INDEX_NAME,
+            )
+            if isinstance(response, dict) and response.get("error", None) == 400:
+                return response
+            index_cache.set_status(
+                self.DB_NAME, self.collection_name, self.ATLAS_VECTOR_SEARCH_INDEX_NAME, SearchIndexStatusCache.BUILDING
+            )
+            status = SearchIndexStatusCache.BUILDING
+
+        if status == SearchIndexStatusCache.BUILDING:
+            if not wait:
+                raise SearchIndexNotReadyError(self.collection_name)
+            index_cache.wait_until_queryable(self.DB_NAME, self.collection_name, self.ATLAS_VECTOR_SEARCH_INDEX_NAME)
+
+    def get_embeddings(self):
+        """
+        Gets the embeddings of the collection documents and questions, caching the questions if embedding_cache is set.
         """
-        try:
-            collection_exist = self.client[self.DB_NAME].validate_collection(self.collection_name)
-            if collection_exist["nrecords"] == 0:
-                self.save_vectors(data)
-        except errors.OperationFailure:
-            self.save_vectors(data)
+        embeddings = OpenAIEmbeddings(disallowed_special=(), openai_api_key=self.openai_key)
+        if self.embedding_cache is None:
+            return embeddings
+        return CachedEmbeddings(embeddings, self.embedding_cache, embeddings.model)
+
+    def _get_collection(self):
+        return self.client[self.DB_NAME][self.collection_name]
+
+    def _get_manifests(self):
+        return self.client[self.DB_NAME][self.MANIFEST_COLLECTION_NAME]
 
-    def save_vectors(self, data):
+    @staticmethod
+    def content_hash(text):
+        return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+    def get_manifest(self):
         """
-        Saves the vectors to the MongoDB collection.
+        Gets the manifest of the vector collection.
 
-        Args:
-            data (DataFrame): The data to save.
-        """
-        MongoDBAtlasVectorSearch.from_documents(
-            documents=data,
-            embedding=OpenAIEmbeddings(disallowed_special=(), openai_api_key=self.openai_key),
-            collection=self.client[self.DB_NAME][self.collection_name],
-            index_name=self.ATLAS_VECTOR_SEARCH_INDEX_NAME,
-            # tlsCAFile=certifi.where(),
-        )
+        Returns:
+            dict: The manifest, or None if the collection has never been synced.
+        """
+        return self._get_manifests().find_one({"_id": self.collection_name})
 
     def get_vector_store(self):
         """
@@ -175,16 +228,102 @@ class MongoDBHandler:
         Returns:
             MongoDBAtlasVectorSearch: The vector store.
         """
-        return MongoDBAtlasVectorSearch.from_connection_string(
-            self.db_url,
-            f"{self.DB_NAME}.{self.collection_name}",
-            OpenAIEmbeddings(disallowed_special=(), openai_api_key=self.openai_key),
-            index_name=self.ATLAS_VECTOR_SEARCH_INDEX_NAME,
+        return MongoDBAtlasVectorSearch(
+            self._get_collection(), self.get_embeddings(), index_name=self.ATLAS_VECTOR_SEARCH_INDEX_NAME
+        )
+
+    def get_retriever(self, backend=ATLAS_RETRIEVER_BACKEND):
+        """
+        Gets the retriever of the collection, recording its latency as the retriever.<backend>_ms metric.
+
+        Args:
+            backend (str): "atlas" queries the Atlas Search index with $vectorSearch, "numpy" loads the embeddings of
+                the collection in memory and ranks them in process.
+
+        Returns:
+            BaseRetriever: The retriever returning the documents closest to a question.
+        """
+        if backend == self.ATLAS_RETRIEVER_BACKEND:
+            retriever = self.get_vector_store().as_retriever()
+        elif backend == self.NUMPY_RETRIEVER_BACKEND:
+            retriever = NumpyVectorRetriever.from_collection(
+                self._get_collection(), self.get_embeddings(), text_key=self.TEXT_KEY
+            )
+        else:
+            raise ValueError(f"Unknown retriever backend {backend}")
+        return TimedRetriever(retriever=retriever, metric_name=f"retriever.{backend}_ms")
+
+    def sync_vectors(self, force=False):
+        """
+        Brings the vector collection in line with the survey data of the segment.
+
+        The sync is skipped when the source data has not changed since the last sync. Otherwise, the questions and
+        answers documents are compared with the collection by content hash: new or changed documents are embedded and
+        inserted, then the documents that are no longer generated are deleted. Documents saved before content hashes
+        were stored are matched on the hash of their text, so they are not embedded again.
+
+        Args:
+            force (bool): Compares the documents even if the source data has not changed.
+
+        Returns:
+            dict: The number of documents added, deleted and kept in the collection.
+        """
+        source_version = self.data_handler.source_version()
+        manifest = self.get_manifest()
+        if not force and manifest is not None and manifest.get("source_version") == source_version:
+            logger.info(f"Vectors of {self.collection_name} are up to date")
+            return {"skipped": True, "added": 0, "deleted": 0, "total": manifest.get("document_count", 0)}
+
+        questions_answers_df = self.data_handler.build_questions_answers_df()
+        documents = {}
+        for document in DataFrameLoader(questions_answers_df).load():
+            documents.setdefault(self.content_hash(document.page_content), document)
+
+        collection = self._get_collection()
+        kept_hashes = set()
+        stale_ids = []
+        for vector in collection.find({}, {self.TEXT_KEY: 1, self.CONTENT_HASH_KEY: 1}):
+            content_hash = vector.get(self.CONTENT_HASH_KEY) or self.content_hash(vector.get(self.TEXT_KEY, ""))
+            if content_hash in documents and content_hash not in kept_hashes:
+                kept_hashes.add(content_hash)
+            else:
+                stale_ids.append(vector["_id"])
+
+        added_hashes = [content_hash for content_hash in documents if content_hash not in kept_hashes]
+        if added_hashes:
+            # Insert before deleting so the collection is never empty while it is being synced
+            self.get_vector_store().add_texts(
+                [documents[content_hash].page_content for content_hash in added_hashes],
+                [
+                    {**documents[content_hash].metadata, self.CONTENT_HASH_KEY: content_hash}
+                    for content_hash in added_hashes
+                ],
+            )
+        if stale_ids:
+            collection.delete_many({"_id": {"$in": stale_ids}})
+        if added_hashes or stale_ids:
+            self.data_handler.save_questions_answers_df(questions_answers_df)
+
+        self._get_manifests().replace_one(
+            {"_id": self.collection_name},
+            {
+                "source_version": source_version,
+                "source_files": self.data_handler.source_files,
+                "document_count": len(documents),
+                "synced_at": datetime.utcnow(),
+            },
+            upsert=True,
+        )
+        logger.info(
+            f"Synced vectors of {self.collection_name}: {len(added_hashes)} added, {len(stale_ids)} deleted, "
+            f"{len(documents)} in total"
         )
+        return {"skipped": False, "added": len(added_hashes), "deleted": len(stale_ids), "total": len(documents)}
 
-    def generate_and_save_vectors(self):
+    def ensure_vectors(self):
         """
-        Generates and saves vectors to the MongoDB collection.
+        Syncs the vectors of a segment that has never been synced, so a new segment can be chatted with right away.
+        Changes to the source data of synced segments are picked up by the explicit sync instead.
         """
-        data = self.data_handler.generate_questions_answers_df()
-        self.validate_and_save_vectors(data)
+        if self.get_manifest() is None:
+            self.sync_vectors()
@@ -0,0 +1,114 @@
+from typing import Any, List
+
+import numpy as np
+from langchain.callbacks.manager import AsyncCallbackManagerForRetrieverRun, CallbackManagerForRetrieverRun
+from langchain.schema import BaseRetriever, Document
+from langchain.schema.embeddings import Embeddings
+
+from app.utils.metrics import metrics
+
+
+def normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    """
+    Scales every row of the matrix to unit length, so cosine similarities are plain dot products.
+    Rows of zeros are left untouched.
+    """
+    norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+    norms[norms == 0] = 1
+    return np.ascontiguousarray(matrix / norms, dtype=np.float32)
+
+
+def top_k_indices(scores: np.ndarray, k: int) -> np.ndarray:
+    """
+    Returns the indices of the k highest scores, highest first, without sorting all the scores.
+    """
+    if k >= len(scores):
+        return np.argsort(-scores, kind="stable")
+    candidates = np.argpartition(-scores, k - 1)[:k]
+    return candidates[np.argsort(-scores[candidates], kind="stable")]
+
+
+class NumpyVectorRetriever(BaseRetriever):
+    """
+    Retrieves the documents of a segment from an in-process matrix of their embeddings.
+
+    The embeddings of the segment collection are loaded once into a normalized float32 matrix, so the top k documents
+    of a question come from a single matrix-vector product instead of an Atlas $vectorSearch round trip. Documents are
+    returned like MongoDBAtlasVectorSearch returns them, without their embedding in the metadata.
+
+        Attributes:
+            embeddings (Embeddings): Embeds the questions.
+
+            documents (List[Document]): The documents of the segment, in the order of the matrix rows.
+
+            matrix (np.ndarray): The normalized embeddings of the documents, None if there are no documents.
+
+            k (int): The number of documents returned.
+    """
+
+    embeddings: Embeddings
+    documents: List[Document]
+    matrix: Any
+    k: int = 4
+
+    class Config:
+        arbitrary_types_allowed = True
+
+    @classmethod
+    def from_collection(cls, collection, embeddings: Embeddings, text_key="text", embedding_key="embedding", **kwargs):
+        """
+        Loads the documents and embeddings of a vector collection.
+
+        Args:
+            collection (Collection): The MongoDB vector collection.
+            embeddings (Embeddings): Embeds the questions.
+            text_key (str): The field holding the document text.
+            embedding_key (str): The field holding the document embedding.
+
+        Returns:
+            NumpyVectorRetriever: The retriever over the collection.
+        """
+        documents = []
+        vectors = []
+        for vector in collection.find({}):
+            vectors.append(vector.pop(embedding_key))
+            documents.append(Document(page_content=vector.pop(text_key), metadata=vector))
+
+        # An empty collection has no embedding to give the matrix its width, it retrieves no documents
+        matrix = normalize_rows(np.asarray(vectors, dtype=np.float32)) if vectors else None
+        return cls(embeddings=embeddings, documents=documents, matrix=matrix, **kwargs)
+
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun) -> List[Document]:
+        if not self.documents:
+            return []
+        query_vector = normalize_rows(np.asarray(self.embeddings.embed_query(query), dtype=np.float32))
+        scores = self.matrix @ query_vector
+        return [self.documents[i] for i in top_k_indices(scores, self.k)]
+
+    async def _aget_relevant_documents(
+        self, query: str, *, run_manager: AsyncCallbackManagerForRetrieverRun
+    ) -> List[Document]:
+        if not self.documents:
+            return []
+        query_vector = normalize_rows(np.asarray(await self.embeddings.aembed_query(query), dtype=np.float32))
+        scores = self.matrix @ query_vector
+        return [self.documents[i] for i in top_k_indices(scores, self.k)]
+
+
+class TimedRetriever(BaseRetriever):
+    """
+    Wraps a retriever to record its latency under metric_name, so retriever backends can be compared.
+    """
+
+    retriever: BaseRetriever
+    metric_name: str
+
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun) -> List[Document]:
+        with metrics.timer(self.metric_name):
+            return self.retriever.get_relevant_documents(query, callbacks=run_manager.get_child())
+
+    async def _aget_relevant_documents(
+        self, query: str, *, run_manager: AsyncCallbackManagerForRetrieverRun
+    ) -> List[Document]:
+        with metrics.timer(self.metric_name):
+            return await self.retriever.aget_relevant_documents(query, callbacks=run_manager.get_child())
@@ -0,0 +1,97 @@
+import contextvars
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+from langchain.callbacks.manager import CallbackManagerForChainRun
+from langchain.chains import ConversationalRetrievalChain
+from langchain.chains.conversational_retrieval.base import _get_chat_history
+from langchain.schema import Document
+from langchain.schema.embeddings import Embeddings
+
+from app.utils.metrics import metrics
+
+logger = logging.getLogger("qudo")
+
+# Retrievals started on the raw questions of follow up messages, shared by the chains of the worker
+_speculation_executor = ThreadPoolExecutor(max_workers=16, thread_name_prefix="speculative-retrieval")
+
+# The raw question and the future of its speculative retrieval, for the chain run of the current request
+_speculation = contextvars.ContextVar("speculative_retrieval", default=None)
+
+
+def cosine_similarity(a, b):
+    a = np.asarray(a, dtype=np.float32)
+    b = np.asarray(b, dtype=np.float32)
+    norms = np.linalg.norm(a) * np.linalg.norm(b)
+    return float(a @ b / norms) if norms else 0.0
+
+
+class SpeculativeConversationalRetrievalChain(ConversationalRetrievalChain):
+    """
+    A ConversationalRetrievalChain retrieving the documents of a follow up message while its question is condensed.
+
+    The retrieval of the raw question starts in the background before the condense question LLM call. Once the
+    standalone question is known, the speculative documents are used if its embedding is at least
+    similarity_threshold similar to the raw question's, and discarded for a retrieval of the standalone question
+    otherwise. How often the speculation is used, discarded or fails is recorded in the speculative_retrieval metrics.
+
+        Attributes:
+            embeddings (Embeddings): Embeds the raw and standalone questions, the retriever embeddings so they are cached.
+
+            similarity_threshold (float): The cosine similarity above which the speculative documents are used.
+    """
+
+    embeddings: Embeddings
+    similarity_threshold: float = 0.9
+
+    class Config:
+        arbitrary_types_allowed = True
+
+    def _call(self, inputs: Dict[str, Any], run_manager: Optional[CallbackManagerForChainRun] = None) -> Dict[str, Any]:
+        get_chat_history = self.get_chat_history or _get_chat_history
+        if not get_chat_history(inputs["chat_history"]):
+            # Without history the question is not condensed, there is no LLM call to hide the retrieval behind
+            return super()._call(inputs, run_manager=run_manager)
+
+        question = inputs["question"]
+        future = _speculation_executor.submit(self.retriever.get_relevant_documents, question)
+        token = _speculation.set((question, future))
+        try:
+            return super()._call(inputs, run_manager=run_manager)
+        finally:
+            _speculation.reset(token)
+
+    def _get_docs(
+        self, question: str, inputs: Dict[str, Any], *, run_manager: CallbackManagerForChainRun
+    ) -> List[Document]:
+        speculation = _speculation.get()
+        if speculation is not None:
+            docs = self._get_speculative_docs(*speculation, question)
+            if docs is not None:
+                return self._reduce_tokens_below_limit(docs)
+        return super()._get_docs(question, inputs, run_manager=run_manager)
+
+    def _get_speculative_docs(self, raw_question, future, standalone_question):
+        if " ".join(raw_question.split()) == " ".join(standalone_question.split()):
+            similarity = 1.0
+        else:
+            similarity = cosine_similarity(
+                self.embeddings.embed_query(raw_question), self.embeddings.embed_query(standalone_question)
+            )
+        metrics.observe("speculative_retrieval.similarity", similarity)
+
+        if similarity < self.similarity_threshold:
+            future.cancel()
+            metrics.increment("speculative_retrieval.discarded")
+            return None
+
+        try:
+            docs = future.result()
+        except Exception as e:
+            logger.warning(f"Speculative retrieval failed: {e}")
+            metrics.increment("speculative_retrieval.failed")
+            return None
+        metrics.increment("speculative_retrieval.used")
+        return docs
@@ -0,0 +1,64 @@
+import queue
+import threading
+from typing import Any
+
+from langchain.callbacks.base import BaseCallbackHandler
+
+
+class QueueCallbackHandler(BaseCallbackHandler):
+    """
+    Puts the tokens generated by the streaming LLMs of a chain into a queue.
+    """
+
+    def __init__(self, tokens: queue.Queue):
+        self.tokens = tokens
+
+    def on_llm_new_token(self, token: str, **kwargs: Any) -> None:
+        if token:
+            self.tokens.put(token)
+
+
+class ChainStream:
+    """
+    Runs a chain in a background thread and iterates over the tokens of its answer while the chain generates them.
+
+    Only the LLMs built with streaming=True emit tokens, so the condense question LLM of a ConversationalRetrievalChain
+    is not streamed. Once the iteration is over, the outputs of the chain are in result, and an exception raised by
+    the chain is raised again by the iteration.
+
+        Attributes:
+            chain (Chain): The chain answering the question.
+
+            inputs (dict): The inputs of the chain.
+
+            result (dict): The outputs of the chain, once the iteration is over.
+    """
+
+    _DONE = object()
+
+    def __init__(self, chain, inputs):
+        self.chain = chain
+        self.inputs = inputs
+        self.result = None
+        self._error = None
+        self._tokens = queue.Queue()
+
+    def _run(self):
+        try:
+            self.result = self.chain(self.inputs, callbacks=[QueueCallbackHandler(self._tokens)])
+        except Exception as e:
+            self._error = e
+        finally:
+            self._tokens.put(self._DONE)
+
+    def __iter__(self):
+        thread = threading.Thread(target=self._run, daemon=True)
+        thread.start()
+        while True:
+            token = self._tokens.get()
+            if token is self._DONE:
+                break
+            yield token
+        thread.join()
+        if self._error is not None:
+            raise self._error
@@ -0,0 +1,179 @@
+import logging
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from app.utils.metrics import metrics
+
+logger = logging.getLogger("qudo")
+
+
+class CircuitOpenError(requests.RequestException):
+    """Exception raised instead of calling a dependency whose circuit breaker is open.
+
+    Attributes:
+        target -- The name of the dependency
+    """
+
+    def __init__(self, target):
+        self.target = target
+        super().__init__(f"The circuit breaker of {target} is open")
+
+
+class CircuitBreaker:
+    """
+    Fails the calls to a dependency fast once it keeps failing.
+
+    After failure_threshold consecutive failures the circuit opens and calls are refused for reset_timeout seconds.
+    The first call after that is let through as a trial: its success closes the circuit, its failure opens it again.
+
+        Attributes:
+            failure_threshold (int): The number of consecutive failures opening the circuit.
+
+            reset_timeout (float): The number of seconds the circuit stays open before a trial call.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold=5, reset_timeout=30, clock=time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._clock = clock
+        self._lock = threading.Lock()
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = None
+        self.opens = 0
+
+    def allow(self):
+        with self._lock:
+            if self.state == self.OPEN and self._clock() - self.opened_at >= self.reset_timeout:
+                self.state = self.HALF_OPEN
+                return True
+            return self.state == self.CLOSED
+
+    def record_success(self):
+        with self._lock:
+            self.state = self.CLOSED
+            self.failures = 0
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                if self.state != self.OPEN:
+                    self.opens += 1
+                self.state = self.OPEN
+                self.opened_at = self._clock()
+
+    def stats(self):
+        return {"state": self.state, "failures": self.failures, "opens": self.opens}
+
+
+class HttpClient:
+    """
+    An outbound HTTP client for one dependency, shared by the threads of a worker.
+
+    Its session keeps pool_maxsize connections alive, every call has connect and read timeouts, and idempotent
+    calls failing to connect or answered with a 502, 503 or 504 are retried up to retries times with an exponential
+    backoff. Calls failing after the retries, or answered with a server error, count towards the circuit breaker,
+    which raises CircuitOpenError instead of calling a degraded dependency. The latency of every call is recorded in
+    the http.<name>.latency_ms metric.
+
+        Attributes:
+            name (str): The name of the dependency, in the metrics.
+
+            timeout (tuple): The connect and read timeouts, in seconds.
+
+            breaker (CircuitBreaker): The circuit breaker of the dependency.
+    """
+
+    def __init__(
+        self,
+        name,
+        connect_timeout=3,
+        read_timeout=10,
+        retries=2,
+        backoff_factor=0.3,
+        pool_maxsize=50,
+        failure_threshold=5,
+        reset_timeout=30,
+    ):
+        self.name = name
+        self.timeout = (connect_timeout, read_timeout)
+        self.breaker = CircuitBreaker(failure_threshold, reset_timeout)
+
+        retry = Retry(
+            total=retries,
+            status_forcelist=(502, 503, 504),
+            backoff_factor=backoff_factor,
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(pool_maxsize=pool_maxsize, max_retries=retry)
+        self.session = requests.Session()
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    def request(self, method, url, **kwargs):
+        """
+        Sends a request through the shared session.
+
+        Raises:
+            CircuitOpenError: If the circuit breaker of the dependency is open.
+            requests.RequestException: If the request fails.
+        """
+        if not self.breaker.allow():
+            metrics.increment(f"http.{self.name}.short_circuited")
+            raise CircuitOpenError(self.name)
+
+        kwargs.setdefault("timeout", self.timeout)
+        start_time = time.perf_counter()
+        try:
+            response = self.session.request(method, url, **kwargs)
+        except requests.RequestException:
+            self.breaker.record_failure()
+            metrics.increment(f"http.{self.name}.errors")
+            raise
+        finally:
+            metrics.observe(f"http.{self.name}.latency_ms", (time.perf_counter() - start_time) * 1000)
+
+        if response.status_code >= 500:
+            self.breaker.record_failure()
+            metrics.increment(f"http.{self.name}.errors")
+        else:
+            self.breaker.record_success()
+        return response
+
+    def get(self, url, **kwargs):
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.request("POST", url, **kwargs)
+
+    def stats(self):
+        return self.breaker.stats()
+
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def get_http_client(name, **kwargs):
+    """
+    Returns the HTTP client of a dependency, created with kwargs on the first call and shared by the whole process.
+    """
+    with _clients_lock:
+        client = _clients.get(name)
+        if client is None:
+            client = _clients[name] = HttpClient(name, **kwargs)
+        return client
+
+
+def http_client_stats():
+    with _clients_lock:
+        return {name: client.stats() for name, client in _clients.items()}
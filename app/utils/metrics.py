@@ -0,0 +1,86 @@
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+
+class _Histogram:
+    def __init__(self, sample_size):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.samples = deque(maxlen=sample_size)
+
+    def observe(self, value):
+        self.count += 1
+        self.total += value
+        self.max = max(self.max, value)
+        self.samples.append(value)
+
+    def percentile(self, samples, fraction):
+        return samples[min(int(len(samples) * fraction), len(samples) - 1)]
+
+    def summary(self):
+        samples = sorted(self.samples)
+        return {
+            "count": self.count,
+            "mean": round(self.total / self.count, 3),
+            "p50": round(self.percentile(samples, 0.5), 3),
+            "p99": round(self.percentile(samples, 0.99), 3),
+            "max": round(self.max, 3),
+        }
+
+
+class Metrics:
+    """
+    A thread-safe, in-process registry of counters and histograms, exposed by the admin stats endpoint.
+
+    Histograms keep the count, mean and max of every observation and compute percentiles over the last sample_size
+    observations, so their memory use stays bounded.
+
+        Attributes:
+            sample_size (int): The number of recent observations percentiles are computed on.
+    """
+
+    def __init__(self, sample_size=1024):
+        self.sample_size = sample_size
+        self._counters = {}
+        self._histograms = {}
+        self._lock = threading.Lock()
+
+    def increment(self, name, value=1):
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + value
+
+    def observe(self, name, value):
+        with self._lock:
+            histogram = self._histograms.get(name)
+            if histogram is None:
+                histogram = self._histograms[name] = _Histogram(self.sample_size)
+            histogram.observe(value)
+
+    @contextmanager
+    def timer(self, name):
+        """
+        Observes the time spent in the block, in milliseconds.
+        """
+        start_time = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, (time.perf_counter() - start_time) * 1000)
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "counters": dict(self._counters),
+                "histograms": {name: histogram.summary() for name, histogram in self._histograms.items()},
+            }
+
+    def reset(self):
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+
+
+metrics = Metrics()
@@ -0,0 +1,117 @@
+import logging
+import os
+import threading
+import time
+
+import certifi
+from pymongo import MongoClient, monitoring
+
+from app.utils.metrics import metrics
+
+logger = logging.getLogger("qudo")
+
+
+class PoolMetricsListener(monitoring.ConnectionPoolListener):
+    """
+    Records how long threads wait to check a connection out of the pool, and how often the check out fails.
+    """
+
+    def __init__(self):
+        self._check_out_started = threading.local()
+
+    def _start_time(self, address):
+        return getattr(self._check_out_started, "times", {}).pop(address, None)
+
+    def connection_check_out_started(self, event):
+        if not hasattr(self._check_out_started, "times"):
+            self._check_out_started.times = {}
+        self._check_out_started.times[event.address] = time.perf_counter()
+
+    def connection_checked_out(self, event):
+        start_time = self._start_time(event.address)
+        if start_time is not None:
+            metrics.observe("mongo.pool_checkout_wait_ms", (time.perf_counter() - start_time) * 1000)
+
+    def connection_check_out_failed(self, event):
+        self._start_time(event.address)
+        metrics.increment(f"mongo.pool_checkout_failed.{event.reason}")
+
+    def connection_created(self, event):
+        metrics.increment("mongo.connections_created")
+
+    def connection_closed(self, event):
+        metrics.increment("mongo.connections_closed")
+
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        pass
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_checked_in(self, event):
+        pass
+
+
+pool_metrics_listener = PoolMetricsListener()
+
+
+class MongoClientPool:
+    """
+    Hands out one pooled MongoClient per connection string and per process.
+
+    Clients are created on first use and remembered with the pid that created them, so a uwsgi worker forked from
+    a master that already used a client opens its own connections instead of sharing the master's sockets.
+
+        Attributes:
+            options (dict): The MongoClient options of the created clients, e.g. maxPoolSize or maxIdleTimeMS.
+    """
+
+    def __init__(self):
+        self.options = {}
+        self._clients = {}
+        self._pid = os.getpid()
+        self._lock = threading.Lock()
+
+    def configure(self, **options):
+        """
+        Sets the options of the clients created from now on, ignoring options set to None.
+        """
+        self.options.update({name: value for name, value in options.items() if value is not None})
+
+    def client_options(self):
+        return {"tlsCAFile": certifi.where(), "event_listeners": [pool_metrics_listener], **self.options}
+
+    def get_client(self, db_url):
+        """
+        Gets the client of the process for the connection string, creating it on first use.
+
+        Args:
+            db_url (str): The MongoDB connection string.
+
+        Returns:
+            MongoClient: The pooled client.
+        """
+        with self._lock:
+            if self._pid != os.getpid():
+                # The clients were created by the parent process, their sockets cannot be shared with it
+                self._clients = {}
+                self._pid = os.getpid()
+
+            client = self._clients.get(db_url)
+            if client is None:
+                logger.info(f"Creating MongoDB client for process {self._pid}")
+                client = MongoClient(db_url, connect=False, **self.client_options())
+                self._clients[db_url] = client
+            return client
+
+
+mongo_clients = MongoClientPool()
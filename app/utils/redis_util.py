@@ -1,16 +1,153 @@
-from app.flask_app import redis_db
+import time
+
+import redis
+from redis.client import Pipeline
+
+from app.utils.cache_utils.local_cache import LocalCache
+from app.utils.metrics import metrics
+
+
+class PythiaPipeline(Pipeline):
+    """
+    A redis pipeline recording the latency of its round trips in the redis.pipeline_ms metric.
+    """
+
+    def execute(self, raise_on_error=True):
+        start_time = time.perf_counter()
+        try:
+            return super().execute(raise_on_error=raise_on_error)
+        finally:
+            metrics.observe("redis.pipeline_ms", (time.perf_counter() - start_time) * 1000)
+
+
+class PythiaRedis(redis.Redis):
+    """
+    The redis client of the app, recording the latency of every command in a redis.<command>_ms metric.
+
+        Attributes:
+            client_cache (LocalCache): The values read with local=True by RedisUtil, kept per worker, or None if client
+                side caching is disabled.
+    """
+
+    def __init__(self, *args, client_cache_ttl=0, client_cache_max_size=1024, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.client_cache = (
+            LocalCache(max_size=client_cache_max_size, ttl=client_cache_ttl) if client_cache_ttl else None
+        )
+
+    def execute_command(self, *args, **options):
+        start_time = time.perf_counter()
+        try:
+            return super().execute_command(*args, **options)
+        finally:
+            metrics.observe(f"redis.{str(args[0]).lower()}_ms", (time.perf_counter() - start_time) * 1000)
+
+    def pipeline(self, transaction=True, shard_hint=None):
+        return PythiaPipeline(self.connection_pool, self.response_callbacks, transaction, shard_hint)
+
+    def stats(self):
+        pool = self.connection_pool
+        if isinstance(pool, redis.BlockingConnectionPool):
+            connections = len(pool._connections)
+        else:
+            connections = pool._created_connections
+        return {
+            "max_connections": pool.max_connections,
+            "connections": connections,
+            "client_cache": self.client_cache.stats() if self.client_cache is not None else None,
+        }
 
 
 class RedisUtil:
+    """
+    Helpers over the pooled redis client of the app, batching keys into a single round trip.
+    """
+
+    @staticmethod
+    def client():
+        from app.flask_app import redis_db
+
+        return redis_db
 
     @staticmethod
-    def get_cached_data(key):
-        return redis_db.get(key)
+    def get_cached_data(key, local=False):
+        """
+        Gets the value of a key.
+
+        Args:
+            key (str): The key.
+            local (bool): Whether the value may be served from the client cache of the worker, for read-mostly keys
+                that tolerate being stale for the client cache ttl.
+
+        Returns:
+            bytes: The value, or None if the key does not exist.
+        """
+        return RedisUtil.get_many([key], local=local)[0]
+
+    @staticmethod
+    def get_many(keys, local=False):
+        """
+        Gets the values of keys in a single MGET.
+
+        Args:
+            keys (list): The keys.
+            local (bool): Whether the values may be served from the client cache of the worker.
+
+        Returns:
+            list: The values, None for the keys that do not exist.
+        """
+        redis_db = RedisUtil.client()
+        client_cache = redis_db.client_cache if local else None
+        values = [client_cache.get(key) if client_cache is not None else None for key in keys]
+        missing_keys = [key for key, value in zip(keys, values) if value is None]
+        if not missing_keys:
+            return values
+
+        fetched = dict(zip(missing_keys, redis_db.mget(missing_keys)))
+        for key, value in fetched.items():
+            if client_cache is not None and value is not None:
+                client_cache.set(key, value)
+        return [fetched[key] if value is None else value for key, value in zip(keys, values)]
 
     @staticmethod
-    def set_cache_data( key, data, timeout):
-        redis_db.set(key, data, timeout)
+    def set_cache_data(key, data, timeout):
+        RedisUtil.set_many({key: data}, timeout)
 
     @staticmethod
-    def invalidate_cache_data(key):
-        redis_db.delete(key)
+    def set_many(mapping, timeout):
+        """
+        Sets the values of keys with the same timeout, in a single pipelined round trip.
+        """
+        redis_db = RedisUtil.client()
+        pipeline = redis_db.pipeline(transaction=False)
+        for key, data in mapping.items():
+            pipeline.set(key, data, timeout)
+            if redis_db.client_cache is not None:
+                redis_db.client_cache.pop(key)
+        pipeline.execute()
+
+    @staticmethod
+    def invalidate_cache_data(*keys):
+        redis_db = RedisUtil.client()
+        if redis_db.client_cache is not None:
+            for key in keys:
+                redis_db.client_cache.pop(key)
+        redis_db.delete(*keys)
+
+    @staticmethod
+    def pipeline(transaction=True):
+        return RedisUtil.client().pipeline(transaction=transaction)
+
+
+class RedisClientMixin:
+    """
+    Gives a service the redis client it was created with as _redis_client, or the pooled redis client of the app.
+    """
+
+    _redis_client = None
+
+    @property
+    def redis_client(self):
+        if self._redis_client is None:
+            self._redis_client = RedisUtil.client()
+        return self._redis_client
@@ -1,6 +1,6 @@
 import json
 
-from flask import make_response
+from flask import Response, make_response, stream_with_context
 
 
 def get_filters(request, allowed_filters):
@@ -15,3 +15,15 @@ def make_json_response(data, status_code, headers=None):
         headers = {'content-type': "application/json"}
 
     return make_response(json.dumps(data, default=str), status_code, headers)
+
+
+def format_sse(event, data):
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+
+def make_event_stream_response(events):
+    """
+    Streams the server-sent events yielded by events, keeping the request context while they are generated.
+    """
+    headers = {"content-type": "text/event-stream", "Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    return Response(stream_with_context(events), 200, headers)
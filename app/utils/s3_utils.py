@@ -1,7 +1,8 @@
 import boto3
-import s3fs
 import json
 
+from botocore.exceptions import ClientError
+
 
 def get_s3_resource():
     # Create S3 client
@@ -15,11 +16,15 @@ class S3Utils:
         self.environ = environ
         self.s3 = boto3.resource('s3')
         self.s3_client = boto3.client('s3')
-        self.s3_check = s3fs.S3FileSystem()
 
     def is_valid_uri(self, filepath):
-        filepath = f's3://{self.bucket}/{filepath}'
-        return self.s3_check.exists(filepath)
+        try:
+            self.s3_client.head_object(Bucket=self.bucket, Key=filepath)
+        except ClientError as e:
+            if e.response["Error"]["Code"] in ("404", "NoSuchKey"):
+                return False
+            raise
+        return True
 
     def read_file(self, filepath):
         content_obj = self.s3.Object(self.bucket, filepath)
@@ -0,0 +1,2 @@
+# Entry point of the celery workers: celery -A app.worker.celery worker
+from app.flask_app import celery  # noqa: F401
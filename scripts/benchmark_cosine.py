@@ -0,0 +1,99 @@
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+from openai.embeddings_utils import cosine_similarity
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.utils.chatbot.gpt_utils.information_retrieval import build_embedding_matrix, rank_reference_questions
+
+EMBEDDING_SIZE = 1536
+
+
+def generate_reference_table(n_questions: int, seed: int = 0):
+    """
+    Generates a reference table and population modes shaped like the relevant questions embedding and population
+    modes parquet files, with embeddings clustered around the input question so some of them pass the threshold.
+    """
+    rng = np.random.default_rng(seed)
+    input_question_embed = rng.normal(size=EMBEDDING_SIZE)
+
+    def embeddings():
+        noise = rng.uniform(0.1, 1.5, size=(n_questions, 1))
+        return list(input_question_embed + noise * rng.normal(size=(n_questions, EMBEDDING_SIZE)))
+
+    ref_table = pd.DataFrame(
+        {
+            "shortname": [f"q{i}" for i in range(n_questions)],
+            "title": [f"Question {i}" for i in range(n_questions)],
+            "better_question_embedding": embeddings(),
+            "title_embedding": embeddings(),
+        }
+    )
+    pop_modes = pd.DataFrame(
+        {
+            "shortname": ref_table["shortname"],
+            "weighted_mode": [f"weighted answer {i}" for i in range(n_questions)],
+            "unweighted_mode": [f"unweighted answer {i}" for i in range(n_questions)],
+        }
+    )
+    return input_question_embed.tolist(), ref_table, pop_modes
+
+
+def rank_row_by_row(input_question_embed, ref_table, pop_modes, cosine_threshold=0.85):
+    """
+    The Series.apply implementation of the ranking, kept to check the matrix one produces the same frame.
+    """
+    temp_ref = ref_table.copy()
+    temp_ref["better_cosine_score"] = temp_ref["better_question_embedding"].apply(
+        lambda x: cosine_similarity(x, input_question_embed)
+    )
+    temp_ref["title_cosine_score"] = temp_ref["title_embedding"].apply(
+        lambda x: cosine_similarity(x, input_question_embed)
+    )
+    temp_ref["max_cosine_col"] = temp_ref[["better_cosine_score", "title_cosine_score"]].idxmax(axis=1)
+    temp_ref["max_cosine_score"] = temp_ref[["better_cosine_score", "title_cosine_score"]].max(axis=1)
+    temp_ref.sort_values(by=["max_cosine_score"], ascending=False, inplace=True)
+    temp_ref = temp_ref.merge(pop_modes[["shortname", "weighted_mode", "unweighted_mode"]], on="shortname")
+    return temp_ref[temp_ref["max_cosine_score"] >= cosine_threshold].reset_index(drop=True)
+
+
+def best_time(function, repeat=5):
+    timings = []
+    for _ in range(repeat):
+        start_time = time.perf_counter()
+        result = function()
+        timings.append(time.perf_counter() - start_time)
+    return result, min(timings)
+
+
+def benchmark(sizes=(500, 2_000, 10_000), max_results=20):
+    """
+    Ranks synthetic reference tables row by row and with the embedding matrix, checks both give the same frame and
+    prints the time taken by each. "matrix" builds the matrix on every call. "cached" is the path of the app, which
+    builds the matrix once per version of the reference table and keeps the best max_results questions.
+    """
+    print(f"{'questions':>10} {'row-by-row (ms)':>16} {'matrix (ms)':>12} {'cached (ms)':>12} {'speedup':>8}")
+    for n_questions in sizes:
+        input_question_embed, ref_table, pop_modes = generate_reference_table(n_questions)
+        expected, row_time = best_time(lambda: rank_row_by_row(input_question_embed, ref_table, pop_modes))
+        result, matrix_time = best_time(lambda: rank_reference_questions(input_question_embed, ref_table, pop_modes))
+        embedding_matrix = build_embedding_matrix(ref_table)
+        cached_result, cached_time = best_time(
+            lambda: rank_reference_questions(
+                input_question_embed, ref_table, pop_modes, embedding_matrix=embedding_matrix, max_results=max_results
+            )
+        )
+        pd.testing.assert_frame_equal(result, expected)
+        pd.testing.assert_frame_equal(cached_result, expected.head(max_results))
+        print(
+            f"{n_questions:>10} {row_time * 1000:>16.1f} {matrix_time * 1000:>12.1f} {cached_time * 1000:>12.1f} "
+            f"{row_time / cached_time:>7.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    benchmark()
@@ -0,0 +1,215 @@
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.utils.chatbot.helper_utils.data_utils import convert_to_shortname
+from app.utils.chatbot.langchain_utils.data_handler import PythiaDataHandler
+
+SEGMENTS = ["Savers", "Investors", "Debt Fighters", "Future Forward"]
+SEGMENT = "Savers"
+
+
+def generate_synthetic_survey(n_rows: int, seed: int = 0):
+    """
+    Generates segment modes and chi-squared data shaped like the survey parquet files, with about n_rows
+    chi-squared rows. Half of the questions are identified by varname and half by shortname in the segment modes.
+    """
+    rng = np.random.default_rng(seed)
+    n_questions = max(n_rows // (4 * len(SEGMENTS)), 1)
+
+    seg_modes_rows = []
+    chisquared_rows = []
+    for k in range(n_questions):
+        shortname = f"sbeh_us_q{k}"
+        title = f"How often do you do thing {k}?" + ("\xa0" if k % 5 == 0 else "")
+        varnames = [f"{shortname}_opt{j}" + ("_gg" if j == 1 else "") for j in range(4)]
+        if k % 2 == 0:
+            for varname in varnames:
+                seg_modes_rows.append((varname, title, f"answer {k}", rng.random(), "varname"))
+        else:
+            seg_modes_rows.append((shortname, title, f"answer {k}", rng.random(), "shortname"))
+
+        for varname in varnames:
+            for segment in SEGMENTS:
+                n_categories = int(rng.integers(0, 4))
+                categories = [f"category {c}" for c in range(n_categories)]
+                # Three decimal percentages, including values sitting on a rounding half boundary
+                percentages = np.round(rng.random(n_categories) * 100, 3)
+                if n_categories and k % 7 == 0:
+                    percentages[0] = 0.5
+                chisquared_rows.append((varname, title, segment, np.array(categories, dtype=object), percentages))
+
+    seg_modes = pd.DataFrame(seg_modes_rows, columns=["q_code", "title", "mode", "proportion", "qtype"])
+    chisquared = pd.DataFrame(
+        chisquared_rows, columns=["q_code", "title", "segment", "sig_more_category", "category_percentages"]
+    )
+    return seg_modes, chisquared
+
+
+class SyntheticDataHandler(PythiaDataHandler):
+    def __init__(self, seg_modes, chisquared):
+        self.frames = {"segment_modes": seg_modes, "chisquared": chisquared}
+        super().__init__("benchmark_survey", "qudo_benchmark_segmentation", SEGMENT, "staging")
+
+    def _read_parquet(self, filepath):
+        return self.frames[filepath].copy()
+
+    def _load_seg_modes_data(self):
+        seg_modes_data = self._load_data("segment_modes")
+        proportions = (seg_modes_data["proportion"].round(2)).astype(str)
+        seg_modes_data[self.MODE] = seg_modes_data[self.MODE] + " (proportion of respondents: " + proportions + ")"
+        return seg_modes_data
+
+    def _load_chisquared_data(self):
+        return self._load_data("chisquared", segment_filter=True)
+
+
+class RowApplyDataHandler(SyntheticDataHandler):
+    """
+    The row-apply implementation of the pipeline, kept to check the vectorized one produces identical output.
+    """
+
+    def _load_data(self, filepath, segment_filter=False):
+        data = self._read_parquet(filepath)
+        data[self.Q_CODE] = data[self.Q_CODE].str.replace(self.REPLACE_PATTERN, "", regex=True)
+
+        if segment_filter:
+            data = data[data["segment"] == self.segment_name].copy()
+            self.category_percentages_col = (
+                self.WEIGHTED_CATEGORY_PERCENTAGES
+                if self.WEIGHTED_CATEGORY_PERCENTAGES in data.columns
+                else self.CATEGORY_PERCENTAGES
+            )
+            data[self.category_percentages_col] = data[self.category_percentages_col].apply(
+                lambda x: [round(i / 100, 2) for i in x]
+            )
+            data[self.category_percentages_col] = data.apply(
+                self._update_smc_percentage, args=(self.category_percentages_col,), axis=1
+            )
+        return data
+
+    def _prep_data(self, data, qtype):
+        data_grouped = data.groupby([self.Q_CODE, self.TITLE])[self.category_percentages_col].apply(list).reset_index()
+        data_grouped[self.category_percentages_col] = data_grouped[self.category_percentages_col].apply(
+            lambda x: [item for sublist in x for item in sublist]
+        )
+        return self.seg_modes_data[self.seg_modes_data["qtype"] == qtype][[self.Q_CODE, self.TITLE, self.MODE]].merge(
+            data_grouped[[self.Q_CODE, self.category_percentages_col, self.TITLE]],
+            how="outer",
+            on=[self.Q_CODE, self.TITLE],
+        )
+
+    def _prep_shortnames_seg_modes_chi_squared(self, varnames_to_shortname):
+        chisquared_data_shortnames = self.chisquared_data.loc[
+            self.chisquared_data["q_code"].isin(varnames_to_shortname)
+        ].copy()
+        chisquared_data_shortnames["shortname"] = chisquared_data_shortnames["q_code"].apply(convert_to_shortname)
+        replacement_dict = {"sbeh_us_insuranceownership_cb": "sbeh_us_insuranceintenders_cb"}
+        chisquared_data_shortnames["shortname"] = chisquared_data_shortnames["shortname"].replace(replacement_dict)
+        chisquared_data_shortnames = (
+            chisquared_data_shortnames.groupby(["shortname", "title"])[self.category_percentages_col]
+            .apply(list)
+            .reset_index()
+        )
+        chisquared_data_shortnames[self.category_percentages_col] = chisquared_data_shortnames[
+            self.category_percentages_col
+        ].apply(lambda x: [item for sublist in x for item in sublist])
+        chisquared_data_shortnames.rename(columns={"shortname": "q_code"}, inplace=True)
+        return self.seg_modes_data.loc[self.seg_modes_data["qtype"] == "shortname", ["q_code", "title", "mode"]].merge(
+            chisquared_data_shortnames[["q_code", self.category_percentages_col, "title"]],
+            how="outer",
+            on=["q_code", "title"],
+        )
+
+    def _update_smc_percentage(self, row, cat_per_col):
+        return [
+            f'{row["sig_more_category"][i]} (proportion of respondents: {row[cat_per_col][i]})'
+            for i in range(len(row["sig_more_category"]))
+        ]
+
+    def generate_questions_answers_data(self):
+        varnames_seg_modes_chi_squared = self._prep_varnames_seg_modes_chi_squared()
+        varnames_to_shortname = set(
+            varnames_seg_modes_chi_squared[pd.isna(varnames_seg_modes_chi_squared["mode"])]["q_code"]
+        )
+        shortnames_seg_modes_chi_squared = self._prep_shortnames_seg_modes_chi_squared(varnames_to_shortname)
+        varnames_seg_modes_chi_squared.dropna(subset=["mode"], inplace=True)
+        final_seg_modes_chi_squared = pd.concat([shortnames_seg_modes_chi_squared, varnames_seg_modes_chi_squared])
+        final_seg_modes_chi_squared["title"] = final_seg_modes_chi_squared["title"].apply(
+            lambda x: str(x).replace("\xa0", "")
+        )
+        return final_seg_modes_chi_squared
+
+    def convert_to_questions_jsons(self, x):
+        significant_answers = ""
+        if isinstance(x.get(self.category_percentages_col), list):
+            significant_answers = "; ".join(x[self.category_percentages_col])
+        return {
+            "question_text": x.get("title", ""),
+            "modal_answer": x.get("mode", ""),
+            "significant_answers": significant_answers,
+        }
+
+    def build_questions_answers_df(self):
+        final_pop_modes_chi_squared = self.generate_questions_answers_data()
+        question_jsons = final_pop_modes_chi_squared.apply(self.convert_to_questions_jsons, axis=1)
+        questions_answers_df = pd.DataFrame(question_jsons.to_list())
+        questions_answers_df["text"] = questions_answers_df.apply(
+            lambda x: f"Survey Question: {x['question_text']}\nModal Answers: {x['modal_answer']}\nSignificant "
+            f"Answers: {x['significant_answers']}",
+            axis=1,
+        )
+        return questions_answers_df
+
+
+def run_pipeline(handler_class, seg_modes, chisquared):
+    start_time = time.perf_counter()
+    questions_answers_df = handler_class(seg_modes, chisquared).build_questions_answers_df()
+    return questions_answers_df, time.perf_counter() - start_time
+
+
+def check_edge_cases():
+    """
+    Checks the vectorized pipeline on the surveys leaving a step of the pipeline with an empty frame.
+    """
+    seg_modes, chisquared = generate_synthetic_survey(1_000)
+
+    # Every varname has a mode, no chi-squared rows are left to group by shortname
+    varname_modes = seg_modes[seg_modes["qtype"] == "varname"]
+    varname_chisquared = chisquared[chisquared["q_code"].isin(varname_modes["q_code"])]
+    expected, _ = run_pipeline(RowApplyDataHandler, varname_modes, varname_chisquared)
+    result, _ = run_pipeline(SyntheticDataHandler, varname_modes, varname_chisquared)
+    pd.testing.assert_frame_equal(result, expected)
+
+    # Empty segment, the row-apply pipeline fails on it: every question is kept without significant answers
+    result, _ = run_pipeline(SyntheticDataHandler, seg_modes, chisquared[chisquared["segment"] != SEGMENT])
+    assert len(result) == len(seg_modes)
+    assert (result["significant_answers"] == "").all()
+    print("edge cases: every varname has a mode, empty segment ok")
+
+
+def benchmark(sizes=(1_000, 10_000, 100_000)):
+    """
+    Runs the row-apply and the vectorized pipelines over synthetic surveys, checks they produce identical output and
+    prints the time taken by each.
+    """
+    print(f"{'rows':>8} {'row-apply (s)':>14} {'vectorized (s)':>15} {'speedup':>8}")
+    for n_rows in sizes:
+        seg_modes, chisquared = generate_synthetic_survey(n_rows)
+        expected, row_apply_time = run_pipeline(RowApplyDataHandler, seg_modes, chisquared)
+        result, vectorized_time = run_pipeline(SyntheticDataHandler, seg_modes, chisquared)
+        pd.testing.assert_frame_equal(result, expected)
+        print(
+            f"{len(chisquared):>8} {row_apply_time:>14.3f} {vectorized_time:>15.3f} "
+            f"{row_apply_time / vectorized_time:>7.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    check_edge_cases()
+    benchmark()
@@ -5,9 +5,11 @@ import concurrent.futures
 
 import boto3
 import botocore.exceptions
+import redis
 import s3fs
 
 from app.settings.config import app_config
+from app.utils.cache_utils.answer_cache_service import AnswerCacheService
 from app.utils.chatbot.langchain_utils import (
     MongoDBHandler,
     PythiaDataHandler,
@@ -21,6 +23,10 @@ config_class = app_config.get(env.lower(), app_config["staging"])
 
 config = config_class()
 
+answer_cache = AnswerCacheService(
+    redis_client=redis.Redis(host=config.REDIS_URL, port=config.REDIS_PORT, db=config.REDIS_DB)
+)
+
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 
@@ -61,7 +67,7 @@ def get_all_segments(s3_client, bucket):
         print(f"Failed to list objects or fetch details due to error: {e}")
 
 
-def process_segment(survey, segmentation_dict, config):
+def process_segment(survey, segmentation_dict, config, force=False):
     if segmentation_dict:
         for segmentation, segments in segmentation_dict.items():
             for segment in segments:
@@ -82,9 +88,15 @@ def process_segment(survey, segmentation_dict, config):
                     config.MONGO_GROUP_ID,
                     data_handler,
                 )
-                mongo_handler.generate_and_save_vectors()
+                sync_result = mongo_handler.sync_vectors(force=force)
+                print(f"{mongo_handler.collection_name}: {sync_result}")
+                if sync_result["added"] or sync_result["deleted"]:
+                    # The answers cached for the segment were generated from its previous data
+                    answer_cache.invalidate(
+                        answer_cache.make_segment_key(survey['surveyname'], segmentation, segment)
+                    )
 
-                create_index_response = mongo_handler.create_search_index()
+                create_index_response = mongo_handler.create_search_index(wait=True)
                 # print(create_index_response)
 
                 if isinstance(create_index_response, dict) and create_index_response.get("error", None) == 400:
@@ -95,11 +107,12 @@ def process_segment(survey, segmentation_dict, config):
 
 
 # could this be parallelised?
-def gen_all_vector_collections(s3_client, bucket, max_workers=10):
+def gen_all_vector_collections(s3_client, bucket, max_workers=10, force=False):
     """
-    The function `gen_all_vector_collections(s3_client, bucket)` generates and saves vectors
+    The function `gen_all_vector_collections(s3_client, bucket)` syncs the vectors
     for every segment in each segmentation from every survey data received
     from the `get_all_segments(s3_client, bucket)` function.
+    Segments whose source data has not changed since their last sync are skipped unless force is set.
     """
     survey_meta_deta_list = get_all_segments(s3_client, bucket)
 
@@ -107,7 +120,7 @@ def gen_all_vector_collections(s3_client, bucket, max_workers=10):
         futures = []
         for survey in survey_meta_deta_list:
             for segmentation_dict in survey['segmentations_data']:
-                futures.append(executor.submit(process_segment, survey, segmentation_dict, config))
+                futures.append(executor.submit(process_segment, survey, segmentation_dict, config, force))
 
         # Wait for all futures to complete
         concurrent.futures.wait(futures)
@@ -120,4 +133,4 @@ if __name__ == '__main__':
 
     bucket = 'qudo-datascience'
 
-    gen_all_vector_collections(s3_client, bucket)
+    gen_all_vector_collections(s3_client, bucket, force="--force" in sys.argv)
@@ -0,0 +1,279 @@
+import json
+
+import pytest
+
+from app.blueprints.messages.service import _stream_answer
+from app.utils.metrics import metrics
+
+
+def parse_events(events):
+    parsed = []
+    for event in events:
+        name, data = event.strip().split("\n")
+        parsed.append((name.removeprefix("event: "), json.loads(data.removeprefix("data: "))))
+    return parsed
+
+
+def test_stream_answer_saves_complete_answer():
+    metrics.reset()
+    answers = []
+
+    def complete(answer):
+        answers.append(answer)
+        return {"message": {"content": answer}}
+
+    events = parse_events(_stream_answer(iter(["Hello", " there"]), complete, "messages.test"))
+
+    assert events == [
+        ("token", {"token": "Hello"}),
+        ("token", {"token": " there"}),
+        ("done", {"message": {"content": "Hello there"}}),
+    ]
+    assert answers == ["Hello there"]
+    assert metrics.snapshot()["histograms"]["messages.test.time_to_first_token_ms"]["count"] == 1
+
+
+def test_stream_answer_reports_errors_without_saving():
+    def tokens():
+        yield "Hel"
+        raise RuntimeError("rate limited")
+
+    def complete(answer):
+        raise AssertionError("the answer should not be saved")
+
+    events = parse_events(_stream_answer(tokens(), complete, "messages.test"))
+
+    assert events[0] == ("token", {"token": "Hel"})
+    assert events[1] == ("error", {"message": "An unexpected error has occurred."})
+
+
+def test_queued_message_job_saves_answer(mocker):
+    from app.blueprints.messages import service
+    from app.blueprints.messages.tasks import generate_answer
+    from app.utils.cache_utils.message_job_service import MessageJobService
+    from tests.utils.cache_utils.test_message_job_service import FakeRedis
+
+    jobs = MessageJobService(redis_client=FakeRedis())
+    mocker.patch("app.flask_app.message_jobs", jobs)
+    data = {"history": []}
+    initialize_cache_data = mocker.patch.object(service, "_initialize_cache_data", return_value=data)
+    mocker.patch.object(service, "_get_cached_answer", return_value=(None, None))
+    mocker.patch.object(service, "_cache_answer")
+    mocker.patch.object(service, "_generate_chatbot_response", return_value="I am 42.")
+    create_answer_message = mocker.patch.object(service, "_create_answer_message")
+    mocker.patch.object(service, "serialize", return_value={"id": "m1", "content": "I am 42."})
+    mocker.patch.object(service, "serialize_gpt_prompt", return_value={"role": "assistant", "content": "I am 42."})
+    mocker.patch.object(service, "count_message_tokens", return_value=8)
+    update_chat_history = mocker.patch.object(service, "_update_chat_history")
+    jobs.create("m1", "u1", 7, "c1", "How old are you?")
+
+    generate_answer.apply(args=["m1"])
+
+    assert jobs.get("m1")["status"] == "done"
+    assert jobs.get("m1")["message"] == {"id": "m1", "content": "I am 42."}
+    assert jobs.get("m1")["cached"] is False
+    initialize_cache_data.assert_called_once_with("c1", sub=7)
+    create_answer_message.assert_called_once_with("c1", "I am 42.", message_id="m1")
+    update_chat_history.assert_called_once_with(
+        "c1",
+        data,
+        {"role": "user", "content": "How old are you?", "token_count": 8},
+        {"role": "assistant", "content": "I am 42."},
+        sub=7,
+    )
+
+
+def test_failed_message_job_records_error(mocker):
+    from app.blueprints.messages import service
+    from app.blueprints.messages.tasks import generate_answer
+    from app.utils.cache_utils.message_job_service import MessageJobService
+    from tests.utils.cache_utils.test_message_job_service import FakeRedis
+
+    jobs = MessageJobService(redis_client=FakeRedis())
+    mocker.patch("app.flask_app.message_jobs", jobs)
+    mocker.patch.object(service, "_initialize_cache_data", return_value={"history": []})
+    mocker.patch.object(service, "_get_cached_answer", return_value=(None, None))
+    mocker.patch.object(service, "_generate_chatbot_response", side_effect=RuntimeError("rate limited"))
+    create_answer_message = mocker.patch.object(service, "_create_answer_message")
+    jobs.create("m1", "u1", 7, "c1", "How old are you?")
+
+    generate_answer.apply(args=["m1"])
+
+    assert jobs.get("m1")["status"] == "failed"
+    assert jobs.get("m1")["error"] == "An unexpected error has occurred."
+    create_answer_message.assert_not_called()
+
+
+def test_message_jobs_of_other_users_are_not_waited_for(app, mocker):
+    from flask import g
+    from werkzeug.exceptions import NotFound
+
+    from app.blueprints.messages import service
+    from app.utils.cache_utils.message_job_service import MessageJobService
+    from tests.utils.cache_utils.test_message_job_service import FakeRedis
+
+    jobs = MessageJobService(redis_client=FakeRedis())
+    mocker.patch("app.flask_app.message_jobs", jobs)
+    wait = mocker.spy(jobs, "wait")
+    jobs.create("m1", "u1", 7, "c1", "How old are you?")
+
+    with app.test_request_context():
+        g.user = {"id": "u2"}
+        for message_id in ["m1", "missing"]:
+            with pytest.raises(NotFound):
+                service.fetch_message_job(message_id, wait=60)
+
+    wait.assert_not_called()
+
+
+class FakeMessage:
+    def __init__(self, role, content, created_at):
+        self.role = role
+        self.content = content
+        self.created_at = created_at
+
+    def __getitem__(self, field):
+        return getattr(self, field)
+
+
+class FakeQuerySet(list):
+    def order_by(self, field):
+        return FakeQuerySet(sorted(self, key=lambda message: message[field.lstrip("-")], reverse=field[0] == "-"))
+
+    def limit(self, count):
+        return FakeQuerySet(self[:count])
+
+
+def summarize_history_setup(app, mocker, completion):
+    from datetime import datetime
+
+    from app.blueprints.messages import service
+    from app.utils.chatbot.history_policy import HistoryPolicy
+    from tests.utils.cache_utils.test_message_cache_service import FakeRedis, make_cache
+
+    mocker.patch.dict(app.config, {"HISTORY_MAX_TURNS": 2})
+    redis_client = FakeRedis()
+    mocker.patch("app.flask_app.redis_db", redis_client)
+    cache = make_cache(redis_client)
+    cache.append_turn(
+        "c1", {"role": "user", "content": "Where do you live?"}, {"role": "assistant", "content": "Leeds."}, max_turns=6
+    )
+    cache.append_turn(
+        "c1", {"role": "user", "content": "Do you work?"}, {"role": "assistant", "content": "Yes."}, max_turns=6
+    )
+
+    contents = ["How old are you?", "42.", "Where do you live?", "Leeds.", "Do you work?", "Yes."]
+    messages = [
+        FakeMessage("user" if i % 2 == 0 else "assistant", content, datetime(2026, 1, 1, 0, 0, i))
+        for i, content in enumerate(contents)
+    ]
+    mocker.patch.object(service.Message, "objects", return_value=FakeQuerySet(messages))
+    conversation_objects = mocker.patch.object(service.Conversation, "objects")
+    conversation_objects.return_value.first.return_value.history_summary = None
+    conversation_objects.return_value.first.return_value.history_summarized_at = None
+    conversation_objects.return_value.update_one.return_value = 1
+    mocker.patch.object(HistoryPolicy, "_create_completion", **completion)
+    return cache, conversation_objects, redis_client
+
+
+def test_history_summary_drops_the_summarized_turns(app, mocker):
+    from datetime import datetime
+
+    from app.blueprints.messages import service
+
+    completion = {"return_value": {"choices": [{"message": {"content": "They are 42."}}]}}
+    cache, conversation_objects, redis_client = summarize_history_setup(app, mocker, completion)
+
+    with app.app_context():
+        service.process_history_summary("c1", "s1")
+        data = cache.get_data("c1")
+
+    conversation_objects.return_value.update_one.assert_called_once_with(
+        set__history_summary="They are 42.", set__history_summarized_at=datetime(2026, 1, 1, 0, 0, 1)
+    )
+    assert data["summary"] == "They are 42."
+    assert data["history"] == [("Where do you live?", "Leeds."), ("Do you work?", "Yes.")]
+    assert redis_client.strings == {}
+
+
+def test_failed_history_summary_keeps_the_turns(app, mocker):
+    from app.blueprints.messages import service
+
+    cache, conversation_objects, redis_client = summarize_history_setup(
+        app, mocker, {"side_effect": RuntimeError("down")}
+    )
+
+    with app.app_context():
+        service.process_history_summary("c1", "s1")
+        data = cache.get_data("c1")
+
+    conversation_objects.return_value.update_one.assert_not_called()
+    assert data["summary"] == ""
+    assert data["history"] == [("How old are you?", "42."), ("Where do you live?", "Leeds."), ("Do you work?", "Yes.")]
+    assert redis_client.strings == {}
+
+
+def test_chat_history_update_queues_the_summary_off_the_request_path(app, mocker):
+    from app.blueprints.messages import service
+
+    mocker.patch.dict(app.config, {"HISTORY_MAX_TURNS": 1, "HISTORY_SUMMARY_BATCH_TURNS": 1})
+    append_turn = mocker.patch.object(service.MessageCacheService, "append_turn")
+    delay = mocker.patch.object(service.summarize_history, "delay")
+    create_completion = mocker.patch.object(service.HistoryPolicy, "_create_completion")
+    data = {"messages": [], "history": [("How old are you?", "42.")], "summary": ""}
+    question = {"role": "user", "content": "Where do you live?"}
+    answer = {"role": "assistant", "content": "Leeds."}
+
+    with app.app_context():
+        service._update_chat_history("c1", data, question, answer, sub="s1")
+
+    append_turn.assert_called_once_with("c1", question, answer, max_turns=2)
+    delay.assert_called_once_with("c1", "s1")
+    create_completion.assert_not_called()
+
+
+def test_rebuilt_history_loads_the_last_cached_turns(app, mocker):
+    from datetime import datetime
+
+    from app.blueprints.messages import service
+    from app.utils.cache_utils.message_cache_service import MessageCacheService
+
+    mocker.patch.dict(app.config, {"HISTORY_MAX_TURNS": 1, "HISTORY_SUMMARY_BATCH_TURNS": 1})
+    contents = ["How old are you?", "42.", "Where do you live?", "Leeds.", "Do you work?", "Yes."]
+    messages = [
+        FakeMessage("user" if i % 2 == 0 else "assistant", content, datetime(2026, 1, 1, 0, 0, i))
+        for i, content in enumerate(contents)
+    ]
+    for message in messages:
+        message.is_visible = True
+        message.is_bot = message.role == "assistant"
+    fetch_messages = mocker.patch.object(
+        service,
+        "fetch_messages",
+        side_effect=lambda filters, order_by, limit=None: (
+            FakeQuerySet(messages).order_by(order_by).limit(limit or len(messages)) if filters["is_visible"] else []
+        ),
+    )
+
+    with app.app_context():
+        recent_messages = MessageCacheService.fetch_recent_messages("c1", datetime(2026, 1, 1))
+
+    assert [message.content for message in recent_messages] == contents[2:]
+    assert fetch_messages.call_args.kwargs == {"order_by": "-created_at", "limit": 4}
+    assert fetch_messages.call_args.args[0]["created_at__gt"] == datetime(2026, 1, 1)
+
+
+def test_summarized_conversations_do_not_use_the_answer_cache(app, mocker):
+    from app.blueprints.messages import service
+
+    mocker.patch.dict(app.config, {"ANSWER_CACHE_ENABLED": True})
+    answer_cache = mocker.patch("app.flask_app.answer_cache")
+    data = {"messages": [], "summary": "They are 42.", "survey": "survey", "segmentation": "age", "segment": "age_young"}
+
+    with app.app_context():
+        cached_answer = service._get_cached_answer(service.GPT_ANSWER_NAMESPACE, data, "Where do you live?", False)
+        service._cache_answer(service.GPT_ANSWER_NAMESPACE, data, "Where do you live?", "Leeds.", None, False)
+
+    assert cached_answer == (None, None)
+    answer_cache.get.assert_not_called()
+    answer_cache.set.assert_not_called()
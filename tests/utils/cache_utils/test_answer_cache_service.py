@@ -0,0 +1,52 @@
+from app.utils.cache_utils.answer_cache_service import AnswerCacheService
+
+
+class FakeRedis:
+    def __init__(self):
+        self.values = {}
+        self.hashes = {}
+
+    def get(self, key):
+        return self.values.get(key)
+
+    def set(self, key, value, timeout):
+        self.values[key] = value.encode("utf-8") if isinstance(value, str) else value
+
+    def incr(self, key):
+        self.values[key] = int(self.values.get(key, 0)) + 1
+        return self.values[key]
+
+    def hlen(self, key):
+        return len(self.hashes.get(key, {}))
+
+    def hset(self, key, field, value):
+        self.hashes.setdefault(key, {})[field.encode("utf-8")] = value
+
+    def hgetall(self, key):
+        return dict(self.hashes.get(key, {}))
+
+    def expire(self, key, timeout):
+        pass
+
+
+def test_exact_and_semantic_levels():
+    answer_cache = AnswerCacheService(similarity_threshold=0.95, redis_client=FakeRedis())
+    answer_cache.set("v2", "segment", "How old are you?", "I am 42.", embedding=[1.0, 0.0])
+
+    assert answer_cache.get("v2", "segment", "  how OLD are you ") == ("I am 42.", "exact")
+    assert answer_cache.get("v2", "segment", "What is your age?", embedding=[0.99, 0.05]) == ("I am 42.", "semantic")
+    assert answer_cache.get("v2", "segment", "Where do you live?", embedding=[0.0, 1.0]) == (None, None)
+    assert answer_cache.get("v1", "segment", "How old are you?") == (None, None)
+    assert answer_cache.stats()["hit_rate"] == 0.5
+
+
+def test_invalidate_drops_the_answers_of_the_segment():
+    redis_client = FakeRedis()
+    answer_cache = AnswerCacheService(redis_client=redis_client)
+    answer_cache.set("v2", "segment", "How old are you?", "I am 42.", embedding=[1.0, 0.0])
+    answer_cache.set("v2", "other", "How old are you?", "I am 24.", embedding=[1.0, 0.0])
+
+    assert answer_cache.invalidate("segment") == 1
+
+    assert answer_cache.get("v2", "segment", "How old are you?", embedding=[1.0, 0.0]) == (None, None)
+    assert answer_cache.get("v2", "other", "How old are you?") == ("I am 24.", "exact")
@@ -0,0 +1,117 @@
+import io
+
+import pandas as pd
+import pytest
+from botocore.response import StreamingBody
+from botocore.stub import ANY, Stubber
+
+from app.utils.cache_utils.artifact_cache import S3ArtifactCache
+
+URI = "s3://qudo-datascience/data-store/segment_modes.parquet"
+BUCKET_KEY = {"Bucket": "qudo-datascience", "Key": "data-store/segment_modes.parquet"}
+
+
+def parquet_body(frame):
+    buffer = io.BytesIO()
+    frame.to_parquet(buffer)
+    content = buffer.getvalue()
+    return StreamingBody(io.BytesIO(content), len(content))
+
+
+@pytest.fixture
+def frame():
+    return pd.DataFrame({"q_code": ["q1", "q2"], "mode": ["yes", "no"]})
+
+
+@pytest.fixture
+def cache(tmp_path):
+    import boto3
+
+    cache = S3ArtifactCache(cache_dir=str(tmp_path), revalidate_after=0)
+    cache._s3_client = boto3.client("s3", region_name="us-east-1")
+    return cache
+
+
+def test_downloads_once_and_revalidates_with_etag(cache, frame):
+    with Stubber(cache.s3_client) as stubber:
+        stubber.add_response("get_object", {"Body": parquet_body(frame), "ETag": '"v1"'}, BUCKET_KEY)
+        stubber.add_client_error(
+            "get_object", "304", http_status_code=304, expected_params={**BUCKET_KEY, "IfNoneMatch": '"v1"'}
+        )
+
+        first = cache.read_parquet(URI)
+        second = cache.read_parquet(URI)
+        stubber.assert_no_pending_responses()
+
+    pd.testing.assert_frame_equal(first, frame)
+    pd.testing.assert_frame_equal(second, frame)
+    assert cache.stats()["downloads"] == 1
+    assert cache.stats()["revalidations"] == 1
+
+
+def test_reads_disk_copy_after_restart(cache, frame, tmp_path):
+    with Stubber(cache.s3_client) as stubber:
+        stubber.add_response("get_object", {"Body": parquet_body(frame), "ETag": '"v1"'}, BUCKET_KEY)
+        cache.read_parquet(URI)
+
+    restarted = S3ArtifactCache(cache_dir=str(tmp_path))
+    restarted._s3_client = cache.s3_client
+    with Stubber(restarted.s3_client) as stubber:
+        stubber.add_client_error(
+            "get_object", "304", http_status_code=304, expected_params={**BUCKET_KEY, "IfNoneMatch": '"v1"'}
+        )
+        pd.testing.assert_frame_equal(restarted.read_parquet(URI), frame)
+
+    assert restarted.stats()["downloads"] == 0
+
+
+def test_returns_copies(cache, frame):
+    with Stubber(cache.s3_client) as stubber:
+        stubber.add_response("get_object", {"Body": parquet_body(frame), "ETag": '"v1"'}, BUCKET_KEY)
+        cache.revalidate_after = 300
+        cache.read_parquet(URI)["mode"] = "changed"
+
+        pd.testing.assert_frame_equal(cache.read_parquet(URI), frame)
+
+
+def test_missing_object(cache):
+    with Stubber(cache.s3_client) as stubber:
+        stubber.add_client_error("get_object", "NoSuchKey", http_status_code=404, expected_params=BUCKET_KEY)
+
+        assert not cache.exists(URI)
+
+
+def test_derived_values_are_rebuilt_when_an_artifact_changes(cache, mocker):
+    etags = {URI: '"v1"'}
+    mocker.patch.object(cache, "get_etag", side_effect=lambda uri: etags[uri])
+    build = mocker.Mock(side_effect=["first", "second"])
+
+    assert cache.get_derived("matrix", [URI], build) == "first"
+    assert cache.get_derived("matrix", [URI], build) == "first"
+    etags[URI] = '"v2"'
+    assert cache.get_derived("matrix", [URI], build) == "second"
+
+    assert build.call_count == 2
+
+
+def test_written_artifacts_are_served_without_download(cache, frame):
+    cache.revalidate_after = 300
+    with Stubber(cache.s3_client) as stubber:
+        stubber.add_response("put_object", {"ETag": '"v1"'}, {**BUCKET_KEY, "Body": ANY})
+
+        cache.write_parquet(URI, frame)
+        stubber.assert_no_pending_responses()
+
+    pd.testing.assert_frame_equal(cache.read_parquet(URI), frame)
+    assert cache.get_etag(URI) == '"v1"'
+    assert cache.stats()["downloads"] == 0
+
+
+def test_locks_do_not_grow_with_the_artifacts_read(cache):
+    locks = list(cache._locks)
+    with Stubber(cache.s3_client) as stubber:
+        for i in range(100):
+            stubber.add_client_error("get_object", "NoSuchKey", http_status_code=404)
+            assert not cache.exists(f"s3://qudo-datascience/data-store/missing_{i}.parquet")
+
+    assert cache._locks == locks
@@ -0,0 +1,57 @@
+from redis import ConnectionError as RedisConnectionError
+
+from app.utils.cache_utils.embedding_cache_service import EmbeddingCacheService
+from app.utils.chatbot.langchain_utils.embeddings import CachedEmbeddings
+
+
+class FakeRedis:
+    def __init__(self):
+        self.values = {}
+        self.error = None
+
+    def get(self, key):
+        if self.error:
+            raise self.error
+        return self.values.get(key)
+
+    def set(self, key, value, timeout):
+        if self.error:
+            raise self.error
+        self.values[key] = value
+
+
+class CountingEmbeddings:
+    def __init__(self):
+        self.calls = 0
+
+    def embed_query(self, text):
+        self.calls += 1
+        return [0.25, -0.5, float(len(text))]
+
+
+def test_embeddings_are_shared_through_redis_as_float_bytes():
+    redis_client = FakeRedis()
+    EmbeddingCacheService(redis_client=redis_client).set("ada", "How  are you?", [0.25, -0.5, 1.0])
+
+    embedding_cache = EmbeddingCacheService(redis_client=redis_client)
+
+    assert list(redis_client.values.values()) == [b"\x00\x00\x80>\x00\x00\x00\xbf\x00\x00\x80?"]
+    assert embedding_cache.get("ada", " How are\nyou? ") == [0.25, -0.5, 1.0]
+    assert embedding_cache.get("ada", "How are you?") == [0.25, -0.5, 1.0]
+    assert embedding_cache.get("babbage", "How are you?") is None
+    assert embedding_cache.stats()["redis_hits"] == 1
+    assert embedding_cache.stats()["hits"] == 1
+
+
+def test_redis_errors_are_treated_as_misses():
+    redis_client = FakeRedis()
+    redis_client.error = RedisConnectionError("down")
+    embeddings = CountingEmbeddings()
+    embedding_cache = EmbeddingCacheService(redis_client=redis_client)
+
+    cached_embeddings = CachedEmbeddings(embeddings, embedding_cache, "ada")
+    cached_embeddings.embed_query("hello")
+    cached_embeddings.embed_query("hello")
+
+    assert embeddings.calls == 1
+    assert embedding_cache.stats()["redis_errors"] == 2
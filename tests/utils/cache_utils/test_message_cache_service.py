@@ -0,0 +1,185 @@
+from app.utils.cache_utils.message_cache_service import APPLY_SUMMARY_SCRIPT, MessageCacheService
+
+
+class FakePipeline:
+    def __init__(self, redis_client):
+        self.redis_client = redis_client
+        self.commands = []
+
+    def __getattr__(self, name):
+        def command(*args, **kwargs):
+            self.commands.append((getattr(self.redis_client, name), args, kwargs))
+
+        return command
+
+    def execute(self):
+        return [command(*args, **kwargs) for command, args, kwargs in self.commands]
+
+
+class FakeRedis:
+    def __init__(self):
+        self.strings = {}
+        self.hashes = {}
+        self.lists = {}
+        self.sets = {}
+
+    def pipeline(self, transaction=True):
+        return FakePipeline(self)
+
+    def delete(self, *keys):
+        deleted = 0
+        for key in keys:
+            key = key.decode("utf-8") if isinstance(key, bytes) else key
+            for values in (self.strings, self.hashes, self.lists, self.sets):
+                deleted += values.pop(key, None) is not None
+        return deleted
+
+    def set(self, key, value, nx=False, ex=None):
+        if nx and key in self.strings:
+            return None
+        self.strings[key] = str(value).encode("utf-8")
+        return True
+
+    def sadd(self, key, *members):
+        self.sets.setdefault(key, set()).update(member.encode("utf-8") for member in members)
+
+    def srem(self, key, *members):
+        self.sets[key] -= {member.encode("utf-8") if isinstance(member, str) else member for member in members}
+
+    def smembers(self, key):
+        return set(self.sets.get(key, set()))
+
+    def hset(self, key, field=None, value=None, mapping=None):
+        values = self.hashes.setdefault(key, {})
+        for field, value in (mapping or {field: value}).items():
+            values[field.encode("utf-8")] = str(value).encode("utf-8")
+
+    def hgetall(self, key):
+        return dict(self.hashes.get(key, {}))
+
+    def rpush(self, key, *values):
+        self.lists.setdefault(key, []).extend(value.encode("utf-8") for value in values)
+
+    def ltrim(self, key, start, end):
+        self.lists[key] = self.lists.get(key, [])[start : None if end == -1 else end + 1]
+
+    def lrange(self, key, start, end):
+        return list(self.lists.get(key, []))
+
+    def expire(self, key, timeout):
+        pass
+
+    def register_script(self, script):
+        assert script == APPLY_SUMMARY_SCRIPT
+
+        def apply_summary(keys, args):
+            meta_key, turns_key = keys
+            previous_summarized_at, summarized_at, summary, entries, kept_entries = args
+            meta = self.hashes.get(meta_key)
+            if not meta or meta.get(b"summarized_at", b"").decode("utf-8") != previous_summarized_at:
+                return 0
+            self.hset(meta_key, mapping={"summary": summary, "summarized_at": summarized_at})
+            self.ltrim(turns_key, min(entries, max(len(self.lists.get(turns_key, [])) - kept_entries, 0)), -1)
+            return 1
+
+        return apply_summary
+
+
+def message(role, content):
+    return {"role": role, "content": content, "token_count": len(content.split())}
+
+
+def make_cache(redis_client):
+    cache = MessageCacheService(sub="s1", redis_client=redis_client)
+    data = {"segmentation": "age", "segment": "age_young", "survey": "survey", "seg_description": "Young people"}
+    base_messages = [message("system", "You are personaGPT")]
+    cache.set_data("c1", data, base_messages, [message("user", "How old are you?"), message("assistant", "42.")])
+    return cache
+
+
+def test_turns_are_appended_until_they_are_summarized():
+    redis_client = FakeRedis()
+    cache = make_cache(redis_client)
+
+    cache.append_turn("c1", message("user", "Where do you live?"), message("assistant", "Leeds."), max_turns=10)
+    cache.append_turn("c1", message("user", "Do you work?"), message("assistant", "Yes."), max_turns=10)
+    data = cache.get_data("c1")
+
+    assert data["segment"] == "age_young"
+    assert data["summary"] == ""
+    assert data["messages"][0] == message("system", "You are personaGPT")
+    assert data["history"] == [("How old are you?", "42."), ("Where do you live?", "Leeds."), ("Do you work?", "Yes.")]
+
+    assert cache.apply_summary("c1", "They are 42.", "2026-01-01T00:00:01", None, 1, 2)
+    data = cache.get_data("c1")
+
+    assert data["summary"] == "They are 42."
+    assert data["summarized_at"] == "2026-01-01T00:00:01"
+    assert data["history"] == [("Where do you live?", "Leeds."), ("Do you work?", "Yes.")]
+    assert [turn_message["content"] for turn_message in data["messages"][1:]] == [
+        "Where do you live?",
+        "Leeds.",
+        "Do you work?",
+        "Yes.",
+    ]
+
+
+def test_summaries_of_other_turns_are_not_applied():
+    redis_client = FakeRedis()
+    cache = make_cache(redis_client)
+
+    assert not cache.apply_summary("c1", "They are 42.", "2026-01-01T00:00:02", "2026-01-01T00:00:01", 1, 0)
+    cache.invalidate_conversation("c1")
+    assert not cache.apply_summary("c1", "They are 42.", "2026-01-01T00:00:01", None, 1, 0)
+
+    assert redis_client.hashes == {}
+
+
+def test_partial_conversations_are_reloaded(mocker):
+    redis_client = FakeRedis()
+    cache = make_cache(redis_client)
+    cache.invalidate_conversation("c1")
+    cache.append_turn("c1", message("user", "Where do you live?"), message("assistant", "Leeds."), max_turns=10)
+    redis_client.hset("token_sub__s1__c1__meta", "summary", "They are 42.")
+    load_data = mocker.patch.object(cache, "_load_data", return_value={"segment": "age_young"})
+
+    assert cache.get_data("c1") == {"segment": "age_young"}
+    load_data.assert_called_once_with("c1")
+
+
+def test_summaries_keep_the_last_turns_once_the_oldest_are_trimmed():
+    redis_client = FakeRedis()
+    cache = make_cache(redis_client)
+
+    cache.append_turn("c1", message("user", "Where do you live?"), message("assistant", "Leeds."), max_turns=2)
+    cache.append_turn("c1", message("user", "Do you work?"), message("assistant", "Yes."), max_turns=2)
+    assert cache.apply_summary("c1", "They are 42 and live in Leeds.", "2026-01-01T00:00:03", None, 2, 1)
+
+    assert cache.get_data("c1")["history"] == [("Do you work?", "Yes.")]
+
+
+def test_turns_are_trimmed_without_summary():
+    redis_client = FakeRedis()
+    cache = make_cache(redis_client)
+
+    cache.append_turn("c1", message("user", "Where do you live?"), message("assistant", "Leeds."), max_turns=1)
+
+    assert cache.get_data("c1")["history"] == [("Where do you live?", "Leeds.")]
+
+
+def test_invalidate_cache_drops_all_conversations_of_the_subject(app):
+    redis_client = FakeRedis()
+    cache = MessageCacheService(sub="s1", redis_client=redis_client)
+    other_cache = MessageCacheService(sub="s2", redis_client=redis_client)
+    data = {"segmentation": "age", "segment": "age_young", "survey": "survey"}
+    for conversation_id in ("c1", "c2"):
+        cache.set_data(conversation_id, data, [], [message("user", "How old are you?"), message("assistant", "42.")])
+    other_cache.set_data("c3", data, [], [])
+
+    cache.invalidate_conversation("c2")
+    assert "token_sub__s1__c2__meta" not in redis_client.hashes
+    assert cache.invalidate_cache() == 2
+
+    assert redis_client.sets["token_sub__s1__index"] == set()
+    assert list(redis_client.hashes) == ["token_sub__s2__c3__meta"]
+    assert cache.invalidate_cache() == 0
@@ -0,0 +1,80 @@
+import redis
+
+from app.utils.cache_utils.message_job_service import MessageJobService
+
+
+class FakePubSub:
+    def __init__(self, redis_client):
+        self.redis_client = redis_client
+        self.messages = []
+
+    def subscribe(self, channel):
+        self.redis_client.subscribers.setdefault(channel, []).append(self)
+
+    def get_message(self, timeout):
+        return self.messages.pop(0) if self.messages else None
+
+    def close(self):
+        for subscribers in self.redis_client.subscribers.values():
+            if self in subscribers:
+                subscribers.remove(self)
+
+
+class BusyPubSub(FakePubSub):
+    def subscribe(self, channel):
+        raise redis.exceptions.ConnectionError("No connection available.")
+
+
+class FakeRedis:
+    def __init__(self):
+        self.values = {}
+        self.subscribers = {}
+
+    def get(self, key):
+        return self.values.get(key)
+
+    def set(self, key, value, timeout):
+        self.values[key] = value
+
+    def publish(self, channel, message):
+        for pubsub in self.subscribers.get(channel, []):
+            pubsub.messages.append({"type": "message", "channel": channel, "data": message})
+
+    def pubsub(self, ignore_subscribe_messages=False):
+        return FakePubSub(self)
+
+
+def test_job_status_changes_are_stored_and_published():
+    redis_client = FakeRedis()
+    jobs = MessageJobService(redis_client=redis_client, pubsub_client=redis_client)
+    jobs.create("m1", "u1", 7, "c1", "How old are you?")
+    pubsub = redis_client.pubsub()
+    pubsub.subscribe(jobs.make_key("m1"))
+
+    jobs.update("m1", MessageJobService.RUNNING)
+    jobs.update("m1", MessageJobService.DONE, message={"content": "I am 42."})
+
+    job = jobs.get("m1")
+    assert job["status"] == "done"
+    assert job["message"] == {"content": "I am 42."}
+    assert [message["data"] for message in pubsub.messages] == ["running", "done"]
+
+
+def test_wait_returns_unfinished_job_after_timeout():
+    redis_client = FakeRedis()
+    jobs = MessageJobService(redis_client=redis_client, pubsub_client=redis_client)
+    jobs.create("m1", "u1", 7, "c1", "How old are you?")
+
+    assert jobs.wait("m1", timeout=0)["status"] == "pending"
+    assert jobs.wait("missing", timeout=0) is None
+    assert jobs.update("missing", MessageJobService.DONE) is None
+
+
+def test_wait_returns_job_when_no_subscription_is_available():
+    redis_client = FakeRedis()
+    pubsub_client = FakeRedis()
+    pubsub_client.pubsub = lambda ignore_subscribe_messages=False: BusyPubSub(pubsub_client)
+    jobs = MessageJobService(redis_client=redis_client, pubsub_client=pubsub_client)
+    jobs.create("m1", "u1", 7, "c1", "How old are you?")
+
+    assert jobs.wait("m1", timeout=60)["status"] == "pending"
@@ -0,0 +1,112 @@
+import pytest
+import requests
+
+from app.utils.atlas_api_utils import AtlasSearchUtils, SearchIndexNotReadyError
+from app.utils.cache_utils.search_index_cache import SearchIndexStatusCache
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class FakeAtlasClient:
+    is_index_queryable = staticmethod(AtlasSearchUtils.is_index_queryable)
+
+    def __init__(self, indexes):
+        self.indexes = indexes
+        self.calls = 0
+        self.error = None
+
+    def list_search_indexes(self):
+        self.calls += 1
+        if self.error:
+            raise self.error
+        return self.indexes
+
+
+def make_index(collection_name, status):
+    return {"database": "db", "collectionName": collection_name, "name": "default", "status": status}
+
+
+def test_statuses_are_listed_once_for_all_collections():
+    atlas_client = FakeAtlasClient([make_index("a", "STEADY"), make_index("b", "IN_PROGRESS")])
+    index_cache = SearchIndexStatusCache(atlas_client)
+
+    assert index_cache.get_status("db", "a", "default") == SearchIndexStatusCache.READY
+    assert index_cache.get_status("db", "b", "default") == SearchIndexStatusCache.BUILDING
+    assert index_cache.get_status("db", "c", "default") == SearchIndexStatusCache.MISSING
+    assert atlas_client.calls == 1
+
+
+def test_stale_statuses_are_served_while_refreshing(mocker):
+    clock = FakeClock()
+    atlas_client = FakeAtlasClient([make_index("a", "STEADY")])
+    index_cache = SearchIndexStatusCache(atlas_client, ttl=60, clock=clock)
+    index_cache.get_status("db", "a", "default")
+    refresh = mocker.patch.object(index_cache, "_refresh_in_background")
+
+    clock.now = 30
+    index_cache.get_status("db", "a", "default")
+    assert not refresh.called
+
+    clock.now = 61
+    assert index_cache.get_status("db", "a", "default") == SearchIndexStatusCache.READY
+    assert refresh.called
+
+
+def test_created_index_stays_building_until_listed():
+    atlas_client = FakeAtlasClient([])
+    index_cache = SearchIndexStatusCache(atlas_client)
+    index_cache.set_status("db", "a", "default", SearchIndexStatusCache.BUILDING)
+    index_cache.refresh()
+    assert index_cache.get_status("db", "a", "default") == SearchIndexStatusCache.BUILDING
+
+    atlas_client.indexes = [make_index("a", "READY")]
+    index_cache.refresh()
+    assert index_cache.get_status("db", "a", "default") == SearchIndexStatusCache.READY
+
+
+def test_wait_until_queryable_times_out():
+    clock = FakeClock()
+    atlas_client = FakeAtlasClient([make_index("a", "IN_PROGRESS")])
+    index_cache = SearchIndexStatusCache(atlas_client, poll_interval=0, poll_timeout=10, clock=clock)
+
+    def list_search_indexes():
+        clock.now += 4
+        return atlas_client.indexes
+
+    atlas_client.list_search_indexes = list_search_indexes
+    with pytest.raises(SearchIndexNotReadyError):
+        index_cache.wait_until_queryable("db", "a", "default")
+
+
+def test_unreachable_api_reports_unknown_status():
+    atlas_client = FakeAtlasClient([])
+    atlas_client.error = requests.ConnectionError("unreachable")
+    index_cache = SearchIndexStatusCache(atlas_client)
+
+    assert index_cache.get_status("db", "a", "default") == SearchIndexStatusCache.UNKNOWN
+    assert index_cache.get_status("db", "a", "default") == SearchIndexStatusCache.UNKNOWN
+    assert atlas_client.calls == 1
+
+
+def test_atlas_client_uses_the_settings_of_the_app_config(app, mocker):
+    from app.utils import http_client
+    from app.utils.cache_utils import search_index_cache
+
+    mocker.patch.dict(http_client._clients, clear=True)
+    mocker.patch.dict(search_index_cache._caches, clear=True)
+    mocker.patch.dict(app.config, {"ATLAS_ADMIN_API_CONNECT_TIMEOUT": 1, "HTTP_CIRCUIT_FAILURE_THRESHOLD": 2})
+
+    settings = AtlasSearchUtils.settings_from_config(app.config)
+    atlas_client = search_index_cache.get_search_index_cache(
+        "key", "secret", "group", "cluster", **settings
+    ).atlas_client
+
+    assert atlas_client.http_client.timeout == (1, 10)
+    assert atlas_client.http_client.breaker.failure_threshold == 2
+    assert atlas_client._timeouts() == (1, 10)
@@ -0,0 +1,80 @@
+import pytest
+
+from app.utils.cache_utils import user_cache_service
+from app.utils.cache_utils.user_cache_service import UserCacheService, get_user, get_users
+from app.utils.redis_util import RedisUtil
+
+
+@pytest.fixture
+def redis_values(app, mocker):
+    values = {}
+    mocker.patch.object(RedisUtil, "get_many", side_effect=lambda keys: [values.get(key) for key in keys])
+    mocker.patch.object(
+        RedisUtil,
+        "set_many",
+        side_effect=lambda mapping, timeout: values.update({key: data.encode() for key, data in mapping.items()}),
+    )
+    UserCacheService.local_cache.clear()
+    with app.app_context():
+        yield values
+    UserCacheService.local_cache.clear()
+
+
+def test_users_are_served_from_the_local_cache(redis_values, mocker):
+    user = {"id": "u1", "first_name": "Ann", "last_name": "Lee"}
+    get_user_data = mocker.patch.object(user_cache_service.AuthService, "get_user_data_by_id", return_value=user)
+
+    assert get_user("u1")["name"] == "Ann Lee"
+    assert get_user("u1")["name"] == "Ann Lee"
+
+    get_user_data.assert_called_once_with("u1")
+    assert "name" not in UserCacheService("u1").local_cache.get("user__u1")
+
+    UserCacheService.local_cache.clear()
+    assert get_user("u1")["name"] == "Ann Lee"
+    get_user_data.assert_called_once()
+
+
+def test_unknown_users_are_cached_as_missing(redis_values, mocker):
+    get_user_data = mocker.patch.object(user_cache_service.AuthService, "get_user_data_by_id", return_value=None)
+
+    for _ in range(2):
+        with pytest.raises(Exception, match="Could not find user"):
+            get_user("u2")
+        UserCacheService.local_cache.clear()
+
+    get_user_data.assert_called_once_with("u2")
+    assert redis_values["user__u2"] == b"null"
+
+
+def test_users_are_fetched_in_bulk(redis_values, mocker):
+    redis_values["user__u1"] = b'{"id": "u1", "first_name": "Ann", "last_name": "Lee"}'
+    get_many = RedisUtil.get_many
+    get_user_data = mocker.patch.object(
+        user_cache_service.AuthService,
+        "get_user_data_by_id",
+        side_effect=lambda user_id: {"id": user_id, "first_name": "Bob", "last_name": "Ray"}
+        if user_id == "u2"
+        else None,
+    )
+
+    users = get_users(["u1", "u2", "u1", "u3"])
+
+    assert {user_id: user["name"] for user_id, user in users.items()} == {"u1": "Ann Lee", "u2": "Bob Ray"}
+    get_many.assert_called_once_with(["user__u1", "user__u2", "user__u3"])
+    assert sorted(call.args[0] for call in get_user_data.call_args_list) == ["u2", "u3"]
+    assert redis_values["user__u3"] == b"null"
+
+
+def test_stale_users_are_served_when_the_auth_service_fails(redis_values, mocker):
+    user = {"id": "u4", "first_name": "Eve", "last_name": "Kim"}
+    get_user_data = mocker.patch.object(user_cache_service.AuthService, "get_user_data_by_id", return_value=user)
+    assert get_user("u4")["name"] == "Eve Kim"
+
+    del redis_values["user__u4"]
+    UserCacheService.local_cache.clear()
+    get_user_data.side_effect = ConnectionError("The auth service is down")
+
+    assert get_user("u4")["name"] == "Eve Kim"
+    assert get_users(["u5"]) == {}
+    assert "user__u4" not in redis_values
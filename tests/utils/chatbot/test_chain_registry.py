@@ -0,0 +1,93 @@
+import threading
+
+import pytest
+
+from app.utils.cache_utils.local_cache import LocalCache
+from app.utils.chatbot.chain_registry import ChainRegistry
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_local_cache_evicts_least_recently_used():
+    cache = LocalCache(max_size=2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    assert cache.stats()["evictions"] == 1
+
+
+def test_local_cache_expires_entries():
+    clock = FakeClock()
+    cache = LocalCache(max_size=2, ttl=10, clock=clock)
+    cache.set("a", 1)
+    clock.now = 11
+
+    assert cache.get("a") is None
+    assert cache.stats()["expirations"] == 1
+
+
+def test_registry_reuses_built_chain():
+    registry = ChainRegistry(max_size=2, ttl=60)
+    key = ChainRegistry.make_key("survey", "segmentation", "segment", "gpt-4")
+    builds = []
+
+    def build_chain():
+        builds.append(key)
+        return object()
+
+    first = registry.get_or_build(key, build_chain)
+    second = registry.get_or_build(key, build_chain)
+
+    assert first is second
+    assert len(builds) == 1
+    assert registry.stats()["hits"] == 1
+    assert registry.stats()["misses"] == 1
+
+
+def test_registry_builds_once_for_concurrent_misses():
+    registry = ChainRegistry(max_size=2, ttl=60)
+    key = ChainRegistry.make_key("survey", "segmentation", "segment", "gpt-4")
+    release = threading.Event()
+    builds = []
+
+    def build_chain():
+        builds.append(key)
+        release.wait(5)
+        return object()
+
+    results = []
+    threads = [
+        threading.Thread(target=lambda: results.append(registry.get_or_build(key, build_chain))) for _ in range(5)
+    ]
+    for thread in threads:
+        thread.start()
+    release.set()
+    for thread in threads:
+        thread.join()
+
+    assert len(builds) == 1
+    assert len(set(map(id, results))) == 1
+
+
+def test_registry_does_not_cache_failed_builds():
+    registry = ChainRegistry(max_size=2, ttl=60)
+    key = ChainRegistry.make_key("survey", "segmentation", "segment", "gpt-4")
+
+    def build_chain():
+        raise RuntimeError("index is not ready")
+
+    with pytest.raises(RuntimeError):
+        registry.get_or_build(key, build_chain)
+
+    assert registry.get_or_build(key, object) is not None
+    assert registry.stats()["build_failures"] == 1
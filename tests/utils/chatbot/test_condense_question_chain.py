@@ -0,0 +1,29 @@
+from langchain.llms.fake import FakeListLLM
+from langchain.prompts import PromptTemplate
+
+from app.utils.cache_utils.condensed_question_cache_service import CondensedQuestionCacheService
+from app.utils.chatbot.langchain_utils.condense_question_chain import CachedCondenseQuestionChain
+from tests.utils.cache_utils.test_embedding_cache_service import FakeRedis
+
+PROMPT = PromptTemplate.from_template("Chat History:\n{chat_history}\nFollow Up Input: {question}\nStandalone question:")
+
+
+def test_repeated_condense_step_is_served_from_cache():
+    llm = FakeListLLM(responses=["How old are you?", "Where do you live?"])
+    cache = CondensedQuestionCacheService(redis_client=FakeRedis())
+    chain = CachedCondenseQuestionChain(llm=llm, prompt=PROMPT, cache=cache, cache_namespace="segment")
+
+    first = chain.run(question="And you?", chat_history="Human: I am 42.")
+    resent = chain.run(question="And  you?", chat_history="Human: I am 42.")
+    other_history = chain.run(question="And you?", chat_history="Human: I live in Leeds.")
+
+    assert (first, resent, other_history) == ("How old are you?", "How old are you?", "Where do you live?")
+    assert cache.stats()["hits"] == 1
+    assert cache.stats()["misses"] == 2
+    assert cache.stats()["latency_saved_ms"] >= 0
+
+
+def test_chain_without_cache_calls_the_llm():
+    chain = CachedCondenseQuestionChain(llm=FakeListLLM(responses=["How old are you?"]), prompt=PROMPT)
+
+    assert chain.run(question="And you?", chat_history="Human: I am 42.") == "How old are you?"
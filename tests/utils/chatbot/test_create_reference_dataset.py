@@ -0,0 +1,72 @@
+import ast
+
+import pytest
+
+from app.utils.chatbot.gpt_utils import create_reference_dataset
+from app.utils.chatbot.gpt_utils.create_reference_dataset import rewrite_questions, rewrite_questions_chunk
+
+CHUNKS = [[("q1", "Age?"), ("q2", "Income?")], [("q3", "Gender?")], [("q4", "Region?")]]
+
+
+@pytest.fixture(autouse=True)
+def no_retry_sleep(mocker):
+    mocker.patch.object(rewrite_questions_chunk.retry, "sleep")
+
+
+def fake_chat_completion_create(requests, bad_chunks=()):
+    def create(model, messages):
+        sublist = ast.literal_eval(messages[1]["content"])
+        requests.append(sublist)
+        if sublist in bad_chunks:
+            content = "Sure! Here are the questions:"
+        else:
+            content = str([(shortname, title, f"What is your {title[:-1].lower()}?") for shortname, title in sublist])
+        return {
+            "choices": [{"message": {"content": content}}],
+            "usage": {"prompt_tokens": 10 * len(sublist), "completion_tokens": 5 * len(sublist)},
+        }
+
+    return create
+
+
+def test_rewrite_questions_keeps_chunk_order(mocker, tmp_path, capsys):
+    requests = []
+    mocker.patch.object(create_reference_dataset.openai.ChatCompletion, "create", fake_chat_completion_create(requests))
+
+    dfs = rewrite_questions(CHUNKS, checkpoint_dir=str(tmp_path), max_workers=3)
+
+    assert [df["shortname"].tolist() for df in dfs] == [["q1", "q2"], ["q3"], ["q4"]]
+    assert dfs[0]["better_question"].tolist() == ["What is your age?", "What is your income?"]
+    assert "40 prompt tokens, 20 completion tokens" in capsys.readouterr().out
+
+
+def test_rerun_resumes_from_checkpoints(mocker, tmp_path):
+    requests = []
+    mocker.patch.object(
+        create_reference_dataset.openai.ChatCompletion,
+        "create",
+        fake_chat_completion_create(requests, bad_chunks=[CHUNKS[1]]),
+    )
+
+    with pytest.raises(RuntimeError, match=r"Chunks \[1\] failed"):
+        rewrite_questions(CHUNKS, checkpoint_dir=str(tmp_path))
+    assert requests.count(CHUNKS[1]) == 3
+
+    requests.clear()
+    mocker.patch.object(create_reference_dataset.openai.ChatCompletion, "create", fake_chat_completion_create(requests))
+
+    dfs = rewrite_questions(CHUNKS, checkpoint_dir=str(tmp_path))
+
+    assert requests == [CHUNKS[1]]
+    assert dfs[2]["better_question"].tolist() == ["What is your region?"]
+
+
+def test_rewrite_questions_without_checkpoints(mocker, tmp_path, monkeypatch):
+    requests = []
+    mocker.patch.object(create_reference_dataset.openai.ChatCompletion, "create", fake_chat_completion_create(requests))
+    monkeypatch.chdir(tmp_path)
+
+    dfs = rewrite_questions(CHUNKS)
+
+    assert [df["shortname"].tolist() for df in dfs] == [["q1", "q2"], ["q3"], ["q4"]]
+    assert list(tmp_path.iterdir()) == []
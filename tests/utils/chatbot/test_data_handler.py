@@ -0,0 +1,104 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from app.utils.chatbot.helper_utils.data_utils import concat_lists_by_group, convert_to_shortnames
+from app.utils.chatbot.langchain_utils.data_handler import PythiaDataHandler
+
+
+class InMemoryDataHandler(PythiaDataHandler):
+    def __init__(self, seg_modes, chisquared):
+        self.frames = {"segment_modes": seg_modes, "chisquared": chisquared}
+        super().__init__("survey", "segmentation", "Savers", "staging")
+
+    def _read_parquet(self, filepath):
+        return self.frames[filepath].copy()
+
+    def _load_seg_modes_data(self):
+        seg_modes_data = self._load_data("segment_modes")
+        proportions = (seg_modes_data["proportion"].round(2)).astype(str)
+        seg_modes_data[self.MODE] = seg_modes_data[self.MODE] + " (proportion of respondents: " + proportions + ")"
+        return seg_modes_data
+
+    def _load_chisquared_data(self):
+        return self._load_data("chisquared", segment_filter=True)
+
+
+def make_handler():
+    seg_modes = pd.DataFrame(
+        [
+            ("q1_opt_gg", "Question 1\xa0", "Yes", 0.456, "varname"),
+            ("q2", "Question 2", "Often", 0.3, "shortname"),
+        ],
+        columns=["q_code", "title", "mode", "proportion", "qtype"],
+    )
+    chisquared = pd.DataFrame(
+        [
+            ("q1_opt", "Question 1\xa0", "Savers", np.array(["a", "b"], dtype=object), np.array([0.5, 42.0, 7.0])),
+            ("q2_x", "Question 2", "Savers", np.array(["c"], dtype=object), np.array([12.345])),
+            ("q2_y", "Question 2", "Savers", np.array(["d"], dtype=object), np.array([99.0])),
+            ("q2_x", "Question 2", "Investors", np.array(["e"], dtype=object), np.array([1.0])),
+        ],
+        columns=["q_code", "title", "segment", "sig_more_category", "category_percentages"],
+    )
+    return InMemoryDataHandler(seg_modes, chisquared)
+
+
+def test_questions_answers_df_matches_expected_text():
+    questions_answers_df = make_handler().build_questions_answers_df()
+
+    assert questions_answers_df["text"].tolist() == [
+        "Survey Question: Question 2\nModal Answers: Often (proportion of respondents: 0.3)\nSignificant Answers: "
+        "c (proportion of respondents: 0.12); d (proportion of respondents: 0.99)",
+        "Survey Question: Question 1\nModal Answers: Yes (proportion of respondents: 0.46)\nSignificant Answers: "
+        "a (proportion of respondents: 0.0); b (proportion of respondents: 0.42)",
+    ]
+
+
+def test_questions_with_a_mode_for_every_varname_are_not_grouped_by_shortname():
+    handler = make_handler()
+    handler.seg_modes_data = handler.seg_modes_data[handler.seg_modes_data["qtype"] == "varname"]
+    handler.chisquared_data = handler.chisquared_data[handler.chisquared_data["q_code"] == "q1_opt"]
+
+    questions_answers_df = handler.build_questions_answers_df()
+
+    assert questions_answers_df["text"].tolist() == [
+        "Survey Question: Question 1\nModal Answers: Yes (proportion of respondents: 0.46)\nSignificant Answers: "
+        "a (proportion of respondents: 0.0); b (proportion of respondents: 0.42)",
+    ]
+
+
+def test_questions_of_an_empty_segment_have_no_significant_answers():
+    handler = make_handler()
+    handler.segment_name = "Debt Fighters"
+    handler.chisquared_data = handler._load_chisquared_data()
+
+    questions_answers_df = handler.build_questions_answers_df()
+
+    assert questions_answers_df["question_text"].tolist() == ["Question 2", "Question 1"]
+    assert questions_answers_df["significant_answers"].tolist() == ["", ""]
+
+
+def test_update_smc_percentage_requires_a_percentage_per_category():
+    handler = make_handler()
+    data = pd.DataFrame({"sig_more_category": [["a", "b"]], "category_percentages": [[1.0]]})
+
+    with pytest.raises(IndexError):
+        handler._update_smc_percentage(data, "category_percentages")
+    assert handler._update_smc_percentage(data.iloc[:0], "category_percentages") == []
+
+
+def test_concat_lists_by_group_keeps_row_order():
+    data = pd.DataFrame({"key": ["b", "a", "b", None], "values": [[1, 2], [3], [], [4]]})
+
+    result = concat_lists_by_group(data, ["key"], "values")
+
+    assert result["key"].tolist() == ["a", "b"]
+    assert result["values"].tolist() == [[3], [1, 2]]
+    assert concat_lists_by_group(data.iloc[:0], ["key"], "values")["values"].tolist() == []
+
+
+def test_convert_to_shortnames():
+    assert convert_to_shortnames(pd.Series(["q1_opt", "q1_ord", "a_b_c"])).tolist() == ["q1", "q1_ord", "a_b"]
+    with pytest.raises(ValueError):
+        convert_to_shortnames(pd.Series(["nounderscore"]))
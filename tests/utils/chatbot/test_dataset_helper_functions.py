@@ -0,0 +1,50 @@
+import openai
+import pytest
+
+from app.utils.chatbot.gpt_utils import dataset_helper_functions
+from app.utils.chatbot.gpt_utils.dataset_helper_functions import _embed_chunk, chunk_by_tokens, get_embeddings
+
+
+class WordEncoding:
+    def encode(self, text, disallowed_special=()):
+        return text.split()
+
+
+@pytest.fixture(autouse=True)
+def word_encoding(mocker):
+    mocker.patch.object(dataset_helper_functions.tiktoken, "encoding_for_model", return_value=WordEncoding())
+    mocker.patch.object(_embed_chunk.retry, "sleep")
+
+
+def fake_embedding_create(requests, failures=0):
+    def create(input, model):
+        requests.append(list(input))
+        if len(requests) <= failures:
+            raise openai.error.RateLimitError("slow down")
+        data = [{"index": i, "embedding": [float(len(text))]} for i, text in enumerate(input)]
+        return {"data": list(reversed(data))}
+
+    return create
+
+
+def test_chunk_by_tokens():
+    assert chunk_by_tokens(["a b", "c d e", "f", "g h i j"], max_tokens=5) == [["a b", "c d e"], ["f", "g h i j"]]
+    assert chunk_by_tokens(["a", "b", "c"], max_inputs=2) == [["a", "b"], ["c"]]
+
+
+def test_get_embeddings_batches_unique_texts_in_order(mocker):
+    requests = []
+    mocker.patch.object(openai.Embedding, "create", side_effect=fake_embedding_create(requests))
+
+    embeddings = get_embeddings(["one two", "three", "one two", "four\nfive six"], max_tokens=3)
+
+    assert embeddings == [[7.0], [5.0], [7.0], [13.0]]
+    assert sorted(requests) == [["four five six"], ["one two", "three"]]
+
+
+def test_get_embeddings_retries_failed_chunk(mocker):
+    requests = []
+    mocker.patch.object(openai.Embedding, "create", side_effect=fake_embedding_create(requests, failures=1))
+
+    assert get_embeddings(["hello"]) == [[5.0]]
+    assert len(requests) == 2
@@ -0,0 +1,92 @@
+import pytest
+from langchain.schema import SystemMessage
+
+from app.utils.chatbot.gpt_utils import token_utils
+from app.utils.chatbot.history_policy import HistoryPolicy
+
+
+class WordEncoding:
+    def encode(self, text):
+        return text.split()
+
+
+@pytest.fixture(autouse=True)
+def word_encoding(mocker):
+    mocker.patch.object(token_utils, "get_encoding", return_value=WordEncoding())
+
+
+def make_data(turns):
+    messages = [{"role": "system", "content": "You are personaGPT"}]
+    for question, answer in turns:
+        messages.append({"role": "user", "content": question})
+        messages.append({"role": "assistant", "content": answer})
+    return {"messages": messages, "history": [], "summary": ""}
+
+
+def test_summary_is_needed_once_a_batch_of_turns_is_out_of_the_window():
+    policy = HistoryPolicy(max_turns=2, batch_turns=2)
+    data = make_data([])
+    data["history"] = [("How old are you?", "42."), ("Where do you live?", "Leeds."), ("Do you work?", "Yes.")]
+
+    assert not policy.needs_summary(data)
+    data["history"].append(("Do you drive?", "No."))
+    assert policy.needs_summary(data)
+    assert not HistoryPolicy(max_turns=2, batch_turns=2, summarize=False).needs_summary(data)
+    assert policy.old_turns(data["history"]) == [("How old are you?", "42."), ("Where do you live?", "Leeds.")]
+
+
+def test_update_summary_folds_turns_into_the_summary(mocker):
+    policy = HistoryPolicy()
+    completion = {"choices": [{"message": {"content": " They are 42 and live in Leeds. "}}]}
+    create = mocker.patch.object(HistoryPolicy, "_create_completion", return_value=completion)
+
+    summary = policy.update_summary("They are 42.", [("Where do you live?", "Leeds.")])
+
+    assert summary == "They are 42 and live in Leeds."
+    prompt = create.call_args.kwargs["messages"][0]["content"]
+    assert "They are 42." in prompt
+    assert "User: Where do you live?\nPersona: Leeds." in prompt
+
+
+def test_failed_summary_returns_none(mocker):
+    mocker.patch.object(HistoryPolicy, "_create_completion", side_effect=RuntimeError("down"))
+
+    assert HistoryPolicy().update_summary("They like tea.", [("How old are you?", "42.")]) is None
+
+
+def test_complete_turn_messages_skip_unanswered_questions():
+    messages = [
+        {"role": "assistant", "content": "Hello"},
+        {"role": "user", "content": "How old are you?"},
+        {"role": "user", "content": "Where do you live?"},
+        {"role": "assistant", "content": "Leeds."},
+    ]
+
+    assert HistoryPolicy.complete_turn_messages(messages) == messages[2:]
+
+
+def test_prompt_messages_fit_token_cap():
+    policy = HistoryPolicy(max_tokens=35)
+    data = make_data([("How old are you?", "42."), ("Where do you live?", "Leeds.")])
+    data["summary"] = "They like tea."
+
+    messages = policy.prompt_messages(data)
+
+    assert [message["content"] for message in messages] == [
+        "You are personaGPT",
+        HistoryPolicy.SUMMARY_PREFIX + "They like tea.",
+        "Where do you live?",
+        "Leeds.",
+    ]
+
+
+def test_chat_history_starts_with_summary():
+    policy = HistoryPolicy()
+    data = {"messages": [], "history": [("Where do you live?", "Leeds.")], "summary": "They are 42."}
+
+    chat_history = policy.chat_history(data)
+
+    assert chat_history == [
+        SystemMessage(content=HistoryPolicy.SUMMARY_PREFIX + "They are 42."),
+        ("Where do you live?", "Leeds."),
+    ]
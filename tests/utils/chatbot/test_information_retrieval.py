@@ -0,0 +1,85 @@
+import pandas as pd
+
+from app.utils.chatbot.gpt_utils import information_retrieval
+from app.utils.chatbot.gpt_utils.information_retrieval import rank_reference_questions
+
+
+def make_tables():
+    ref_table = pd.DataFrame(
+        {
+            "shortname": ["q1", "q2", "q3"],
+            "title": ["Question 1", "Question 2", "Question 3"],
+            "better_question_embedding": [[1.0, 0.0], [0.0, 1.0], [1.0, 1.0]],
+            "title_embedding": [[0.0, 1.0], [2.0, 0.1], [1.0, 2.0]],
+        }
+    )
+    pop_modes = pd.DataFrame(
+        {"shortname": ["q1", "q2", "q3"], "weighted_mode": ["a", "b", "c"], "unweighted_mode": ["x", "y", "z"]}
+    )
+    return ref_table, pop_modes
+
+
+def test_rank_reference_questions_keeps_best_scores_above_threshold():
+    ref_table, pop_modes = make_tables()
+
+    result = rank_reference_questions([3.0, 0.0], ref_table, pop_modes, cosine_threshold=0.7)
+
+    assert result["title"].tolist() == ["Question 1", "Question 2", "Question 3"]
+    assert result["max_cosine_col"].tolist() == ["better_cosine_score", "title_cosine_score", "better_cosine_score"]
+    assert result["max_cosine_score"].round(4).tolist() == [1.0, 0.9988, 0.7071]
+    assert result["weighted_mode"].tolist() == ["a", "b", "c"]
+
+
+def test_rank_reference_questions_limits_results():
+    ref_table, pop_modes = make_tables()
+
+    result = rank_reference_questions([3.0, 0.0], ref_table, pop_modes, cosine_threshold=0.7, max_results=2)
+
+    assert result["title"].tolist() == ["Question 1", "Question 2"]
+
+
+def test_rank_reference_questions_without_references():
+    ref_table, pop_modes = make_tables()
+
+    result = rank_reference_questions([1.0, 0.0], ref_table.iloc[:0], pop_modes)
+
+    assert result.empty
+
+
+def test_load_segment_q_embeddings_pop_modes_reads_through_artifact_cache(mocker):
+    from app.flask_app import artifact_cache
+
+    ref_table, pop_modes = make_tables()
+    pop_modes["cluster"] = ["Savers", "Spenders", "Savers"]
+    read_parquet = mocker.patch.object(artifact_cache, "read_parquet", side_effect=[ref_table, pop_modes])
+
+    cluster_q_embeddings, cluster_pop_modes = information_retrieval.load_segment_q_embeddings_pop_modes(
+        "survey", "segmentation", "segmentation_Savers"
+    )
+
+    assert read_parquet.call_count == 2
+    assert cluster_q_embeddings["shortname"].tolist() == ["q1", "q3"]
+    assert cluster_pop_modes["weighted_mode"].tolist() == ["a", "c"]
+
+
+def test_load_segment_reference_builds_the_embedding_matrix_once(mocker):
+    from app.flask_app import artifact_cache
+
+    ref_table, pop_modes = make_tables()
+    pop_modes["cluster"] = ["Savers", "Savers", "Savers"]
+    mocker.patch.object(artifact_cache, "get_etag", return_value='"v1"')
+    read_parquet = mocker.patch.object(artifact_cache, "read_parquet", side_effect=[ref_table, pop_modes])
+    build_embedding_matrix = mocker.spy(information_retrieval, "build_embedding_matrix")
+
+    for _ in range(2):
+        table, _, embedding_matrix = information_retrieval.load_segment_reference(
+            "survey", "segmentation", "segmentation_Savers"
+        )
+
+    assert read_parquet.call_count == 2
+    build_embedding_matrix.assert_called_once()
+    assert embedding_matrix.shape == (6, 2)
+    result = rank_reference_questions(
+        [3.0, 0.0], table, pop_modes, cosine_threshold=0.7, embedding_matrix=embedding_matrix, max_results=1
+    )
+    assert result["title"].tolist() == ["Question 1"]
@@ -0,0 +1,112 @@
+import itertools
+from collections import defaultdict
+
+import pandas as pd
+from langchain.embeddings import FakeEmbeddings
+
+from app.utils.chatbot.langchain_utils.mongo_utils import MongoDBHandler
+
+
+class FakeCollection:
+    _ids = itertools.count()
+
+    def __init__(self):
+        self.documents = {}
+
+    def find(self, filter=None, projection=None):
+        return [dict(document) for document in self.documents.values()]
+
+    def find_one(self, filter):
+        document = self.documents.get(filter["_id"])
+        return dict(document) if document else None
+
+    def insert_many(self, documents):
+        ids = []
+        for document in documents:
+            document["_id"] = next(self._ids)
+            self.documents[document["_id"]] = document
+            ids.append(document["_id"])
+        return type("InsertManyResult", (), {"inserted_ids": ids})
+
+    def delete_many(self, filter):
+        for _id in filter["_id"]["$in"]:
+            self.documents.pop(_id)
+
+    def replace_one(self, filter, replacement, upsert=False):
+        self.documents[filter["_id"]] = {"_id": filter["_id"], **replacement}
+
+
+class FakeDataHandler:
+    def __init__(self, texts):
+        self.texts = texts
+        self.version = "v1"
+        self.source_files = ["segment_modes.parquet", "chisquared.parquet"]
+        self.builds = 0
+        self.saves = 0
+
+    def source_version(self):
+        return self.version
+
+    def build_questions_answers_df(self):
+        self.builds += 1
+        return pd.DataFrame({"question_text": self.texts, "text": self.texts})
+
+    def save_questions_answers_df(self, questions_answers_df):
+        self.saves += 1
+
+
+class InMemoryMongoDBHandler(MongoDBHandler):
+    def _create_client(self):
+        return {self.DB_NAME: defaultdict(FakeCollection)}
+
+    def get_embeddings(self):
+        return FakeEmbeddings(size=4)
+
+
+def make_handler(data_handler):
+    return InMemoryMongoDBHandler("survey", "segmentation", "segment", *[""] * 7, data_handler)
+
+
+def stored_texts(mongo_handler):
+    return sorted(document["text"] for document in mongo_handler._get_collection().documents.values())
+
+
+def test_sync_vectors_embeds_only_changed_documents():
+    data_handler = FakeDataHandler(["a", "b"])
+    mongo_handler = make_handler(data_handler)
+
+    assert mongo_handler.sync_vectors() == {"skipped": False, "added": 2, "deleted": 0, "total": 2}
+
+    data_handler.texts = ["a", "c"]
+    data_handler.version = "v2"
+    assert mongo_handler.sync_vectors() == {"skipped": False, "added": 1, "deleted": 1, "total": 2}
+    assert stored_texts(mongo_handler) == ["a", "c"]
+    assert data_handler.saves == 2
+
+
+def test_sync_vectors_skips_unchanged_source():
+    data_handler = FakeDataHandler(["a"])
+    mongo_handler = make_handler(data_handler)
+    mongo_handler.sync_vectors()
+
+    assert mongo_handler.sync_vectors()["skipped"]
+    assert data_handler.builds == 1
+
+
+def test_sync_vectors_matches_documents_saved_without_content_hash():
+    data_handler = FakeDataHandler(["a", "b"])
+    mongo_handler = make_handler(data_handler)
+    mongo_handler._get_collection().insert_many([{"text": "a", "embedding": [0.0]}, {"text": "a", "embedding": [0.0]}])
+
+    assert mongo_handler.sync_vectors() == {"skipped": False, "added": 1, "deleted": 1, "total": 2}
+    assert stored_texts(mongo_handler) == ["a", "b"]
+
+
+def test_ensure_vectors_only_syncs_new_collections():
+    data_handler = FakeDataHandler(["a"])
+    mongo_handler = make_handler(data_handler)
+    mongo_handler.ensure_vectors()
+    data_handler.version = "v2"
+    mongo_handler.ensure_vectors()
+
+    assert data_handler.builds == 1
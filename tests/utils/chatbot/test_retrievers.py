@@ -0,0 +1,68 @@
+import numpy as np
+from langchain.schema.embeddings import Embeddings
+
+from app.utils.chatbot.langchain_utils.retrievers import NumpyVectorRetriever, TimedRetriever, top_k_indices
+from app.utils.metrics import metrics
+
+
+class FakeEmbeddings(Embeddings):
+    def embed_documents(self, texts):
+        return [self.embed_query(text) for text in texts]
+
+    def embed_query(self, text):
+        return [float(text.count(letter)) for letter in "abc"]
+
+
+class FakeCollection:
+    def __init__(self, documents):
+        self.documents = documents
+
+    def find(self, filter):
+        return [dict(document) for document in self.documents]
+
+
+def make_retriever(k=2):
+    embeddings = FakeEmbeddings()
+    texts = ["aaa", "abb", "ccc", "bbc", "aab"]
+    collection = FakeCollection(
+        [{"_id": i, "text": text, "embedding": embeddings.embed_query(text), "q": i} for i, text in enumerate(texts)]
+    )
+    return NumpyVectorRetriever.from_collection(collection, embeddings, k=k)
+
+
+def test_retriever_returns_closest_documents_with_metadata():
+    documents = make_retriever().get_relevant_documents("aaab")
+
+    assert [document.page_content for document in documents] == ["aab", "aaa"]
+    assert documents[0].metadata == {"_id": 4, "q": 4}
+
+
+def test_retriever_over_an_empty_collection_returns_no_documents():
+    retriever = NumpyVectorRetriever.from_collection(FakeCollection([]), FakeEmbeddings())
+
+    assert retriever.matrix is None
+    assert retriever.get_relevant_documents("aaab") == []
+
+
+def test_retriever_matches_brute_force_cosine():
+    retriever = make_retriever(k=5)
+    query = FakeEmbeddings().embed_query("bcc")
+    vectors = np.array([FakeEmbeddings().embed_query(document.page_content) for document in retriever.documents])
+    cosine = vectors @ query / (np.linalg.norm(vectors, axis=1) * np.linalg.norm(query))
+
+    documents = retriever.get_relevant_documents("bcc")
+
+    assert [document.page_content for document in documents] == [
+        retriever.documents[i].page_content for i in np.argsort(-cosine, kind="stable")
+    ]
+
+
+def test_top_k_indices_orders_highest_first():
+    assert top_k_indices(np.array([0.1, 0.9, 0.5, 0.7]), 2).tolist() == [1, 3]
+
+
+def test_timed_retriever_records_latency():
+    metrics.reset()
+    TimedRetriever(retriever=make_retriever(), metric_name="retriever.numpy_ms").get_relevant_documents("a")
+
+    assert metrics.snapshot()["histograms"]["retriever.numpy_ms"]["count"] == 1
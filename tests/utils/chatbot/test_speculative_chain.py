@@ -0,0 +1,66 @@
+from typing import List
+
+from langchain.chains import LLMChain
+from langchain.chains.question_answering import load_qa_chain
+from langchain.llms.fake import FakeListLLM
+from langchain.prompts import PromptTemplate
+from langchain.schema import BaseRetriever, Document
+from langchain.schema.embeddings import Embeddings
+
+from app.utils.chatbot.langchain_utils.speculative_chain import SpeculativeConversationalRetrievalChain
+from app.utils.metrics import metrics
+
+CONDENSE_PROMPT = PromptTemplate.from_template("{chat_history}\n{question}\nStandalone question:")
+QA_PROMPT = PromptTemplate.from_template("{context}\n{question}\nAnswer:")
+VECTORS = {"And you?": [1.0, 0.0], "How old are you?": [0.95, 0.1], "Where do you live?": [0.0, 1.0]}
+
+
+class ListRetriever(BaseRetriever):
+    queries: List[str] = []
+
+    def _get_relevant_documents(self, query, *, run_manager):
+        self.queries.append(query)
+        return [Document(page_content=f"docs of {query}")]
+
+
+class TableEmbeddings(Embeddings):
+    def embed_documents(self, texts):
+        return [VECTORS[text] for text in texts]
+
+    def embed_query(self, text):
+        return VECTORS[text]
+
+
+def make_chain(standalone_question, retriever):
+    return SpeculativeConversationalRetrievalChain(
+        retriever=retriever,
+        combine_docs_chain=load_qa_chain(FakeListLLM(responses=["I am 42."]), chain_type="stuff", prompt=QA_PROMPT),
+        question_generator=LLMChain(llm=FakeListLLM(responses=[standalone_question]), prompt=CONDENSE_PROMPT),
+        embeddings=TableEmbeddings(),
+        similarity_threshold=0.9,
+        return_source_documents=True,
+    )
+
+
+def test_speculative_documents_are_used_for_similar_question():
+    metrics.reset()
+    retriever = ListRetriever(queries=[])
+    chain = make_chain("How old are you?", retriever)
+
+    result = chain({"question": "And you?", "chat_history": [("How old is the segment?", "42.")]})
+
+    assert retriever.queries == ["And you?"]
+    assert result["source_documents"][0].page_content == "docs of And you?"
+    assert metrics.snapshot()["counters"] == {"speculative_retrieval.used": 1}
+
+
+def test_speculative_documents_are_discarded_for_different_question():
+    metrics.reset()
+    retriever = ListRetriever(queries=[])
+    chain = make_chain("Where do you live?", retriever)
+
+    result = chain({"question": "And you?", "chat_history": [("Where does the segment live?", "Leeds.")]})
+
+    assert sorted(retriever.queries) == ["And you?", "Where do you live?"]
+    assert result["source_documents"][0].page_content == "docs of Where do you live?"
+    assert metrics.snapshot()["counters"] == {"speculative_retrieval.discarded": 1}
@@ -0,0 +1,31 @@
+import pytest
+
+from app.utils.chatbot.langchain_utils.streaming import ChainStream
+
+
+class FakeStreamingChain:
+    def __init__(self, tokens, error=None):
+        self.tokens = tokens
+        self.error = error
+
+    def __call__(self, inputs, callbacks):
+        for token in self.tokens:
+            for callback in callbacks:
+                callback.on_llm_new_token(token)
+        if self.error:
+            raise self.error
+        return {"question": inputs["question"], "answer": "".join(self.tokens)}
+
+
+def test_chain_stream_yields_tokens_then_result():
+    chain_stream = ChainStream(FakeStreamingChain(["", "Hello", " there"]), {"question": "Hi?"})
+
+    assert list(chain_stream) == ["Hello", " there"]
+    assert chain_stream.result["answer"] == "Hello there"
+
+
+def test_chain_stream_raises_chain_error():
+    chain_stream = ChainStream(FakeStreamingChain(["Hel"], error=ValueError("context length")), {"question": "Hi?"})
+
+    with pytest.raises(ValueError, match="context length"):
+        list(chain_stream)
@@ -0,0 +1,106 @@
+import pytest
+
+from app.utils.chatbot.gpt_utils import token_utils
+from app.utils.chatbot.gpt_utils.chatgpt_bot import Chatbot
+from app.utils.chatbot.gpt_utils.token_utils import PromptTooLongError, count_message_tokens, plan_max_tokens
+
+
+class WordEncoding:
+    def __init__(self):
+        self.encoded = []
+
+    def encode(self, text):
+        self.encoded.append(text)
+        return text.split()
+
+
+@pytest.fixture
+def encoding(mocker):
+    encoding = WordEncoding()
+    mocker.patch.object(token_utils, "get_encoding", return_value=encoding)
+    return encoding
+
+
+def test_count_message_tokens(encoding):
+    assert count_message_tokens({"role": "user", "content": "How old are you?"}) == 3 + 1 + 4
+    assert count_message_tokens({"role": "user", "content": "Hi", "name": "ann"}) == 3 + 1 + 1 + 1 + 1
+
+
+def test_plan_max_tokens():
+    assert plan_max_tokens(1000, "gpt-4", answer_tokens=300) == 300
+    assert plan_max_tokens(8000, "gpt-4", answer_tokens=300) == 192
+    assert plan_max_tokens(8000, "gpt-4-32k", answer_tokens=300) == 300
+    with pytest.raises(PromptTooLongError):
+        plan_max_tokens(8192, "gpt-4")
+
+
+def test_chatbot_only_counts_new_messages(encoding):
+    messages = [
+        {"role": "system", "content": "You are personaGPT", "token_count": 7},
+        {"role": "user", "content": "How old are you?", "token_count": None},
+    ]
+    chatbot = Chatbot("key", "And you?", 1, "age", 1, "Young people", messages, answer_tokens=100)
+
+    assert chatbot.count_tokens("gpt-4") == 3 + 7 + 8
+    assert encoding.encoded == ["user", "How old are you?"]
+    assert messages[1]["token_count"] == 8
+    assert chatbot.count_tokens("gpt-4") == 18
+    assert len(encoding.encoded) == 2
+    assert chatbot.plan_max_tokens("gpt-4") == 100
+    assert chatbot.get_prompt_messages()[1] == {"role": "user", "content": "How old are you?"}
+
+
+def make_long_history_chatbot(question_tokens):
+    messages = [
+        {"role": "system", "content": "You are personaGPT", "token_count": 100},
+        {"role": "user", "content": "How old are you?", "token_count": 5000},
+        {"role": "assistant", "content": "42.", "token_count": 1000},
+        {"role": "user", "content": "Where do you live?", "token_count": 2000},
+        {"role": "assistant", "content": "Leeds.", "token_count": 1000},
+        {"role": "user", "content": "And you?", "token_count": question_tokens},
+    ]
+    return Chatbot("key", "And you?", 1, "age", 1, "Young people", messages, answer_tokens=300)
+
+
+def test_fit_prompt_drops_the_oldest_turns():
+    chatbot = make_long_history_chatbot(question_tokens=10)
+
+    assert chatbot.fit_prompt("gpt-4") == 300
+    assert [message["content"] for message in chatbot.messages] == [
+        "You are personaGPT",
+        "Where do you live?",
+        "Leeds.",
+        "And you?",
+    ]
+
+
+def test_oversize_question_is_not_retried(mocker):
+    chatbot = make_long_history_chatbot(question_tokens=10)
+    mocker.patch.object(chatbot, "_add_question_message")
+    chatbot.messages[-1]["token_count"] = 9000
+    create_moderation = mocker.patch.object(
+        Chatbot, "_create_moderation", return_value={"results": [{"flagged": False}]}
+    )
+    create_completion = mocker.patch.object(Chatbot, "_create_completion")
+
+    with pytest.raises(PromptTooLongError):
+        chatbot.query_chatgpt_bot([], [])
+
+    assert [message["content"] for message in chatbot.messages] == ["You are personaGPT", "And you?"]
+    create_moderation.assert_called_once_with("And you?")
+    create_completion.assert_not_called()
+
+
+def test_oversize_question_is_a_bad_request(app, mocker):
+    from werkzeug.exceptions import BadRequest
+
+    from app.utils.chatbot import chatbot_utils
+
+    chatbot = make_long_history_chatbot(question_tokens=10)
+    mocker.patch.object(chatbot_utils, "_match_survey_answer", return_value=(None, [], []))
+    mocker.patch.object(chatbot, "query_chatgpt_bot", side_effect=PromptTooLongError("too long"))
+
+    with app.app_context(), pytest.raises(BadRequest) as error:
+        chatbot_utils.create_gpt_prompt("And you?", "survey", "age_young", chatbot)
+
+    assert "too long" in error.value.description
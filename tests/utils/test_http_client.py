@@ -0,0 +1,64 @@
+import pytest
+import requests
+
+from app.utils.http_client import CircuitBreaker, CircuitOpenError, HttpClient
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0
+
+    def __call__(self):
+        return self.now
+
+
+def make_response(status_code):
+    response = requests.Response()
+    response.status_code = status_code
+    return response
+
+
+def test_circuit_breaker_opens_and_recovers():
+    clock = Clock()
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=30, clock=clock)
+
+    breaker.record_failure()
+    assert breaker.allow()
+    breaker.record_failure()
+    assert not breaker.allow()
+
+    clock.now = 30
+    assert breaker.allow()
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    breaker.record_failure()
+    assert not breaker.allow()
+
+    clock.now = 60
+    assert breaker.allow()
+    breaker.record_success()
+    assert breaker.stats() == {"state": "closed", "failures": 0, "opens": 2}
+
+
+def test_http_client_short_circuits_a_failing_dependency(mocker):
+    client = HttpClient("dependency", failure_threshold=2)
+    request = mocker.patch.object(client.session, "request", side_effect=requests.ConnectionError("refused"))
+
+    for _ in range(2):
+        with pytest.raises(requests.ConnectionError):
+            client.get("https://dependency.test/users")
+    with pytest.raises(CircuitOpenError):
+        client.get("https://dependency.test/users")
+
+    assert request.call_count == 2
+    assert request.call_args.kwargs["timeout"] == (3, 10)
+    assert client.stats()["state"] == "open"
+
+
+def test_http_client_counts_server_errors(mocker):
+    client = HttpClient("dependency", failure_threshold=2)
+    mocker.patch.object(client.session, "request", side_effect=[make_response(500), make_response(200)])
+
+    assert client.get("https://dependency.test/users").status_code == 500
+    assert client.stats()["failures"] == 1
+    assert client.get("https://dependency.test/users", timeout=1).status_code == 200
+    assert client.stats() == {"state": "closed", "failures": 0, "opens": 0}
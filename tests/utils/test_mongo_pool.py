@@ -0,0 +1,44 @@
+from types import SimpleNamespace
+
+from app.utils.metrics import Metrics, metrics
+from app.utils.mongo_pool import MongoClientPool, pool_metrics_listener
+
+
+def test_clients_are_shared_within_a_process():
+    pool = MongoClientPool()
+    pool.configure(maxPoolSize=5, maxIdleTimeMS=None)
+
+    client = pool.get_client("mongodb://localhost/test")
+
+    assert pool.get_client("mongodb://localhost/test") is client
+    assert client.options.pool_options.max_pool_size == 5
+
+
+def test_forked_process_gets_its_own_client(mocker):
+    pool = MongoClientPool()
+    client = pool.get_client("mongodb://localhost/test")
+
+    mocker.patch("app.utils.mongo_pool.os.getpid", return_value=pool._pid + 1)
+
+    assert pool.get_client("mongodb://localhost/test") is not client
+
+
+def test_listener_records_checkout_wait():
+    metrics.reset()
+    event = SimpleNamespace(address=("localhost", 27017))
+
+    pool_metrics_listener.connection_check_out_started(event)
+    pool_metrics_listener.connection_checked_out(event)
+
+    assert metrics.snapshot()["histograms"]["mongo.pool_checkout_wait_ms"]["count"] == 1
+
+
+def test_histogram_percentiles():
+    registry = Metrics(sample_size=100)
+    for value in range(1, 101):
+        registry.observe("latency", value)
+    registry.increment("requests", 2)
+
+    snapshot = registry.snapshot()
+    assert snapshot["counters"] == {"requests": 2}
+    assert snapshot["histograms"]["latency"] == {"count": 100, "mean": 50.5, "p50": 51, "p99": 100, "max": 100}
@@ -0,0 +1,33 @@
+import redis
+
+from app.utils.metrics import metrics
+from app.utils.redis_util import PythiaRedis, RedisUtil
+
+
+def test_get_many_batches_misses_and_caches_values_locally(mocker):
+    metrics.reset()
+    execute_command = mocker.patch.object(redis.Redis, "execute_command", return_value=[b"ann", None])
+    redis_db = PythiaRedis(client_cache_ttl=60)
+    mocker.patch.object(RedisUtil, "client", return_value=redis_db)
+
+    assert RedisUtil.get_many(["user__1", "user__2"], local=True) == [b"ann", None]
+    execute_command.return_value = [None]
+    assert RedisUtil.get_many(["user__1", "user__2"], local=True) == [b"ann", None]
+
+    assert execute_command.call_args_list[0].args == ("MGET", "user__1", "user__2")
+    assert execute_command.call_args_list[1].args == ("MGET", "user__2")
+    assert metrics.snapshot()["histograms"]["redis.mget_ms"]["count"] == 2
+    assert redis_db.stats()["client_cache"]["hits"] == 1
+
+
+def test_set_many_drops_local_values(mocker):
+    mocker.patch.object(redis.Redis, "execute_command", return_value=[b"ann"])
+    redis_db = PythiaRedis(client_cache_ttl=60)
+    mocker.patch.object(RedisUtil, "client", return_value=redis_db)
+    pipeline_execute = mocker.patch("redis.client.Pipeline.execute", return_value=[True])
+    RedisUtil.get_many(["user__1"], local=True)
+
+    RedisUtil.set_many({"user__1": "bob"}, 3600)
+
+    pipeline_execute.assert_called_once()
+    assert "user__1" not in redis_db.client_cache